@@ -63,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.collectors.collector_context',
             ],
         },
     },
@@ -126,6 +127,70 @@ STATICFILES_DIRS = [
 
 SITE_URL = 'http://127.0.0.1:8000/'
 
+# Nombre de semaines de collectes matérialisées en base (fenêtre glissante
+# prolongée chaque nuit par la commande etendre_collectes)
+COLLECTION_HORIZON_WEEKS = 4
+
+# Fenêtre (en secondes) pendant laquelle les modifications des programmes d'une
+# même zone sont regroupées en une seule replanification (commande replanifier_zones)
+ZONE_REPLAN_DELAY_SECONDS = 30
+
+# Géocodage des adresses en tâche de fond (commande geocoder_adresses)
+GEOCODING_PROVIDER = 'app.services.geocodage.NominatimProvider'
+GEOCODING_MIN_INTERVAL = 1.0  # secondes entre deux appels (limite Nominatim)
+GEOCODING_CONCURRENCE = 2  # requêtes en vol simultanément
+
+# Serveur OSRM (temps de trajet) : serveur public par défaut, local en production
+OSRM_BASE_URL = os.environ.get('OSRM_BASE_URL', 'http://router.project-osrm.org')
+OSRM_TIMEOUT = 5  # secondes
+OSRM_CACHE_SECONDS = 600
+
+# Services externes (OSRM, Nominatim) : après DISJONCTEUR_SEUIL échecs consécutifs,
+# les appels sont suspendus pendant DISJONCTEUR_DELAI_SECONDES
+DISJONCTEUR_SEUIL = 5
+DISJONCTEUR_DELAI_SECONDES = 60
+
+# Vitesse moyenne d'un tricycle, pour estimer les durées quand OSRM est indisponible
+TRICYCLE_VITESSE_KMH = 15
+
+# Déplacement (mètres) au-delà duquel le tri par distance est recalculé (réponse 304 sinon)
+RECLASSEMENT_DISTANCE_M = 50
+
+# Répartition nocturne des collectes entre les tricycles d'une zone (commande repartir_tournees)
+POIDS_COLLECTE_KG = {'standard': 10, 'premium': 15, 'entreprise': 40, 'default': 10}  # estimation par collecte
+DUREE_ARRET_SECONDES = 180  # temps passé à chaque arrêt
+REPARTITION_TOLERANCE = 0.15  # écart de charge toléré au-dessus de la moyenne par tricycle
+
+# Rayon (km) des commandes de gaz proches proposées au regroupement d'une livraison
+GAS_DISPATCH_RADIUS_KM = 2
+
+# Cache : partagé entre les processus (Redis) si REDIS_URL est défini, sinon mémoire
+# locale à chaque processus. En mémoire locale, une invalidation ne touche que le
+# processus qui l'exécute : les autres gardent leur valeur jusqu'à expiration.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Durée de vie (secondes) des compteurs de livraisons des livreurs en cache ; sans
+# cache partagé, c'est aussi le retard maximal accepté d'un processus à l'autre
+GAS_COUNTERS_CACHE_SECONDS = 300
+
+# Rétention des données purgées par la commande maintenance (tâche de nuit)
+MAINTENANCE_TAILLE_LOT = 1000  # lignes supprimées par transaction
+NOTIFICATION_RETENTION_DAYS = 3
+GAS_ORDER_RETENTION_DAYS = 1  # commandes livrées
+PAYMENT_RETENTION_DAYS = 3  # paiements terminés
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'app/static')
 MEDIA_URL = '/media/'
 
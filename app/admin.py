@@ -125,8 +125,8 @@ class AnnonceCarouselAdmin(admin.ModelAdmin):
 # Admin pour CollectionSchedule
 @admin.register(CollectionSchedule)
 class CollectionScheduleAdmin(admin.ModelAdmin):
-    list_display = ('subscription', 'scheduled_date', 'scheduled_day', 'scheduled_time', 'status', 'completed_at')
-    list_filter = ('status', 'scheduled_date', 'scheduled_day')
+    list_display = ('subscription', 'scheduled_date', 'scheduled_day', 'scheduled_time', 'status', 'tricycle', 'ordre_tournee', 'completed_at')
+    list_filter = ('status', 'scheduled_date', 'scheduled_day', 'tricycle')
     search_fields = ('subscription__user__username', 'collector_notes', 'customer_notes')
     readonly_fields = ('created_at',)
     ordering = ('-scheduled_date', '-scheduled_time')
@@ -148,6 +148,40 @@ admin.site.register(Zone)
 admin.site.register(Tricycle)
 admin.site.register(ProgrammeTricycle)
 
+# Admin pour ReplanificationZone
+@admin.register(ReplanificationZone)
+class ReplanificationZoneAdmin(admin.ModelAdmin):
+    list_display = ('zone', 'status', 'nombre_demandes', 'executer_apres', 'finished_at')
+    list_filter = ('status', 'zone')
+    readonly_fields = ('id', 'created_at', 'started_at', 'finished_at', 'rapport', 'erreur')
+    ordering = ('-created_at',)
+
+# Admin pour les manifestes précalculés
+class ArretManifesteInline(admin.TabularInline):
+    model = ArretManifeste
+    fields = ('ordre', 'scheduled_time', 'client_name', 'street', 'city', 'status')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+@admin.register(ManifesteTricycle)
+class ManifesteTricycleAdmin(admin.ModelAdmin):
+    list_display = ('tricycle', 'date', 'genere_le')
+    list_filter = ('date', 'tricycle')
+    readonly_fields = ('genere_le',)
+    inlines = [ArretManifesteInline]
+    ordering = ('-date',)
+
+# Classement des collecteurs : cumul quotidien, trié par collectes terminées
+@admin.register(CollectorDailyStats)
+class CollectorDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('collector', 'date', 'scheduled_count', 'completed_count', 'missed_count', 'gas_deliveries', 'revenue')
+    list_filter = ('date',)
+    search_fields = ('collector__username', 'collector__first_name', 'collector__last_name')
+    date_hierarchy = 'date'
+    ordering = ('-date', '-completed_count')
+    readonly_fields = ('updated_at',)
+
 admin.site.register(DemandeReabonnement)
 admin.site.register(Facture)
 admin.site.register(Abonnement)
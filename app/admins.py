@@ -45,7 +45,7 @@ class DashboardView(TemplateView):
         abonnements_expires = Subscription.objects.filter(
             end_date__lt=timezone.now().date(),
             status='active'
-        )
+        ).select_related('user', 'plan')
 
         # pour chaque abonnement expiré, creer une notification pour le client 
         for abonnement in abonnements_expires:
@@ -55,10 +55,9 @@ class DashboardView(TemplateView):
                 message=f"Votre abonnement pour le service {abonnement} a expiré le {abonnement.end_date.strftime('%d/%m/%Y')}. Veuillez renouveler votre abonnement pour continuer à bénéficier de nos services.",
                 notification_type='warning')
             # mettre à jour le statut de l'abonnement
+            # (le signal post_save supprime les collectes de l'abonnement devenu inactif)
             abonnement.status = 'inactive'
-            abonnement.save()
-            collections = CollectionSchedule.objects.filter(subscription=abonnement)
-            collections.delete()
+            abonnement.save(update_fields=['status', 'updated_at'])
 
         if selected_date:
             # Convertir la date string en objet date
@@ -1,14 +1,16 @@
 from django.http import JsonResponse
 from django.views import View
 from django.views.generic import TemplateView
+from django.urls import reverse
 from django.db import transaction
 from django.db.models import Count, Q
+from django.core.exceptions import ValidationError
 import json
 
-from app.views import generate_collection_schedule
+from app.services.planning import replanifier_zone, simuler_modification_programme
 from .models import (
     Zone, Tricycle, ProgrammeTricycle, CollectionDay, 
-    City, CustomUser, Subscription, SubscriptionDay, CollectionSchedule
+    City, CustomUser, Subscription, SubscriptionDay, CollectionSchedule, ReplanificationZone
 )
 
 class GestionCollecteView(TemplateView):
@@ -493,6 +495,35 @@ class ProgrammeTricycleListCreateAPIView(View):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
+# Champs modifiables d'un programme (en plus du tricycle et de la zone)
+CHAMPS_PROGRAMME = (
+    'jour_semaine', 'heure_debut', 'heure_fin', 'capacite_max_clients',
+    'is_active', 'date_debut', 'date_fin'
+)
+
+
+def lire_modifications_programme(data):
+    """
+    Extraire et valider les modifications d'un programme envoyées à l'API.
+    Retourne (modifications, None) ou (None, JsonResponse d'erreur).
+    """
+    modifications = {}
+    if 'tricycle' in data:
+        if not Tricycle.objects.filter(id=data['tricycle']).exists():
+            return None, JsonResponse({'tricycle': ['Tricycle non trouvé']}, status=400)
+        modifications['tricycle'] = data['tricycle']
+
+    if 'zone' in data:
+        if not Zone.objects.filter(id=data['zone']).exists():
+            return None, JsonResponse({'zone': ['Zone non trouvée']}, status=400)
+        modifications['zone'] = data['zone']
+
+    for champ in CHAMPS_PROGRAMME:
+        if champ in data:
+            modifications[champ] = data[champ]
+    return modifications, None
+
+
 class ProgrammeTricycleRetrieveUpdateDestroyAPIView(View):
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
@@ -530,108 +561,30 @@ class ProgrammeTricycleRetrieveUpdateDestroyAPIView(View):
                 programme = ProgrammeTricycle.objects.select_related('zone').get(id=pk)
                 data = json.loads(request.body)
                 
-                # Sauvegarder l'ancien état pour détecter les changements
-                old_capacity = programme.capacite_max_clients
-                old_is_active = programme.is_active
-                
-                # Mise à jour des champs
-                if 'tricycle' in data:
-                    try:
-                        tricycle = Tricycle.objects.get(id=data['tricycle'])
-                        programme.tricycle = tricycle
-                    except Tricycle.DoesNotExist:
-                        return JsonResponse({'tricycle': ['Tricycle non trouvé']}, status=400)
-                
-                if 'zone' in data:
-                    try:
-                        zone = Zone.objects.get(id=data['zone'])
-                        programme.zone = zone
-                    except Zone.DoesNotExist:
-                        return JsonResponse({'zone': ['Zone non trouvée']}, status=400)
-                
-                if 'jour_semaine' in data:
-                    programme.jour_semaine = data['jour_semaine']
-                if 'heure_debut' in data:
-                    programme.heure_debut = data['heure_debut']
-                if 'heure_fin' in data:
-                    programme.heure_fin = data['heure_fin']
-                if 'capacite_max_clients' in data:
-                    programme.capacite_max_clients = data['capacite_max_clients']
-                if 'is_active' in data:
-                    programme.is_active = data['is_active']
-                if 'date_debut' in data:
-                    programme.date_debut = data['date_debut']
-                if 'date_fin' in data:
-                    programme.date_fin = data['date_fin']
+                modifications, erreur = lire_modifications_programme(data)
+                if erreur:
+                    return erreur
+                for champ, valeur in modifications.items():
+                    field = ProgrammeTricycle._meta.get_field(champ)
+                    setattr(programme, field.attname, field.to_python(valeur))
                 
+                # La sauvegarde met en file la replanification de la zone
+                # (signal mettre_a_jour_collectes_zone) : les modifications rapprochées
+                # d'une même zone sont regroupées en une seule replanification.
                 programme.save()
-                # Récupérer tous les abonnement liés à ce programme
-                subscription = Subscription.objects.filter(
-                    zone=programme.zone,  
-                    )
-                
-                
-                client = len(subscription)
-                
-                if programme.clients_actuels > client:
-                    programme.clients_actuels = client
-                    programme.save()
-                if programme.clients_actuels > programme.capacite_max_clients:
-                    return JsonResponse({
-                        'error': 'Le nombre actuel de clients ne peut pas dépasser la capacité maximale.'
-                    }, status=400)
-
-
-
-                print(f"Abonnements affectés trouvés: {len(subscription)}")
-                if len(subscription) < 2:
-                    subscription= subscription.first()
-                    # supprimer les jours de collecte pour cette abonement s'il existe deja
-                    day = SubscriptionDay.objects.filter(
-                        subscription=subscription
-                    )
-                    if day.exists():
-                        day.delete()
-                    # Réassigner les jours de collecte pour cet abonnement
-                    subscription.assigner_jours_collecte_automatique()
-                    # recuperer les programe de collecte associer au abonnement et les suprimer
-                    collecte= CollectionSchedule.objects.filter(
-                    subscription=subscription,
-                    
-                    )   
-                    if collecte.exists():
-                        collecte.delete()
-                    generate_collection_schedule(subscription)
-
-                    
-                else:
-                    
+                jobs = getattr(programme, 'replanifications', [])
 
-                    for sub in subscription:
-                         # supprimer les jours de collecte pour cette abonement s'il existe deja
-                        
-                        day = SubscriptionDay.objects.filter(
-                            subscription=sub
-                        )
-                        if day.exists():
-                            day.delete()
-                        # Réassigner les jours de collecte pour cet abonnement
-                        sub.assigner_jours_collecte_automatique()
-                        # recuperer les programe de collecte associer au abonnement et les suprimer
-                        collecte= CollectionSchedule.objects.filter(
-                        subscription=sub,
-                        
-                        ) 
-                        if collecte.exists():
-                            collecte.delete()
-
-                        # Génération du planning de collecte
-                        generate_collection_schedule(sub)
-                 
-                
                 return JsonResponse({
-                    'message': 'Programme mis à jour avec succès. Les abonnements concernés seront mis à jour.',
-                    'id': str(programme.id)
+                    'message': 'Programme mis à jour avec succès. La mise à jour des abonnements concernés est en cours.',
+                    'id': str(programme.id),
+                    'replanification': [
+                        {
+                            'job_id': str(job.id),
+                            'status': job.status,
+                            'status_url': reverse('api_replanification_detail', args=[job.id])
+                        }
+                        for job in jobs
+                    ]
                 }, status=200)
                 
         except ProgrammeTricycle.DoesNotExist:
@@ -645,30 +598,8 @@ class ProgrammeTricycleRetrieveUpdateDestroyAPIView(View):
     def update_affected_subscriptions(self, programme):
         """Mettre à jour les abonnements affectés par un changement de programme"""
         try:
-            # Récupérer tous les abonnement liés à ce programme
-            subscription = Subscription.objects.filter(
-                zone=programme.zone,
-                
-            )
-
-            print(f"Abonnements affectés trouvés: {len(subscription)}")
-            
-            for sub_day in subscription:
-                # Réassigner les jours de collecte pour cet abonnement
-                sub_day.assigner_jours_collecte_automatique()
-                # recuperer les programe de collecte associer au abonnement et les suprimer
-                collecte= CollectionSchedule.objects.filter(
-                    subscription=subscription,
-                    is_active=True
-                ) 
-                if collecte.exists():
-                    collecte.delete()
-
-                # Génération du planning de collecte
-                generate_collection_schedule(subscription)
-
-                
-            return len(subscription)
+            rapport = replanifier_zone(programme.zone)
+            return rapport.get('abonnements_modifies', 0)
             
         except Exception as e:
             print(f"Erreur lors de la mise à jour des abonnements: {e}")
@@ -694,6 +625,56 @@ class ProgrammeTricycleRetrieveUpdateDestroyAPIView(View):
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
+class ReplanificationZoneDetailAPIView(View):
+    def get(self, request, pk):
+        """Suivre l'état d'une replanification de zone mise en file"""
+        try:
+            job = ReplanificationZone.objects.select_related('zone').get(id=pk)
+
+            return JsonResponse({
+                'job_id': str(job.id),
+                'zone_id': str(job.zone.id),
+                'zone_nom': job.zone.nom,
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'nombre_demandes': job.nombre_demandes,
+                'executer_apres': job.executer_apres.strftime('%d/%m/%Y %H:%M:%S'),
+                'started_at': job.started_at.strftime('%d/%m/%Y %H:%M:%S') if job.started_at else None,
+                'finished_at': job.finished_at.strftime('%d/%m/%Y %H:%M:%S') if job.finished_at else None,
+                'rapport': job.rapport,
+                'erreur': job.erreur
+            }, status=200)
+
+        except ReplanificationZone.DoesNotExist:
+            return JsonResponse({'error': 'Replanification non trouvée'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+class ProgrammeTricycleSimulationAPIView(View):
+    def post(self, request, pk):
+        """Simuler une mise à jour de programme : impact sur les abonnements, sans rien enregistrer"""
+        try:
+            programme = ProgrammeTricycle.objects.get(id=pk)
+            data = json.loads(request.body)
+
+            modifications, erreur = lire_modifications_programme(data)
+            if erreur:
+                return erreur
+
+            return JsonResponse({
+                'id': str(programme.id),
+                'simulation': simuler_modification_programme(programme, modifications)
+            }, status=200)
+
+        except ProgrammeTricycle.DoesNotExist:
+            return JsonResponse({'error': 'Programme non trouvé'}, status=404)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Données JSON invalides'}, status=400)
+        except ValidationError as e:
+            return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
 # API Views pour les Jours de Collecte
 class CollectionDayListCreateAPIView(View):
     def dispatch(self, *args, **kwargs):
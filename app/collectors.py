@@ -9,8 +9,12 @@ import json
 
 from .models import (
     CustomUser, CollectionRequest, Subscription, Tricycle, 
-    Zone, ProgrammeTricycle, Notification, Payment, CollectionSchedule, Performence, GasOrder
+    Zone, ProgrammeTricycle, Notification, Payment, CollectionSchedule
 )
+from .services.compteurs_gaz import compteurs_gaz
+from .services.manifeste import arrets_du_jour
+from .services.notation import derniere_note
+from .services.statistiques import demandes_en_cours, stats_clients, stats_demandes, stats_tournees
 
 # Decorator pour vérifier que l'utilisateur est un collecteur
 def collector_required(view_func):
@@ -24,28 +28,9 @@ def collector_required(view_func):
     return wrapper
 
 def collector_context(request):
+    """Compteurs de livraisons de la barre latérale (en cache, voir services/compteurs_gaz.py)"""
     if request.user.is_authenticated and request.user.user_type == 'collecteur':
-        today = timezone.now().date()
-        collector = request.user
-        
-        # Compter les livraisons du jour
-        today_gas_count = GasOrder.objects.filter(
-            assigned_collector=collector,
-            scheduled_date=today,
-            status__in=['confirmed', 'preparing', 'assigned', 'in_transit']
-        ).count()
-        
-        # Compter les livraisons assignées
-        assigned_gas_count = GasOrder.objects.filter(
-            assigned_collector=collector
-        ).exclude(
-            status__in=['delivered', 'cancelled', 'failed']
-        ).count()
-        
-        return {
-            'today_gas_count': today_gas_count,
-            'assigned_gas_count': assigned_gas_count,
-        }
+        return compteurs_gaz(request.user.id)
     return {}
 
 @login_required(login_url='login')
@@ -54,30 +39,9 @@ def collector_dashboard(request):
     """Vue pour le tableau de bord du collecteur"""
     today = timezone.now().date()
 
-    # recuperer les notifications qui dattent de plus de 7 jours
-    seven_days_ago = today - timedelta(days=7)
-    old_notifications = Notification.objects.filter(
-        created_at__lt=seven_days_ago
-    )
-    # supprimer les notifications qui dattent de plus de 7 jours
-    old_notifications.delete()
-
-
-    # recuperer toutesles commandes de gaz terminées d'hier 
-    yesterday = today - timedelta(days=1)
-    yesterday_gas_orders = GasOrder.objects.filter( 
-        scheduled_date=yesterday,
-        status='delivered'
-    )
-    
-    if yesterday_gas_orders.exists():
-        yesterday_gas_orders.delete()
-
-    
+    # La purge des notifications et des commandes de gaz livrées est faite par la
+    # commande maintenance (tâche planifiée), pas à chaque affichage
 
-    
-        
-    
     # Récupérer le tricycle du collecteur
     try:
         tricycle = Tricycle.objects.get(conducteur=request.user)
@@ -85,98 +49,25 @@ def collector_dashboard(request):
     except Tricycle.DoesNotExist:
         tricycle = None
 
-    # creer la performance du collecteur pour ce jour
-    note = Performence.objects.filter(Tricycle=tricycle, date=today).first()
-    if not note:
-        performance = Performence.objects.create(Tricycle=tricycle, note=0)
-    else:
-        performance = Performence.objects.get(Tricycle=tricycle, date=today)
-
-    # recuperation des programmes de collecte associes au tricycle
-    programmes = ProgrammeTricycle.objects.filter(tricycle=tricycle)
-    # recupération des zones associées aux programmes
-    zones = Zone.objects.filter(programmes_tricycle__in=programmes).distinct()
-    # recupération des abonnements actifs dans ces zones
-    active_subscriptions = Subscription.objects.filter(
-        zone__in=zones,
-        status='active'
-    ).distinct()
-    # recupération des programe collectes prévues pour aujourd'hui
-    today_collections = CollectionSchedule.objects.filter(
-        subscription__in=active_subscriptions,
-        scheduled_date=today,
-        status__in=['completed', 'scheduled']
-    ).order_by('scheduled_time')    
-    # Statistiques du jour
-    
-    
-    today_stats = {
-        'total': today_collections.count(),
-        'completed': today_collections.filter(status='completed').count(),
-        'pending': today_collections.filter(status__in=['pending', 'scheduled']).count(),
-        'in_progress': today_collections.filter(status='in_progress').count(),
-    }
-    
-    # Statistiques de la semaine
-    week_start = today 
-    week_end = week_start + timedelta(days=6)
-    
-    week_collections = CollectionSchedule.objects.filter(
-        subscription__in=active_subscriptions,
-        scheduled_date__range=[week_start, week_end],
-        status__in=['completed', 'scheduled']
-    ).order_by('scheduled_time')
-    
-    week_completed = week_collections.filter(status='completed').count()
-    week_total = week_collections.count()
-    week_stats = {
-        'total': week_total,
-        'completion_rate': round((week_completed / week_total * 100) if week_total > 0 else 0, 1)
-    }
-    
-    # Collectes à venir (prochaines 4 heures)
-    next_4_hours = timezone.now() + timedelta(hours=4)
-    upcoming_collections = CollectionSchedule.objects.filter(
-        subscription__in=active_subscriptions,
-        scheduled_date=today,
-        scheduled_time__gte=timezone.now().time(),
-        status__in=['pending', 'scheduled']
-    ).order_by('scheduled_time')[:5]
-    
-    # Clients actifs et zones
-    active_subscriptions = Subscription.objects.filter(
-        status='active'
-    ).distinct()
-    
-    active_clients_count = active_subscriptions.values('user').distinct().count()
-    active_zones_count = active_subscriptions.values('zone').distinct().count()
-    
-    # Performance du collecteur (calcul simplifié)
-    total_collections = CollectionSchedule.objects.filter(
-        subscription__in=active_subscriptions,
-        scheduled_date=today,
-        status__in=['completed', 'scheduled']
-    ).order_by('scheduled_time')
-    completed_collections = CollectionSchedule.objects.filter(
-        subscription__in=active_subscriptions,
-        scheduled_date=today,
-        status='completed'
-    ).order_by('scheduled_time')
-    
-    # calcul de la performence journaliere du conducteur
-    if len(total_collections) > 0:
-        dif = len(total_collections)/len(completed_collections) if len(completed_collections) > 0 else 0
-        performance_rating= 5*dif 
-    else:
-        performance_rating = 0
-
-    # modifier la note de la performance
-    performance.note=performance_rating 
-    performance.save()
+    # Statistiques du jour, de la semaine et des collectes restantes : une agrégation
+    stats = stats_tournees(tricycle, today)
+    today_stats = dict(stats['today'], in_progress=demandes_en_cours(request.user, today))
+    week_stats = stats['week']
 
+    # Collectes à venir : manifeste précalculé du tricycle
+    maintenant = timezone.now().time()
+    upcoming_collections = [
+        arret for arret in arrets_du_jour(tricycle, today)
+        if arret.status == 'scheduled' and arret.scheduled_time >= maintenant
+    ][:5]
     
+    # Clients actifs et zones desservies par le tricycle
+    clients = stats_clients(tricycle)
+    active_clients_count = clients['clients']
+    active_zones_count = clients['zones']
     
-   
+    # Dernière note du tricycle (calculée chaque nuit par la commande noter_tricycles)
+    performance_rating, performance_date = derniere_note(tricycle)
     
     # Notifications non lues
     unread_notifications_count = Notification.objects.filter(
@@ -197,6 +88,7 @@ def collector_dashboard(request):
         'active_clients_count': active_clients_count,
         'active_zones_count': active_zones_count,
         'performance_rating': performance_rating,
+        'performance_date': performance_date,
         'unread_notifications_count': unread_notifications_count,
         'recent_notifications': recent_notifications,
         'today_collections_count': today_stats['pending'] + today_stats['in_progress'],
@@ -232,30 +124,16 @@ def daily_schedule(request):
     programmes = ProgrammeTricycle.objects.filter(tricycle=tricycle)
     # recupération des zones associées aux programmes
     zones = Zone.objects.filter(programmes_tricycle__in=programmes).distinct()
-    # recupération des abonnements actifs dans ces zones
-    active_subscriptions = Subscription.objects.filter(
-        zone__in=zones,
-        status='active'
-    ).distinct()
-    print("Active Subscriptions:", active_subscriptions)
-    print("zones:", zones)
-
     
-    # Récupérer les collectes du jour
-    collections = CollectionSchedule.objects.filter(
-        subscription__in=active_subscriptions,
-        scheduled_date=current_date,
-        status__in=['completed', 'scheduled']
-    ).order_by('scheduled_time')
-
-    print("Collections:", collections)
+    # Récupérer les collectes du jour : manifeste précalculé, dans l'ordre de la tournée
+    collections = arrets_du_jour(tricycle, current_date)
     
     # Statistiques du jour
     daily_stats = {
-        'total': collections.count(),
-        'completed': collections.filter(status='completed').count(),
-        'in_progress': collections.filter(status='in_progress').count(),
-        'pending': collections.filter(status__in=['pending', 'scheduled']).count(),
+        'total': len(collections),
+        'completed': sum(1 for arret in collections if arret.status == 'completed'),
+        'in_progress': 0,
+        'pending': sum(1 for arret in collections if arret.status == 'scheduled'),
     }
     
     # Calcul du taux d'accomplissement
@@ -291,13 +169,35 @@ def daily_schedule(request):
 
 
 # api de calcul de distance entre le collecteur et le client pour la collecte efficasse
+import hashlib
 import json
-import requests
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 from django.views.decorators.csrf import csrf_exempt
-from geopy.distance import geodesic
-from math import radians, sin, cos, sqrt, atan2
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+
+from .services.geo import classer_par_distance, distances_km
+from .services.manifeste import version_manifeste
+from .services.routage import OSRMClient
+from .services.tournee import optimiser_tournee
+
+
+def etag_classement(manifeste, lat, lon, parametres):
+    """ETag d'un classement : version du manifeste, position utilisée et paramètres"""
+    return f'W/"{manifeste[0]}:{manifeste[1]}:{lat:.6f}:{lon:.6f}:{parametres}"'
+
+
+def lire_etag_classement(valeur):
+    """(identifiant, version, lat, lon, parametres) d'un ETag de classement, ou None"""
+    if not valeur:
+        return None
+    try:
+        identifiant, version, lat, lon, parametres = valeur.removeprefix('W/').strip('"').split(':')
+        return identifiant, int(version), float(lat), float(lon), parametres
+    except ValueError:
+        return None
 
 @login_required(login_url='login')
 @collector_required
@@ -311,6 +211,9 @@ def get_sorted_collections_by_distance(request):
     user_lat = request.GET.get('lat')
     user_lon = request.GET.get('lon')
     
+    # mode=tournee : ordre de visite optimisé au lieu du tri par distance
+    mode = request.GET.get('mode')
+    
     # Récupérer la date (aujourd'hui par défaut)
     date_str = request.GET.get('date')
     if date_str:
@@ -330,6 +233,15 @@ def get_sorted_collections_by_distance(request):
     try:
         user_lat = float(user_lat)
         user_lon = float(user_lon)
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        max_distance = float(request.GET['max_distance']) if request.GET.get('max_distance') else None
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Paramètres de position, limit ou max_distance invalides'
+        }, status=400)
+    
+    try:
         
         # Récupérer le tricycle du collecteur
         try:
@@ -340,98 +252,115 @@ def get_sorted_collections_by_distance(request):
                 'error': 'Aucun tricycle assigné'
             }, status=404)
         
-        # Récupérer les programmes de collecte
-        programmes = ProgrammeTricycle.objects.filter(tricycle=tricycle)
-        zones = Zone.objects.filter(programmes_tricycle__in=programmes).distinct()
-        
-        # Récupérer les abonnements actifs
-        active_subscriptions = Subscription.objects.filter(
-            zone__in=zones,
-            status='active'
-        ).distinct()
-        
-        # Récupérer les collectes du jour
-        collections = CollectionSchedule.objects.filter(
-            subscription__in=active_subscriptions,
-            scheduled_date=current_date,
-            status__in=['scheduled', 'pending']
-        ).select_related(
-            'subscription__user',
-            'subscription__address',
-            'subscription__plan'
+        # Requête conditionnelle (If-None-Match) : si le manifeste n'a pas changé et que
+        # le collecteur s'est peu déplacé depuis le dernier classement, réponse 304 vide.
+        # La version du manifeste change à chaque collecte modifiée ou supprimée.
+        parametres = hashlib.md5(
+            f"{current_date}|{limit}|{max_distance}|{mode}".encode()
+        ).hexdigest()[:8]
+        manifeste = version_manifeste(tricycle, current_date)
+        precedent = lire_etag_classement(request.headers.get('If-None-Match'))
+        if (
+            manifeste and precedent
+            and precedent[:2] == (str(manifeste[0]), manifeste[1])
+            and precedent[4] == parametres
+        ):
+            deplacement_m = distances_km(user_lat, user_lon, [precedent[2]], [precedent[3]])[0] * 1000
+            if deplacement_m <= getattr(settings, 'RECLASSEMENT_DISTANCE_M', 50):
+                response = HttpResponseNotModified()
+                response['ETag'] = request.headers['If-None-Match']
+                return response
+        
+        # Collectes du jour restant à faire : manifeste précalculé (une requête indexée)
+        lignes = [arret for arret in arrets_du_jour(tricycle, current_date) if arret.status == 'scheduled']
+        
+        # Les adresses sans coordonnées sont écartées : elles sont géocodées en
+        # tâche de fond (commande geocoder_adresses), jamais pendant la requête
+        # Distances en kilomètres : une seule passe vectorisée, puis filtre et classement
+        distances = distances_km(
+            user_lat, user_lon,
+            [l.latitude for l in lignes], [l.longitude for l in lignes]
         )
+        ordre = classer_par_distance(distances, limit=limit, max_distance=max_distance)
+        
+        tournee = None
+        if mode == 'tournee':
+            # Tournée optimisée : créneaux horaires respectés, puis trajet le plus court
+            # à l'intérieur de chaque créneau ; les temps sont ceux depuis l'arrêt précédent
+            tournee = optimiser_tournee(
+                (user_lat, user_lon),
+                [(lignes[idx].latitude, lignes[idx].longitude) for idx in ordre],
+                creneaux=[lignes[idx].scheduled_time for idx in ordre]
+            )
+            ordre = [ordre[i] for i in tournee['ordre']]
+            itineraires = [
+                {'distance': distance, 'duration': duree} for distance, duree in tournee['etapes']
+            ]
+        else:
+            # Temps de trajet OSRM : une seule requête `table` pour toutes les collectes retenues
+            itineraires = OSRMClient().depuis(
+                (user_lat, user_lon),
+                [(lignes[idx].latitude, lignes[idx].longitude) for idx in ordre]
+            )
         
-        # Préparer les données avec calcul des distances
         collections_with_distance = []
         
-        for collection in collections:
-            address = collection.subscription.address
-            
-            # Si l'adresse n'a pas de coordonnées, essayer de les géocoder
-            if not address.latitude or not address.longitude:
-                lat, lon = geocode_address(address)
-                if lat and lon:
-                    address.latitude = lat
-                    address.longitude = lon
-                    address.save()
+        for idx, itineraire in zip(ordre, itineraires):
+            arret = lignes[idx]
+            distance = float(distances[idx])
+            route_info = {
+                'duration_text': format_duration(itineraire['duration']),
+                'distance_text': format_distance(itineraire['distance'] / 1000) if itineraire['distance'] is not None else 'N/A',
+            } if itineraire else {}
             
-            # Calculer la distance si les coordonnées sont disponibles
-            if address.latitude and address.longitude:
-                # Calculer la distance en kilomètres
-                distance = calculate_distance(
-                    user_lat, user_lon,
-                    float(address.latitude), float(address.longitude)
-                )
-                
-                # Optionnel: utiliser OSRM pour un calcul plus précis (temps de trajet)
-                route_info = get_route_info_osrm(
-                    user_lat, user_lon,
-                    float(address.latitude), float(address.longitude)
-                )
-                
-                collections_with_distance.append({
-                    'id': str(collection.id),
-                    'subscription_id': str(collection.subscription.id),
-                    'client_name': collection.subscription.user.get_full_name() or collection.subscription.user.username,
-                    'client_phone': str(collection.subscription.user.phone) if collection.subscription.user.phone else '',
-                    'address': {
-                        'street': address.street,
-                        'city': address.city,
-                        'postal_code': address.postal_code,
-                        'latitude': float(address.latitude),
-                        'longitude': float(address.longitude),
-                    },
-                    'plan_name': collection.subscription.plan.name,
-                    'scheduled_time': collection.scheduled_time.strftime('%H:%M'),
-                    'scheduled_date': collection.scheduled_date.strftime('%Y-%m-%d'),
-                    'status': collection.status,
-                    'status_display': collection.get_status_display(),
-                    'distance_km': round(distance, 2),
-                    'distance_text': format_distance(distance),
-                    'duration_text': route_info.get('duration_text', 'N/A'),
-                    'route_distance_text': route_info.get('distance_text', 'N/A'),
-                    'special_instructions': collection.subscription.special_instructions,
-                    'zone_name': collection.subscription.zone.nom if collection.subscription.zone else 'N/A',
-                })
-        
-        # Trier par distance (plus proche au plus éloigné)
-        collections_with_distance.sort(key=lambda x: x['distance_km'])
-        
-        # Ajouter le rang
-        for idx, item in enumerate(collections_with_distance, 1):
-            item['rank'] = idx
+            collections_with_distance.append({
+                'id': str(arret.collecte_id),
+                'subscription_id': str(arret.subscription_id),
+                'client_name': arret.client_name,
+                'client_phone': arret.client_phone,
+                'address': {
+                    'street': arret.street,
+                    'city': arret.city,
+                    'postal_code': arret.postal_code,
+                    'latitude': arret.latitude,
+                    'longitude': arret.longitude,
+                },
+                'plan_name': arret.plan_name,
+                'scheduled_time': arret.scheduled_time.strftime('%H:%M'),
+                'scheduled_date': current_date.strftime('%Y-%m-%d'),
+                'status': arret.status,
+                'status_display': arret.get_status_display(),
+                'distance_km': round(distance, 2),
+                'distance_text': format_distance(distance),
+                'duration_text': route_info.get('duration_text', 'N/A'),
+                'route_distance_text': route_info.get('distance_text', 'N/A'),
+                'special_instructions': arret.special_instructions,
+                'zone_name': arret.zone_name or 'N/A',
+                'rank': len(collections_with_distance) + 1,
+            })
         
         # Statistiques
         stats = {
             'total': len(collections_with_distance),
+            'total_jour': len(lignes),
+            'sans_coordonnees': sum(1 for l in lignes if l.latitude is None or l.longitude is None),
             'closest': collections_with_distance[0]['client_name'] if collections_with_distance else None,
             'closest_distance': collections_with_distance[0]['distance_km'] if collections_with_distance else None,
             'farthest': collections_with_distance[-1]['client_name'] if collections_with_distance else None,
             'farthest_distance': collections_with_distance[-1]['distance_km'] if collections_with_distance else None,
         }
         
-        return JsonResponse({
+        if tournee is not None:
+            stats['route'] = {
+                'distance_km': round(tournee['distance'] / 1000, 2),
+                'distance_text': format_distance(tournee['distance'] / 1000),
+                'duration_s': round(tournee['duree']),
+                'duration_text': format_duration(tournee['duree']),
+            }
+        
+        response = JsonResponse({
             'success': True,
+            'mode': 'tournee' if tournee is not None else 'distance',
             'collections': collections_with_distance,
             'stats': stats,
             'user_position': {
@@ -439,6 +368,12 @@ def get_sorted_collections_by_distance(request):
                 'lon': user_lon
             }
         })
+        # Le manifeste vient peut-être d'être construit par arrets_du_jour
+        manifeste = manifeste or version_manifeste(tricycle, current_date)
+        if manifeste:
+            response['ETag'] = etag_classement(manifeste, user_lat, user_lon, parametres)
+            response['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         return JsonResponse({
@@ -446,94 +381,6 @@ def get_sorted_collections_by_distance(request):
             'error': str(e)
         }, status=500)
 
-def geocode_address(address):
-    """
-    Géocoder une adresse avec Nominatim (OpenStreetMap)
-    """
-    try:
-        # Construire l'adresse complète
-        full_address = f"{address.street}, {address.postal_code} {address.city}, {address.country}"
-        
-        # Appel à l'API Nominatim
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            'q': full_address,
-            'format': 'json',
-            'limit': 1
-        }
-        
-        # Important: ajouter un User-Agent pour respecter les conditions d'utilisation
-        headers = {
-            'User-Agent': 'WasteCollectionApp/1.0'
-        }
-        
-        response = requests.get(url, params=params, headers=headers)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                lat = float(data[0]['lat'])
-                lon = float(data[0]['lon'])
-                return lat, lon
-    except Exception as e:
-        print(f"Erreur de géocodage: {e}")
-    
-    return None, None
-
-def get_route_info_osrm(lat1, lon1, lat2, lon2):
-    """
-    Obtenir des informations de routage avec OSRM
-    """
-    try:
-        # Utiliser le serveur OSRM public
-        url = f"http://router.project-osrm.org/route/v1/driving/{lon1},{lat1};{lon2},{lat2}"
-        params = {
-            'overview': 'false',
-            'alternatives': 'false',
-            'steps': 'false'
-        }
-        
-        response = requests.get(url, params=params)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data['code'] == 'Ok' and data['routes']:
-                route = data['routes'][0]
-                duration = route['duration']  # en secondes
-                distance = route['distance']  # en mètres
-                
-                return {
-                    'duration': duration,
-                    'duration_text': format_duration(duration),
-                    'distance': distance,
-                    'distance_text': format_distance(distance / 1000)  # convertir en km
-                }
-    except Exception as e:
-        print(f"Erreur OSRM: {e}")
-    
-    return {
-        'duration': None,
-        'duration_text': 'N/A',
-        'distance': None,
-        'distance_text': 'N/A'
-    }
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculer la distance entre deux points (formule de Haversine)
-    """
-    R = 6371  # Rayon de la Terre en kilomètres
-    
-    lat1_rad = radians(lat1)
-    lat2_rad = radians(lat2)
-    delta_lat = radians(lat2 - lat1)
-    delta_lon = radians(lon2 - lon1)
-    
-    a = sin(delta_lat/2)**2 + cos(lat1_rad) * cos(lat2_rad) * sin(delta_lon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    
-    return R * c
-
 def format_distance(km):
     """
     Formater la distance de manière lisible
@@ -722,33 +569,12 @@ def collector_tricycle(request):
     try:
         tricycle = Tricycle.objects.get(conducteur=request.user)
         
-        # Statistiques d'utilisation
-        today = timezone.now().date()
-        
-        total_collections = CollectionRequest.objects.filter(
-            collector=request.user,
-            status='completed'
-        ).count()
-        
-        monthly_collections = CollectionRequest.objects.filter(
-            collector=request.user,
-            status='completed',
-            scheduled_date__month=today.month,
-            scheduled_date__year=today.year
-        ).count()
-        
-        weekly_collections = CollectionRequest.objects.filter(
-            collector=request.user,
-            status='completed',
-            scheduled_date__week=today.isocalendar()[1],
-            scheduled_date__year=today.year
-        ).count()
-        
-        daily_collections = CollectionRequest.objects.filter(
-            collector=request.user,
-            status='completed',
-            scheduled_date=today
-        ).count()
+        # Statistiques d'utilisation : une agrégation
+        stats = stats_demandes(request.user, timezone.now().date())
+        total_collections = stats['completed']
+        monthly_collections = stats['monthly']
+        weekly_collections = stats['weekly']
+        daily_collections = stats['daily']
         
         # Performance du tricycle (calcul simplifié)
         performance = {
@@ -785,31 +611,13 @@ def collector_profile(request):
     # Statistiques du collecteur
     today = timezone.now().date()
     
-    total_collections = CollectionRequest.objects.filter(
-        collector=user,
-        status='completed'
-    ).count()
-    
-    monthly_collections = CollectionRequest.objects.filter(
-        collector=user,
-        status='completed',
-        scheduled_date__month=today.month,
-        scheduled_date__year=today.year
-    ).count()
-    
-    weekly_collections = CollectionRequest.objects.filter(
-        collector=user,
-        status='completed',
-        scheduled_date__week=today.isocalendar()[1],
-        scheduled_date__year=today.year
-    ).count()
+    stats = stats_demandes(user, today)
+    total_collections = stats['completed']
+    monthly_collections = stats['monthly']
+    weekly_collections = stats['weekly']
     
     # Calcul des métriques de performance
-    all_collections = CollectionRequest.objects.filter(collector=user)
-    completed_count = all_collections.filter(status='completed').count()
-    total_count = all_collections.count()
-    
-    completion_rate = round((completed_count / total_count * 100) if total_count > 0 else 0, 1)
+    completion_rate = stats['completion_rate']
     avg_daily_collections = round(total_collections / 30, 1) if total_collections > 0 else 0  # Sur 30 jours
     
     # Autres métriques
@@ -1005,19 +813,13 @@ def api_collection_stats(request):
     """API pour les statistiques des collectes (AJAX)"""
     today = timezone.now().date()
     
-    # Statistiques du jour
-    today_stats = CollectionRequest.objects.filter(
-        collector=request.user,
-        scheduled_date=today
-    ).aggregate(
-        total=Count('id'),
-        completed=Count('id', filter=Q(status='completed')),
-        in_progress=Count('id', filter=Q(status='in_progress')),
-        pending=Count('id', filter=Q(status__in=['pending', 'scheduled']))
-    )
+    tricycle = Tricycle.objects.filter(conducteur=request.user).first()
+    stats = stats_tournees(tricycle, today)
     
     return JsonResponse({
-        'today': today_stats,
+        'today': dict(stats['today'], in_progress=demandes_en_cours(request.user, today)),
+        'week': stats['week'],
+        'upcoming': stats['upcoming'],
         'timestamp': timezone.now().isoformat()
     })
 
@@ -12,11 +12,13 @@ from django.views.decorators.http import require_POST
 import json
 import os
 
+from django.conf import settings
 from django.core.files.storage import default_storage
 from .models import (
     GasProduct, GasOrder, GasCylinder, GasInventory, 
     GasPromotion, GasDeliveryTracking, CustomUser, Tricycle, Zone, Notification, GasOrderItem
 )
+from .services.geo import objets_proches
 
 def is_admin(user):
     return user.is_authenticated and user.user_type == 'admin'
@@ -244,8 +246,23 @@ def admin_gaz_order_detail(request, order_id):
         
         return redirect('admin_gaz_order_detail', order_id=order.id)
     
+    # Commandes encore ouvertes autour de l'adresse, à confier au même livreur
+    # (candidats par la grille spatiale des adresses, puis distance exacte)
+    commandes_proches = []
+    if order.address.latitude is not None and order.address.longitude is not None:
+        commandes_proches = objets_proches(
+            GasOrder.objects.exclude(id=order.id).exclude(
+                status__in=['delivered', 'cancelled', 'failed']
+            ).select_related('address', 'assigned_collector'),
+            order.address.latitude,
+            order.address.longitude,
+            getattr(settings, 'GAS_DISPATCH_RADIUS_KM', 2),
+            chemin='address__'
+        )[:10]
+    
     context = {
         'order': order,
+        'commandes_proches': commandes_proches,
         'order_statuses': GasOrder.ORDER_STATUS_CHOICES,
         'available_collectors': CustomUser.objects.filter(
             user_type='collecteur', is_active=True
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.services.planning import etendre_fenetre_collectes, horizon_collectes
+
+
+class Command(BaseCommand):
+    help = "Prolonger la fenêtre glissante des collectes programmées (à lancer chaque nuit via cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semaines', type=int, default=None,
+            help="Taille de la fenêtre en semaines (par défaut COLLECTION_HORIZON_WEEKS)"
+        )
+
+    def handle(self, *args, **options):
+        if options['semaines']:
+            jusqu_au = timezone.now().date() + timedelta(weeks=options['semaines'])
+        else:
+            jusqu_au = horizon_collectes()
+
+        total = etendre_fenetre_collectes(jusqu_au=jusqu_au)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} collectes créées jusqu'au {jusqu_au.strftime('%d/%m/%Y')}"
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from app.services.geocodage import fournisseur_par_defaut, geocoder_adresses_sans_coordonnees
+
+
+class Command(BaseCommand):
+    help = "Géocoder les adresses sans coordonnées (tâche de fond, à lancer via cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limite', type=int, default=None,
+            help="Nombre maximal d'appels au fournisseur pour ce passage"
+        )
+        parser.add_argument(
+            '--fournisseur', default=None,
+            help="Chemin d'import de la classe du fournisseur (par défaut GEOCODING_PROVIDER)"
+        )
+        parser.add_argument(
+            '--reessayer-echecs', action='store_true',
+            help="Réinterroger le fournisseur pour les adresses déjà marquées introuvables"
+        )
+
+    def handle(self, *args, **options):
+        if options['fournisseur']:
+            fournisseur = import_string(options['fournisseur'])()
+        else:
+            fournisseur = fournisseur_par_defaut()
+
+        rapport = geocoder_adresses_sans_coordonnees(
+            fournisseur=fournisseur,
+            limite=options['limite'],
+            reessayer_echecs=options['reessayer_echecs']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['geocodees']}/{rapport['adresses']} adresses géocodées "
+            f"({rapport['appels']} appels {fournisseur.nom}, {rapport['cache']} depuis le cache, "
+            f"{rapport['introuvables']} introuvables, {rapport['erreurs']} erreurs)"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from app.services.maintenance import TACHES, executer_maintenance
+
+
+class Command(BaseCommand):
+    help = "Purger les données expirées par lots (notifications, commandes de gaz livrées, paiements ; à lancer chaque nuit via cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tache', action='append', choices=list(TACHES), dest='taches',
+            help="Tâche à exécuter (répétable ; toutes par défaut)"
+        )
+        parser.add_argument(
+            '--taille-lot', type=int, default=None,
+            help="Lignes supprimées par transaction (par défaut MAINTENANCE_TAILLE_LOT)"
+        )
+        parser.add_argument(
+            '--simulation', action='store_true',
+            help="Compter les lignes concernées sans rien supprimer"
+        )
+
+    def handle(self, *args, **options):
+        rapports = executer_maintenance(
+            taches=options['taches'],
+            taille_lot=options['taille_lot'],
+            simulation=options['simulation']
+        )
+        for rapport in rapports:
+            if 'erreur' in rapport:
+                self.stdout.write(self.style.ERROR(
+                    f"{rapport['tache']} : échec après {rapport['duree']} s ({rapport['erreur']})"
+                ))
+            else:
+                verbe = 'à supprimer' if options['simulation'] else f"supprimée(s) en {rapport['lots']} lot(s)"
+                self.stdout.write(self.style.SUCCESS(
+                    f"{rapport['tache']} : {rapport['supprimees']} ligne(s) {verbe}, {rapport['duree']} s"
+                ))
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.services.notation import noter_tricycles
+
+
+class Command(BaseCommand):
+    help = "Calculer la note quotidienne de chaque tricycle (à lancer chaque nuit via cron, pour la veille)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', default=None,
+            help="Jour à noter (AAAA-MM-JJ, hier par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+        else:
+            date = timezone.now().date() - timedelta(days=1)
+
+        rapport = noter_tricycles(date)
+        self.stdout.write(self.style.SUCCESS(
+            f"Notes du {date} : {rapport['notes_creees']} créée(s), {rapport['notes_mises_a_jour']} mise(s) à jour"
+        ))
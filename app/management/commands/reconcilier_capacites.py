@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from app.services.allocation import reconcilier_compteurs
+
+
+class Command(BaseCommand):
+    help = "Recalculer le nombre de clients de chaque programme tricycle (à lancer chaque nuit via cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Afficher les écarts sans corriger les compteurs"
+        )
+
+    def handle(self, *args, **options):
+        appliquer = not options['dry_run']
+        rapport = reconcilier_compteurs(appliquer=appliquer)
+
+        for ecart in rapport['ecarts']:
+            ligne = (
+                f"{ecart['zone']} - {ecart['tricycle']} ({ecart['jour']}) : "
+                f"compteur {ecart['compteur']} -> réel {ecart['reel']}"
+            )
+            if ecart['depassement']:
+                ligne += " [capacité dépassée]"
+            self.stdout.write(self.style.WARNING(ligne))
+
+        for zone in rapport['zones']:
+            if zone['abonnements_sans_jours']:
+                self.stdout.write(self.style.WARNING(
+                    f"{zone['zone']} : {zone['abonnements_sans_jours']} abonnement(s) actif(s) "
+                    f"sur {zone['total_abonnements']} sans jour de collecte"
+                ))
+
+        action = "corrigés" if appliquer else "à corriger"
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['programmes_verifies']} programmes vérifiés, {len(rapport['ecarts'])} compteurs {action}"
+        ))
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.services.statistiques import reconstruire_stats_collecteurs
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculer les statistiques quotidiennes des collecteurs à partir des demandes "
+        "et des commandes de gaz (rattrapage après import ou mise à jour groupée)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depuis', default=None,
+            help="Première date (AAAA-MM-JJ, il y a 30 jours par défaut)"
+        )
+        parser.add_argument(
+            '--jusqu-au', dest='jusqu_au', default=None,
+            help="Dernière date incluse (AAAA-MM-JJ, dans 30 jours par défaut)"
+        )
+
+    def _date(self, valeur, defaut):
+        if not valeur:
+            return defaut
+        try:
+            return datetime.strptime(valeur, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        debut = self._date(options['depuis'], today - timedelta(days=30))
+        fin = self._date(options['jusqu_au'], today + timedelta(days=30))
+        if debut > fin:
+            raise CommandError("La première date doit précéder la dernière")
+
+        crees, mises_a_jour = reconstruire_stats_collecteurs(debut, fin)
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques du {debut} au {fin} : {crees} ligne(s) créée(s), {mises_a_jour} recalculée(s)"
+        ))
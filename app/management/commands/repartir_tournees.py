@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.models import Zone
+from app.services.manifeste import construire_manifestes
+from app.services.repartition import repartir_collectes
+
+
+class Command(BaseCommand):
+    help = (
+        "Répartir les collectes du lendemain entre les tricycles de chaque zone puis écrire "
+        "les manifestes des collecteurs (à lancer chaque nuit via cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', default=None,
+            help="Date à répartir (AAAA-MM-JJ, demain par défaut)"
+        )
+        parser.add_argument(
+            '--zone', action='append', default=None,
+            help="Nom d'une zone à répartir (option répétable, toutes les zones par défaut)"
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ")
+        else:
+            date = timezone.now().date() + timedelta(days=1)
+
+        zones = Zone.objects.filter(nom__in=options['zone']) if options['zone'] else None
+        for rapport in repartir_collectes(date, zones=zones):
+            if 'erreur' in rapport:
+                self.stdout.write(self.style.ERROR(f"Zone {rapport['zone']} : {rapport['erreur']}"))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f"Zone {rapport['zone']} ({rapport['date']}) : {rapport['collectes']} collectes, "
+                f"{rapport['non_affectees'] + rapport['sans_coordonnees']} sans tricycle"
+            ))
+            for tricycle in rapport['tricycles']:
+                self.stdout.write(
+                    f"  {tricycle['tricycle']} : {tricycle['collectes']} collectes, "
+                    f"{tricycle['charge_kg']}/{tricycle['capacite_kg']} kg, ~{tricycle['duree_min']} min de trajet"
+                )
+
+        for tricycle, nombre in construire_manifestes(date).items():
+            self.stdout.write(f"Manifeste {tricycle} : {nombre} arrêts")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.services.replanification import executer_replanifications_dues
+
+
+class Command(BaseCommand):
+    help = "Exécuter les replanifications de zone en attente (worker : --boucle, ou cron chaque minute)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--boucle', action='store_true',
+            help="Tourner en continu au lieu de traiter une seule fois la file"
+        )
+        parser.add_argument(
+            '--intervalle', type=int, default=5,
+            help="Secondes entre deux passages en mode boucle"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for job in executer_replanifications_dues():
+                if job.status == 'done':
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Zone {job.rapport.get('zone', job.zone_id)} replanifiée "
+                        f"({job.nombre_demandes} modification(s)) : {job.rapport}"
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(
+                        f"Replanification {job.id} échouée : {job.erreur}"
+                    ))
+
+            if not options['boucle']:
+                break
+            time.sleep(options['intervalle'])
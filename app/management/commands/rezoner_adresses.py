@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Subscription
+from app.services.zonage import rezoner_adresses
+
+
+class Command(BaseCommand):
+    help = "Recalculer la zone des adresses à partir des polygones des zones (après modification des polygones)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Afficher les changements sans les enregistrer"
+        )
+        parser.add_argument(
+            '--abonnements', action='store_true',
+            help="Déplacer aussi les abonnements des adresses changées de zone (réaffectation des jours)"
+        )
+
+    def handle(self, *args, **options):
+        appliquer = not options['dry_run']
+        rapport, changees = rezoner_adresses(appliquer=appliquer)
+        self.stdout.write(
+            f"{rapport['adresses']} adresses, {rapport['changees']} changées de zone, "
+            f"{rapport['hors_zones']} hors de tout polygone"
+        )
+
+        if options['abonnements'] and appliquer and changees:
+            deplaces = 0
+            for subscription in Subscription.objects.filter(address_id__in=changees).select_related('address'):
+                if subscription.zone_id != subscription.address.zone_id:
+                    # Enregistrement complet : le cycle de vie libère et réaffecte les jours
+                    subscription.zone_id = subscription.address.zone_id
+                    subscription.save()
+                    deplaces += 1
+            self.stdout.write(f"{deplaces} abonnements déplacés")
+
+        if appliquer:
+            self.stdout.write(self.style.SUCCESS("Zones des adresses mises à jour"))
+        else:
+            self.stdout.write(self.style.WARNING("Simulation : rien n'a été enregistré"))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:57
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_token_alter_subscriptionplan_frequency_withdrawal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplanificationZone',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminée'), ('failed', 'Échouée')], default='pending', max_length=20)),
+                ('executer_apres', models.DateTimeField(verbose_name='Exécuter après')),
+                ('nombre_demandes', models.PositiveIntegerField(default=1, verbose_name='Modifications regroupées')),
+                ('jours_supprimes', models.JSONField(blank=True, default=list)),
+                ('rapport', models.JSONField(blank=True, default=dict)),
+                ('erreur', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replanifications', to='app.zone')),
+            ],
+            options={
+                'verbose_name': 'Replanification de zone',
+                'verbose_name_plural': 'Replanifications de zone',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'executer_apres'], name='app_replani_status_cf9e21_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('zone',), name='une_replanification_en_attente_par_zone')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_replanificationzone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodageAdresse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('adresse_normalisee', models.CharField(max_length=500, unique=True, verbose_name='Adresse normalisée')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=10, max_digits=14, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=10, max_digits=14, null=True)),
+                ('fournisseur', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': "Géocodage d'adresse",
+                'verbose_name_plural': "Géocodages d'adresses",
+            },
+        ),
+    ]
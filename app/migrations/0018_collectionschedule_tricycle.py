@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_geocodageadresse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionschedule',
+            name='ordre_tournee',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Ordre dans la tournée'),
+        ),
+        migrations.AddField(
+            model_name='collectionschedule',
+            name='tricycle',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='collectes_assignees', to='app.tricycle', verbose_name='Tricycle assigné'),
+        ),
+        migrations.AddIndex(
+            model_name='collectionschedule',
+            index=models.Index(fields=['tricycle', 'scheduled_date'], name='app_collect_tricycl_be0cf2_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_collectionschedule_tricycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManifesteTricycle',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('genere_le', models.DateTimeField(auto_now=True)),
+                ('tricycle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='manifestes', to='app.tricycle')),
+            ],
+            options={
+                'verbose_name': 'Manifeste de tournée',
+                'verbose_name_plural': 'Manifestes de tournée',
+                'ordering': ['-date'],
+                'unique_together': {('tricycle', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ArretManifeste',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordre', models.PositiveIntegerField(blank=True, null=True, verbose_name='Ordre dans la tournée')),
+                ('scheduled_time', models.TimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Programmée'), ('completed', 'Terminée'), ('cancelled', 'Annulée'), ('missed', 'Manquée')], max_length=20)),
+                ('client_name', models.CharField(max_length=300)),
+                ('client_phone', models.CharField(blank=True, max_length=50)),
+                ('street', models.CharField(max_length=255)),
+                ('city', models.CharField(max_length=100)),
+                ('postal_code', models.CharField(max_length=20)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('plan_name', models.CharField(max_length=100)),
+                ('zone_name', models.CharField(blank=True, max_length=100)),
+                ('special_instructions', models.TextField(blank=True)),
+                ('collecte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arrets_manifeste', to='app.collectionschedule')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.subscription')),
+                ('manifeste', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arrets', to='app.manifestetricycle')),
+            ],
+            options={
+                'verbose_name': 'Arrêt du manifeste',
+                'verbose_name_plural': 'Arrêts du manifeste',
+                'ordering': ['scheduled_time', 'ordre'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+from app.services.geo import geohash
+
+
+def remplir_geohash(apps, schema_editor):
+    Address = apps.get_model('app', 'Address')
+    adresses = []
+    for address in Address.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude'):
+        address.geohash = geohash(address.latitude, address.longitude)
+        adresses.append(address)
+    Address.objects.bulk_update(adresses, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_manifestetricycle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(remplir_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_address_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='manifestetricycle',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def remplir_stats(apps, schema_editor):
+    CollectionRequest = apps.get_model('app', 'CollectionRequest')
+    GasOrder = apps.get_model('app', 'GasOrder')
+    CollectorDailyStats = apps.get_model('app', 'CollectorDailyStats')
+
+    valeurs = {}
+    for ligne in CollectionRequest.objects.filter(collector__isnull=False).values('collector_id', 'scheduled_date').annotate(
+        scheduled_count=Count('id'),
+        completed_count=Count('id', filter=Q(status='completed')),
+        missed_count=Count('id', filter=Q(status='missed')),
+    ):
+        valeurs.setdefault((ligne.pop('collector_id'), ligne.pop('scheduled_date')), {}).update(ligne)
+    for ligne in GasOrder.objects.filter(
+        assigned_collector__isnull=False, status='delivered', scheduled_date__isnull=False
+    ).values('assigned_collector_id', 'scheduled_date').annotate(gas_deliveries=Count('id'), revenue=Sum('total_amount')):
+        valeurs.setdefault((ligne.pop('assigned_collector_id'), ligne.pop('scheduled_date')), {}).update(ligne)
+
+    CollectorDailyStats.objects.bulk_create([
+        CollectorDailyStats(collector_id=collector_id, date=date, **champs)
+        for (collector_id, date), champs in valeurs.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_manifestetricycle_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectorDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scheduled_count', models.PositiveIntegerField(default=0, verbose_name='Demandes assignées')),
+                ('completed_count', models.PositiveIntegerField(default=0, verbose_name='Demandes terminées')),
+                ('missed_count', models.PositiveIntegerField(default=0, verbose_name='Demandes manquées')),
+                ('gas_deliveries', models.PositiveIntegerField(default=0, verbose_name='Livraisons de gaz')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Montant livré')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('collector', models.ForeignKey(limit_choices_to={'user_type': 'collecteur'}, on_delete=django.db.models.deletion.CASCADE, related_name='stats_quotidiennes', to=settings.AUTH_USER_MODEL, verbose_name='Collecteur')),
+            ],
+            options={
+                'verbose_name': 'Statistiques quotidiennes du collecteur',
+                'verbose_name_plural': 'Statistiques quotidiennes des collecteurs',
+                'ordering': ['-date', '-completed_count'],
+                'indexes': [models.Index(fields=['date'], name='app_collect_date_af584f_idx')],
+                'unique_together': {('collector', 'date')},
+            },
+        ),
+        migrations.RunPython(remplir_stats, migrations.RunPython.noop),
+    ]
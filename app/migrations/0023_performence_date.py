@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0022_collectordailystats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='performence',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddIndex(
+            model_name='performence',
+            index=models.Index(fields=['date'], name='app_perform_date_43f751_idx'),
+        ),
+    ]
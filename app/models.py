@@ -3,19 +3,22 @@ import datetime
 from io import BytesIO
 from django.conf import settings
 from django.db import models, transaction
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
 # Create your models here.
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import uuid
 
 import qrcode
 
+from .services.geo import geohash
+
 # models pour la ville des utilisateurs
 class City(models.Model):
     city = models.CharField(max_length=100, unique=True)
@@ -156,6 +159,8 @@ class Zone(models.Model):
     couleur = models.CharField(max_length=20, blank=True, help_text="Couleur pour l'affichage sur la carte")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Sert de version aux polygones gardés en mémoire par chaque processus (services/zonage.py)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = "Zone géographique"
@@ -165,6 +170,24 @@ class Zone(models.Model):
     def __str__(self):
         return f"{self.nom} - {self.ville}"
 
+    def clean(self):
+        from .services.zonage import lire_polygones
+
+        try:
+            lire_polygones(self.polygone_coordinates)
+        except ValueError as e:
+            raise ValidationError({'polygone_coordinates': str(e)})
+
+
+# Les polygones des zones sont gardés en mémoire par le résolveur : le recharger
+@receiver(post_save, sender=Zone)
+@receiver(post_delete, sender=Zone)
+def invalider_polygones_zones(sender, instance, **kwargs):
+    from .services.zonage import invalider_zones
+
+    invalider_zones()
+
+
 class ProgrammeTricycle(models.Model):
     JOUR_SEMAINE_CHOICES = (
         ('lundi', 'Lundi'),
@@ -206,99 +229,98 @@ class ProgrammeTricycle(models.Model):
 
 
 # signal pour mettre à jour le programme de collecte lorsque le programme des tricycles est modifié
+@receiver(pre_save, sender=ProgrammeTricycle)
+def memoriser_zone_programme(sender, instance, **kwargs):
+    """
+    Garder la zone d'origine du programme pour replanifier aussi l'ancienne zone
+    si le programme change de zone.
+    """
+    instance._zone_precedente_id = ProgrammeTricycle.objects.filter(
+        pk=instance.pk
+    ).values_list('zone_id', flat=True).first()
+
+
+@receiver(pre_delete, sender=ProgrammeTricycle)
+def memoriser_jours_programme(sender, instance, **kwargs):
+    """
+    Les jours d'abonnement liés au programme sont supprimés en cascade :
+    on garde les couples (abonnement, jour) pour nettoyer leurs collectes futures.
+    """
+    instance._jours_supprimes = list(
+        instance.jours_abonnement.values_list('subscription_id', 'day_id')
+    )
+
+
 # Signal pour mettre à jour les collectes quand le programme des tricycles change
 @receiver(post_save, sender=ProgrammeTricycle)
 @receiver(post_delete, sender=ProgrammeTricycle)
 def mettre_a_jour_collectes_zone(sender, instance, **kwargs):
     """
-    Signal pour refaire le programme de collecte des ordures pour les abonnements
-    qui sont dans une zone à chaque fois que le programme des tricycles change dans cette zone.
+    Signal pour replanifier les collectes des abonnements d'une zone à chaque fois
+    que le programme des tricycles change dans cette zone.
+    La replanification est mise en file d'attente (une seule par zone pour une rafale
+    de modifications) et exécutée par la commande replanifier_zones.
     """
-    from django.db import transaction
-    from .views import generate_collection_schedule
-    
-    zone = instance.zone
-    
-    # Récupérer tous les abonnements actifs dans cette zone
-    abonnements_zone = Subscription.objects.filter(
-        zone=zone,
-        status='active',
-         # S'assurer que l'adresse est bien dans cette zone
-    ).select_related('plan', 'user')
-    
-    if not abonnements_zone.exists():
+    from .services.replanification import planifier_replanification_zone
+
+    # Suppression en cascade d'une zone : il n'y a plus rien à replanifier
+    origine = kwargs.get('origin')
+    if isinstance(origine, Zone) or getattr(origine, 'model', None) is Zone:
         return
-    
-    # verifier s'il ya un programe des tricycles qui à ete modifier il ya moint de 2 min pour eviter les mise à jour unitile du programme de collecte
-    if instance.created_at and timezone.now() - instance.created_at < timedelta(minutes=2):
-        
 
+    zone_ids = [instance.zone_id]
+    zone_precedente_id = getattr(instance, '_zone_precedente_id', None)
+    if zone_precedente_id and zone_precedente_id != instance.zone_id:
+        zone_ids.append(zone_precedente_id)
 
+    jours_supprimes = getattr(instance, '_jours_supprimes', None)
+    instance.replanifications = [
+        planifier_replanification_zone(
+            zone_id,
+            jours_supprimes=jours_supprimes if zone_id == instance.zone_id else None
+        )
+        for zone_id in zone_ids
+    ]
 
-        with transaction.atomic():
-            for subscription in abonnements_zone:
-            # Supprimer les anciens jours de collecte pour cet abonnement
-                anciens_jours = SubscriptionDay.objects.filter(
-                subscription=subscription
-                )
-            
-            # Mettre à jour les compteurs des programmes tricycles
-                for jour in anciens_jours:
-                    if jour.programme_tricycle:
-                        programme = jour.programme_tricycle
-                        programme.clients_actuels = max(0, programme.clients_actuels - 1)
-                        programme.save()
-            
-            
-            
-            
-            # Supprimer les anciens programmes de collecte
-                CollectionSchedule.objects.filter(
-                    subscription=subscription,
-                    status='scheduled'
-                ).delete()
-            
-            # Réassigner automatiquement les nouveaux jours de collecte
-                nouveaux_jours = subscription.assigner_jours_collecte_automatique()
-                print(f"Nouvelle assignation de jours pour l'abonnement {subscription.id}: {[str(jour.day) for jour in nouveaux_jours]}")
-            
-            # Générer le nouveau programme de collecte
-                a = generate_collection_schedule(subscription)
-            
-            
 
-            
-            # Créer une notification pour informer l'utilisateur
-            if nouveaux_jours:
-                jours_formates = [jour.day.get_name_display() for jour in nouveaux_jours]
-                message = (
-                    f"Le programme de collecte dans votre zone ({zone.nom}) a été modifié. "
-                    f"Vos nouveaux jours de collecte sont : {', '.join(jours_formates)}. "
-                    f"Veuillez consulter votre programme mis à jour."
-                )
-                
-                Notification.create_notification(
-                    user=subscription.user,
-                    title="Programme de collecte mis à jour",
-                    message=message,
-                    notification_type='info',
-                    related_object=subscription,
-                    action_url=f'/subscriptions/{subscription.id}/'
-                )
-            else:
-                # Si aucun jour n'est disponible, notifier l'utilisateur
-                Notification.create_notification(
-                    user=subscription.user,
-                    title="Attention : Programme de collecte",
-                    message=(
-                        f"Suite à la modification du programme dans votre zone ({zone.nom}), "
-                        f"aucun créneau n'est actuellement disponible pour votre abonnement. "
-                        f"Notre équipe vous contactera sous peu pour régulariser votre situation."
-                    ),
-                    notification_type='warning',
-                    related_object=subscription,
-                    action_url=f'/subscriptions/{subscription.id}/'
-                )
+class ReplanificationZone(models.Model):
+    """Replanification d'une zone en attente ou exécutée par le worker"""
+    STATUS_CHOICES = (
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='replanifications')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    executer_apres = models.DateTimeField(verbose_name="Exécuter après")
+    nombre_demandes = models.PositiveIntegerField(default=1, verbose_name="Modifications regroupées")
+    jours_supprimes = models.JSONField(default=list, blank=True)
+    rapport = models.JSONField(default=dict, blank=True)
+    erreur = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "Replanification de zone"
+        verbose_name_plural = "Replanifications de zone"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'executer_apres']),
+        ]
+        constraints = [
+            # Une seule replanification en attente par zone : les suivantes s'y regroupent
+            models.UniqueConstraint(
+                fields=['zone'], condition=models.Q(status='pending'),
+                name='une_replanification_en_attente_par_zone'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Replanification {self.zone_id} - {self.get_status_display()}"
 
 
 # Signal supplémentaire pour gérer les cas où une zone est désactivée
@@ -341,37 +363,53 @@ def gerer_changement_zone(sender, instance, created, **kwargs):
 
 
 # Fonction utilitaire pour vérifier la cohérence des programmes
-def verifier_coherence_programmes(zone):
+def verifier_coherence_programmes(zone=None):
     """
     Vérifier que tous les abonnements dans une zone ont des jours de collecte valides
-    par rapport aux programmes tricycles actuels
+    par rapport aux programmes tricycles actuels.
+
+    Sans zone, toutes les zones sont vérifiées en une passe (requêtes groupées par zone)
+    et la fonction retourne la liste des rapports.
     """
-    from django.db.models import Count
-    
-    programmes = ProgrammeTricycle.objects.filter(
-        zone=zone,
-        is_active=True
-    ).values('jour_semaine').annotate(
+    from django.db.models import Count, Q
+
+    zones = Zone.objects.all() if zone is None else Zone.objects.filter(pk=zone.pk)
+    programmes = ProgrammeTricycle.objects.filter(is_active=True)
+    abonnements = Subscription.objects.filter(status='active')
+    if zone is not None:
+        programmes = programmes.filter(zone=zone)
+        abonnements = abonnements.filter(zone=zone)
+
+    programmes_par_zone = {}
+    for ligne in programmes.values('zone_id', 'jour_semaine').annotate(
         places_total=models.Sum('capacite_max_clients'),
         places_utilisees=models.Sum('clients_actuels')
-    )
-    
-    abonnements = Subscription.objects.filter(
-        zone=zone,
-        status='active'
-    ).annotate(
-        nb_jours=Count('collection_days')
-    )
-    
-    rapport = {
-        'zone': zone.nom,
-        'programmes': list(programmes),
-        'total_abonnements': abonnements.count(),
-        'abonnements_sans_jours': abonnements.filter(nb_jours=0).count(),
-        'date_verification': timezone.now()
+    ).order_by('zone_id', 'jour_semaine'):
+        programmes_par_zone.setdefault(ligne.pop('zone_id'), []).append(ligne)
+
+    abonnements_par_zone = {
+        ligne['zone_id']: ligne
+        for ligne in abonnements.values('zone_id').annotate(
+            total=Count('id', distinct=True),
+            sans_jours=Count('id', filter=Q(collection_days__isnull=True), distinct=True)
+        ).order_by()
     }
-    
-    return rapport
+
+    date_verification = timezone.now()
+    rapports = []
+    for zone_id, nom in zones.values_list('id', 'nom'):
+        compte = abonnements_par_zone.get(zone_id, {})
+        rapports.append({
+            'zone': nom,
+            'programmes': programmes_par_zone.get(zone_id, []),
+            'total_abonnements': compte.get('total', 0),
+            'abonnements_sans_jours': compte.get('sans_jours', 0),
+            'date_verification': date_verification
+        })
+
+    if zone is not None:
+        return rapports[0] if rapports else None
+    return rapports
 
 
 
@@ -387,6 +425,9 @@ class Address(models.Model):
     zone = models.ForeignKey(Zone, on_delete=models.SET_NULL, null=True, blank=True, related_name='adresses', verbose_name="Zone géographique")
     latitude = models.DecimalField(max_digits=14, decimal_places=10, blank=True, null=True)
     longitude = models.DecimalField(max_digits=14, decimal_places=10, blank=True, null=True)
+    # Cellule de la grille spatiale (geohash), tenue à jour à l'enregistrement :
+    # recherche des adresses proches par plages indexées (voir services.geo.filtre_proximite)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     lien = models.URLField(blank=True, verbose_name="Lien Google Maps")
@@ -399,6 +440,53 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.title} - {self.city}"
 
+    def calculer_geohash(self):
+        if self.latitude in (None, '') or self.longitude in (None, ''):
+            self.geohash = ''
+        else:
+            self.geohash = geohash(self.latitude, self.longitude)
+        return self.geohash
+
+    def save(self, *args, **kwargs):
+        ancien_geohash = self.geohash
+        self.calculer_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+
+        # Zone déduite des coordonnées (polygones des zones) quand elles changent ;
+        # une adresse hors de tout polygone garde la zone choisie à la main
+        if self.geohash and (self.geohash != ancien_geohash or self.zone_id is None):
+            from .services.zonage import resolveur_zones
+
+            zone_id = resolveur_zones().zone_pour(self.latitude, self.longitude)
+            if zone_id and zone_id != self.zone_id:
+                self.zone_id = zone_id
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = set(kwargs['update_fields']) | {'zone'}
+        super().save(*args, **kwargs)
+
+
+class GeocodageAdresse(models.Model):
+    """Cache du géocodage : adresse normalisée -> coordonnées (nulles si introuvable)"""
+    adresse_normalisee = models.CharField(max_length=500, unique=True, verbose_name="Adresse normalisée")
+    latitude = models.DecimalField(max_digits=14, decimal_places=10, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=14, decimal_places=10, blank=True, null=True)
+    fournisseur = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Géocodage d'adresse"
+        verbose_name_plural = "Géocodages d'adresses"
+
+    def __str__(self):
+        return self.adresse_normalisee
+
+    @property
+    def trouve(self):
+        return self.latitude is not None and self.longitude is not None
+
 class Subscription(models.Model):
     STATUS_CHOICES = (
         ('active', 'Actif'),
@@ -432,50 +520,54 @@ class Subscription(models.Model):
     
     def __str__(self):
         return f"Abonnement {self.plan.name} - {self.user.username}"
+
+    # Champs dont la modification impose de replanifier les collectes
+    CHAMPS_PLANIFICATION = ('status', 'zone', 'plan', 'start_date', 'end_date')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._memoriser_etat_initial()
+        return instance
+
+    def _valeur_champ(self, nom):
+        field = self._meta.get_field(nom)
+        return field.to_python(getattr(self, field.attname))
+
+    def _memoriser_etat_initial(self):
+        """Garder les valeurs chargées depuis la base pour détecter les changements"""
+        self._etat_initial = {
+            nom: self._valeur_champ(nom)
+            for nom in self.CHAMPS_PLANIFICATION
+            if self._meta.get_field(nom).attname in self.__dict__
+        }
+
+    def champs_modifies(self):
+        """
+        Retourne les champs de planification modifiés depuis le chargement
+        (tous pour un abonnement qui n'a pas encore été enregistré).
+        """
+        etat_initial = getattr(self, '_etat_initial', None)
+        if etat_initial is None:
+            return set(self.CHAMPS_PLANIFICATION)
+        return {
+            nom for nom in self.CHAMPS_PLANIFICATION
+            if nom not in etat_initial or self._valeur_champ(nom) != etat_initial[nom]
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Les signaux post_save ont vu l'ancien état : on repart de l'état enregistré
+        self._memoriser_etat_initial()
     
     def assigner_jours_collecte_automatique(self):
         """
         Assigner automatiquement les jours de collecte basés sur la zone et la disponibilité des tricycles
+        (réservation atomique des places : voir services.allocation)
         """
-        from django.db import transaction
-        
-        
-        
-        zone = self.zone
-        programmes_disponibles = ProgrammeTricycle.objects.filter(
-            zone=zone,
-            is_active=True
-        ).order_by('jour_semaine')
-        
-        jours_assignes = []
+        from .services.allocation import assigner_jours_abonnements
 
-        # on ajoute automatique du tricycle à un abonement
-        
-        
-        with transaction.atomic():
-            for programme in programmes_disponibles:
-                if programme.peut_ajouter_client():
-                    # Créer le jour de collecte pour cet abonnement
-                    jour_collecte, created = SubscriptionDay.objects.get_or_create(
-                        subscription=self,
-                        day=CollectionDay.objects.get(name=programme.jour_semaine),
-                        defaults={
-                            'time_slot': programme.heure_debut,
-                            'is_active': True
-                        }
-                    )
-                    
-                    if created:
-                        # Mettre à jour le compteur de clients du programme
-                        programme.clients_actuels += 1
-                        programme.save()
-                        jours_assignes.append(jour_collecte)
-                        
-                        # S'arrêter si on a atteint le nombre maximum de collectes par semaine
-                        if len(jours_assignes) >= self.plan.max_collections_per_week:
-                            break
-        
-        return jours_assignes
+        return assigner_jours_abonnements([self]).get(self.pk, [])
 
 class SubscriptionDay(models.Model):
     subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='collection_days')
@@ -597,6 +689,17 @@ class CollectionSchedule(models.Model):
     collector_notes = models.TextField(blank=True)
     customer_notes = models.TextField(blank=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    # Répartition de la journée entre les tricycles de la zone (commande repartir_tournees) ;
+    # sans affectation, la collecte reste visible par tous les collecteurs de la zone
+    tricycle = models.ForeignKey(
+        Tricycle,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='collectes_assignees',
+        verbose_name="Tricycle assigné"
+    )
+    ordre_tournee = models.PositiveIntegerField(blank=True, null=True, verbose_name="Ordre dans la tournée")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -606,102 +709,98 @@ class CollectionSchedule(models.Model):
         indexes = [
             models.Index(fields=['subscription', 'scheduled_date']),
             models.Index(fields=['scheduled_date', 'status']),
+            models.Index(fields=['tricycle', 'scheduled_date']),
         ]
     
     def __str__(self):
         return f"Collecte {self.scheduled_date} - {self.subscription}"
     
-# signal pour creer un programme de collecte automatiquement après la création d'un abonnement
 
-
-
-@receiver(post_save, sender=Subscription)
-def supprimer_programmes_collecte_abonnement_inactif(sender, instance, **kwargs):
+class ManifesteTricycle(models.Model):
     """
-    Signal pour supprimer automatiquement les programmes de collecte
-    lorsqu'un abonnement devient inactif
+    Manifeste précalculé d'un tricycle pour une date (commande repartir_tournees,
+    ou construit à la première consultation) : les vues collecteur lisent ses
+    lignes au lieu de reconstruire tricycle → zones → abonnements → collectes.
     """
-    # Vérifier si le statut de l'abonnement n'est pas 'active'
-    
-    
-    if instance.status == 'active':
-       from .views import generate_collection_schedule
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tricycle = models.ForeignKey(Tricycle, on_delete=models.CASCADE, related_name='manifestes')
+    date = models.DateField()
+    genere_le = models.DateTimeField(auto_now=True)
+    # Incrémentée à chaque changement d'une ligne : sert d'ETag aux vues qui interrogent le manifeste
+    version = models.PositiveIntegerField(default=1)
 
-       # Créer une notification pour informer l'utilisateur
-       if instance.user:
-            Notification.create_notification(
-                user=instance.user,
-                title="Abonnement désactivé",
-                message=f"Votre abonnement {instance.plan.name} a été désactivé. Les collectes programmées ont été annulées.",
-                notification_type='warning',
-                related_object=instance,
-                action_url=f'/subscriptions/{instance.id}/'
-            )
-    
+    class Meta:
+        verbose_name = "Manifeste de tournée"
+        verbose_name_plural = "Manifestes de tournée"
+        ordering = ['-date']
+        unique_together = ['tricycle', 'date']
 
-        # verifier s'il ya un payement reussis pour cette abonnement qui date de moin de 2 min pour eviter les creation de programme de collecte sans payement reussis
-       if not Payment.objects.filter(subscription=instance, status='completed', payment_date__gte=timezone.now() - timedelta(minutes=5)).exists():
-           
-           # compter le nomre de mois entre le jour de debut de l'abonnement et le jour de fin de l'abonnement ou le jour actuel si le jour de fin est null
-           
-           nombre_de_mois = (instance.end_date.year - instance.start_date.year) * 12 + (instance.end_date.month - instance.start_date.month)
-           print(f"Nombre de mois depuis le début de l'abonnement: {nombre_de_mois}")
-           
-           Payment.objects.create(
-            subscription=instance,
-            amount=instance.custom_price*nombre_de_mois if instance.custom_price else instance.plan.price*nombre_de_mois,
-            status='completed',
-            payment_date=timezone.now(),
-            due_date=timezone.now(),
-       )
-
-       #generation automatique du qr code de paiement après réabonnement
-       qr_code, created = SubscriptionQRCode.objects.get_or_create(subscription=instance)
-       # Générer l'image QR code si elle n'existe pas
-       if not qr_code.qr_code_image:
-        # Générer le QR code
-            qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        
-            renewal_url = qr_code.get_renewal_url()
-            qr.add_data(renewal_url)
-            qr.make(fit=True)
-        
-        # Créer l'image
-            img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Sauvegarder l'image
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-        
-        # Sauvegarder dans le modèle
-            filename = f"subscription_{instance.id}_qr.png"
-            qr_code.qr_code_image.save(filename, buffer, save=True)
+    def __str__(self):
+        return f"Manifeste {self.tricycle} - {self.date}"
 
 
+class ArretManifeste(models.Model):
+    """Une collecte du manifeste, avec les informations client déjà dénormalisées"""
+    manifeste = models.ForeignKey(ManifesteTricycle, on_delete=models.CASCADE, related_name='arrets')
+    collecte = models.ForeignKey(CollectionSchedule, on_delete=models.CASCADE, related_name='arrets_manifeste')
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='+')
+    ordre = models.PositiveIntegerField(blank=True, null=True, verbose_name="Ordre dans la tournée")
+    scheduled_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=CollectionSchedule.STATUS_CHOICES)
+    client_name = models.CharField(max_length=300)
+    client_phone = models.CharField(max_length=50, blank=True)
+    street = models.CharField(max_length=255)
+    city = models.CharField(max_length=100)
+    postal_code = models.CharField(max_length=20)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    plan_name = models.CharField(max_length=100)
+    zone_name = models.CharField(max_length=100, blank=True)
+    special_instructions = models.TextField(blank=True)
 
-       if CollectionSchedule.objects.filter(subscription=instance).count() == 0:
-            instance.assigner_jours_collecte_automatique()
-            generate_collection_schedule(instance)
-    
-       else:
-            # Si des programmes de collecte existent déjà, les supprimer et les recréer
-            CollectionSchedule.objects.filter(subscription=instance).delete()
-            instance.assigner_jours_collecte_automatique()
-            generate_collection_schedule(instance)
+    class Meta:
+        verbose_name = "Arrêt du manifeste"
+        verbose_name_plural = "Arrêts du manifeste"
+        ordering = ['scheduled_time', 'ordre']
 
-    else:
-        # Supprimer les programmes de collecte associés à cet abonnement
-        CollectionSchedule.objects.filter(subscription=instance).delete()
+    def __str__(self):
+        return f"{self.client_name} - {self.scheduled_time}"
 
 
+# Manifestes précalculés : le statut et l'horaire d'une collecte enregistrée suivent
+# sur ses lignes de manifeste, sans reconstruire le manifeste
+@receiver(post_save, sender=CollectionSchedule)
+def mettre_a_jour_arrets_manifeste(sender, instance, created, **kwargs):
+    if created:
+        return
+    modifies = ArretManifeste.objects.filter(collecte=instance).exclude(
+        status=instance.status, scheduled_time=instance.scheduled_time
+    ).update(status=instance.status, scheduled_time=instance.scheduled_time)
+    if modifies:
+        ManifesteTricycle.objects.filter(arrets__collecte=instance).update(version=models.F('version') + 1)
+
 
+@receiver(post_delete, sender=ArretManifeste)
+def retirer_arret_manifeste(sender, instance, **kwargs):
+    """
+    Collecte supprimée (désactivation, changement de zone ou de plan, replanification) :
+    ses lignes partent en cascade, la version du manifeste change pour que les vues
+    conditionnelles (ETag) renvoient la nouvelle liste. Rien à faire quand c'est le
+    manifeste lui-même qui est supprimé (invalidation, reconstruction).
+    """
+    origine = kwargs.get('origin')
+    if isinstance(origine, ManifesteTricycle) or getattr(origine, 'model', None) is ManifesteTricycle:
+        return
+    ManifesteTricycle.objects.filter(pk=instance.manifeste_id).update(version=models.F('version') + 1)
 
 
+# Cycle de vie d'un abonnement : un seul signal, un pipeline ordonné
+# (paiement → jours de collecte → programme de collecte → QR code → notification)
+@receiver(post_save, sender=Subscription)
+def gerer_cycle_vie_abonnement(sender, instance, created, **kwargs):
+    from .services.subscription_lifecycle import SubscriptionLifecycleService
+
+    SubscriptionLifecycleService().handle(instance, created=created)
 
 
 # Fonctions utilitaires
@@ -734,14 +833,6 @@ def creer_programme_collecte_automatique(subscription):
     """
     return subscription.assigner_jours_collecte_automatique()
 
-# Signal pour assigner automatiquement les jours de collecte après la création d'un abonnement
-
-
-@receiver(post_save, sender=Subscription)
-def assigner_jours_collecte(sender, instance, created, **kwargs):
-    if created and instance.status == 'active':
-        creer_programme_collecte_automatique(instance)
-
 
 
 
@@ -776,12 +867,6 @@ class SubscriptionQRCode(models.Model):
     
 
 
-# signal pour creer des qrcode automatiquement apres reabonnement 
-@receiver(post_save, sender=Subscription)
-def create_subscription_qr_code(sender, instance, created, **kwargs):
-    if created:
-        SubscriptionQRCode.objects.get_or_create(subscription=instance)
-
 
 
 # Ajouter à la fin de models.py
@@ -868,20 +953,6 @@ def notify_collection_status_change(sender, instance, created, **kwargs):
 
 
 
-@receiver(post_save, sender=Subscription)
-def notify_subscription_status(sender, instance, created, **kwargs):
-    if created:
-        Notification.create_notification(
-            user=instance.user,
-            title="Abonnement créé",
-            message=f"Votre abonnement {instance.plan.name} a été créé avec succès",
-            notification_type='success',
-            related_object=instance,
-            action_url=f'/subscriptions/{instance.id}/'
-        )
-
-
-
 # model django pour les reabonnement
 
 
@@ -1302,30 +1373,66 @@ def generate_periodic_summaries():
 
 
 class Performence(models.Model):
+    """Note quotidienne d'un tricycle, calculée chaque nuit (commande noter_tricycles)"""
     Tricycle = models.ForeignKey(Tricycle, on_delete=models.CASCADE, related_name='responsables')
     note = models.FloatField(max_length=2)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=timezone.localdate)
+
+    class Meta:
+        indexes = [models.Index(fields=['date'])]
 
     def __str__(self):
         return self.Tricycle.conducteur
 
 
+class CollectorDailyStats(models.Model):
+    """
+    Cumul quotidien par collecteur, tenu à jour par les signaux de CollectionRequest et
+    GasOrder (commande reconstruire_stats_collecteurs pour le recalculer) : les pages
+    de profil et les classements le lisent au lieu de recompter les demandes.
+    Les livraisons de gaz restent comptées après la purge des commandes livrées.
+    """
+    collector = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='stats_quotidiennes',
+                                  limit_choices_to={'user_type': 'collecteur'}, verbose_name="Collecteur")
+    date = models.DateField()
+    scheduled_count = models.PositiveIntegerField(default=0, verbose_name="Demandes assignées")
+    completed_count = models.PositiveIntegerField(default=0, verbose_name="Demandes terminées")
+    missed_count = models.PositiveIntegerField(default=0, verbose_name="Demandes manquées")
+    gas_deliveries = models.PositiveIntegerField(default=0, verbose_name="Livraisons de gaz")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Montant livré")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Statistiques quotidiennes du collecteur"
+        verbose_name_plural = "Statistiques quotidiennes des collecteurs"
+        unique_together = ['collector', 'date']
+        indexes = [models.Index(fields=['date'])]
+        ordering = ['-date', '-completed_count']
 
-# signale pour supprimer mes notifications après 3 jours
-@receiver(post_save, sender=Notification)
-def delete_old_notifications(sender, instance, **kwargs):
-    Notification.objects.filter(
-        created_at__lt=timezone.now() - timezone.timedelta(days=3)
-    ).delete()
+    def __str__(self):
+        return f"{self.collector.username} - {self.date}"
 
 
-# signal pour supprimer les payements reussi apres 3 jours
-@receiver(post_save, sender=Payment)
-def delete_old_payments(sender, instance, **kwargs):
-    Payment.objects.filter(
-        created_at__lt=timezone.now() - timezone.timedelta(days=3),
-        status='completed'
-    ).delete()
+
+# Cumuls quotidiens des collecteurs (CollectorDailyStats)
+@receiver(pre_save, sender=CollectionRequest)
+def memoriser_etat_demande(sender, instance, **kwargs):
+    instance._etat_precedent = CollectionRequest.objects.filter(pk=instance.pk).values_list(
+        'collector_id', 'scheduled_date', 'status'
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=CollectionRequest)
+@receiver(post_delete, sender=CollectionRequest)
+def cumuler_stats_demande(sender, instance, **kwargs):
+    from .services.statistiques import appliquer_variation, contribution_demande
+
+    actuel = contribution_demande(instance.collector_id, instance.scheduled_date, instance.status)
+    if kwargs.get('signal') is post_delete:
+        appliquer_variation(actuel, {})
+    else:
+        precedent = getattr(instance, '_etat_precedent', None)
+        appliquer_variation(contribution_demande(*precedent) if precedent else {}, actuel)
 
 
 # model pour compter le nombre de mois de reabonnement avant la date d'echeance pour chaque abonnement 
@@ -1920,6 +2027,55 @@ def handle_gas_order_status_change(sender, instance, created, **kwargs):
             )
 
 
+@receiver(pre_save, sender=GasOrder)
+def memoriser_etat_commande_gaz(sender, instance, **kwargs):
+    """Garder le livreur, le statut, la date et le montant d'origine (compteurs et cumuls)"""
+    instance._etat_precedent = GasOrder.objects.filter(pk=instance.pk).values_list(
+        'assigned_collector_id', 'status', 'scheduled_date', 'total_amount'
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=GasOrder)
+def invalider_compteurs_livreur(sender, instance, **kwargs):
+    """
+    Compteurs en cache de la barre latérale des livreurs concernés par la modification,
+    invalidés après la validation de la transaction : une lecture faite entre-temps
+    ne peut pas remettre en cache l'ancien état.
+    """
+    from .services.compteurs_gaz import invalider_compteurs_gaz
+
+    precedent = getattr(instance, '_etat_precedent', None)
+    if precedent and precedent[:3] == (instance.assigned_collector_id, instance.status, instance.scheduled_date):
+        return
+    livreurs = (instance.assigned_collector_id, precedent[0] if precedent else None)
+    transaction.on_commit(lambda: invalider_compteurs_gaz(*livreurs))
+
+
+@receiver(post_save, sender=GasOrder)
+def cumuler_stats_livraison(sender, instance, **kwargs):
+    """
+    Livraisons et montant livré du livreur ; la suppression d'une commande (purge des
+    commandes livrées) ne retire rien : le cumul garde l'historique.
+    """
+    from .services.statistiques import appliquer_variation, contribution_livraison
+
+    precedent = getattr(instance, '_etat_precedent', None)
+    appliquer_variation(
+        contribution_livraison(*precedent) if precedent else {},
+        contribution_livraison(
+            instance.assigned_collector_id, instance.status, instance.scheduled_date, instance.total_amount
+        )
+    )
+
+
+@receiver(post_delete, sender=GasOrder)
+def invalider_compteurs_livreur_suppression(sender, instance, **kwargs):
+    from .services.compteurs_gaz import invalider_compteurs_gaz
+
+    livreur_id = instance.assigned_collector_id
+    transaction.on_commit(lambda: invalider_compteurs_gaz(livreur_id))
+
+
 @receiver(post_save, sender=GasOrderItem)
 def update_order_totals(sender, instance, **kwargs):
     """Mettre à jour les totaux de la commande quand un item est ajouté/modifié"""
@@ -0,0 +1,205 @@
+import logging
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from app.models import (
+    CollectionDay, ProgrammeTricycle, SubscriptionDay, verifier_coherence_programmes
+)
+from app.services.planning import _ordre_programme, recompter_clients_programmes
+
+
+logger = logging.getLogger(__name__)
+
+
+def charger_jours_collecte():
+    """Jours de collecte indexés par nom, en une requête (au lieu d'un get() par programme)"""
+    return {jour.name: jour for jour in CollectionDay.objects.all()}
+
+
+def reserver_places(programme_id, nombre):
+    """
+    Réserver jusqu'à `nombre` places sur un programme, sans perte de mise à jour
+    entre inscriptions concurrentes : l'UPDATE ne passe que si la capacité le permet
+    (clients_actuels + n <= capacite_max_clients), l'incrément est fait par la base.
+
+    Retourne le nombre de places réellement obtenues.
+    """
+    while nombre > 0:
+        reservees = ProgrammeTricycle.objects.filter(
+            pk=programme_id,
+            is_active=True,
+            clients_actuels__lte=F('capacite_max_clients') - nombre,
+        ).update(clients_actuels=F('clients_actuels') + nombre)
+        if reservees:
+            return nombre
+
+        # Pas assez de places : on relit ce qui reste et on retente avec moins
+        restantes = ProgrammeTricycle.objects.filter(pk=programme_id, is_active=True).values_list(
+            'capacite_max_clients', 'clients_actuels'
+        ).first()
+        if restantes is None:
+            return 0
+        nombre = min(nombre - 1, restantes[0] - restantes[1])
+    return 0
+
+
+def liberer_places(compteurs):
+    """Rendre des places aux programmes : {programme_id: nombre}"""
+    for programme_id, nombre in compteurs.items():
+        ProgrammeTricycle.objects.filter(
+            pk=programme_id, clients_actuels__gte=nombre
+        ).update(clients_actuels=F('clients_actuels') - nombre)
+
+
+def liberer_jours(subscriptions):
+    """Supprimer les jours de collecte des abonnements et rendre leurs places aux programmes"""
+    jours = SubscriptionDay.objects.filter(subscription__in=[s.pk for s in subscriptions])
+    liberer_places(Counter(
+        programme_id
+        for programme_id in jours.values_list('programme_tricycle_id', flat=True)
+        if programme_id
+    ))
+    jours.delete()
+
+
+def assigner_jours_abonnements(subscriptions, jours_collecte=None):
+    """
+    Assigner les jours de collecte d'un lot d'abonnements, zone par zone.
+
+    Chaque programme actif de la zone (dans l'ordre de la semaine) est proposé aux
+    abonnements qui n'ont pas encore atteint `max_collections_per_week` ; les places
+    sont réservées en un seul UPDATE conditionnel par programme. Les abonnements qui
+    ont le moins de jours sont servis en premier, puis dans l'ordre du lot (charger
+    le lot avec select_related('plan')).
+
+    Requêtes : jours de collecte + programmes + jours existants + 1 à 2 par programme
+    + 1 bulk_create, quel que soit le nombre d'abonnements.
+
+    Retourne {subscription_id: [SubscriptionDay créés]}.
+    """
+    subscriptions = [s for s in subscriptions if s.zone_id]
+    if not subscriptions:
+        return {}
+
+    if jours_collecte is None:
+        jours_collecte = charger_jours_collecte()
+
+    par_zone = defaultdict(list)
+    for subscription in subscriptions:
+        par_zone[subscription.zone_id].append(subscription)
+
+    programmes_par_zone = defaultdict(list)
+    for programme in ProgrammeTricycle.objects.filter(zone_id__in=par_zone, is_active=True):
+        programmes_par_zone[programme.zone_id].append(programme)
+
+    jours_pris = defaultdict(set)
+    for subscription_id, day_id in SubscriptionDay.objects.filter(
+        subscription__in=[s.pk for s in subscriptions]
+    ).values_list('subscription_id', 'day_id'):
+        jours_pris[subscription_id].add(day_id)
+
+    assignations = defaultdict(list)
+    with transaction.atomic():
+        for zone_id, abonnements in par_zone.items():
+            for programme in sorted(programmes_par_zone[zone_id], key=_ordre_programme):
+                jour = jours_collecte.get(programme.jour_semaine)
+                if jour is None:
+                    logger.warning("Jour de collecte inconnu pour le programme %s", programme.pk)
+                    continue
+
+                # Les abonnements qui ont le moins de jours passent en premier (tri stable)
+                candidats = sorted(
+                    (
+                        s for s in abonnements
+                        if jour.pk not in jours_pris[s.pk]
+                        and len(jours_pris[s.pk]) < s.plan.max_collections_per_week
+                    ),
+                    key=lambda s: len(jours_pris[s.pk])
+                )
+                if not candidats or programme.places_disponibles() <= 0:
+                    continue
+
+                obtenues = reserver_places(programme.pk, min(len(candidats), programme.places_disponibles()))
+                programme.clients_actuels += obtenues
+                for subscription in candidats[:obtenues]:
+                    jours_pris[subscription.pk].add(jour.pk)
+                    assignations[subscription.pk].append(SubscriptionDay(
+                        subscription=subscription,
+                        day=jour,
+                        time_slot=programme.heure_debut,
+                        programme_tricycle=programme,
+                        is_active=True,
+                    ))
+
+        SubscriptionDay.objects.bulk_create(
+            [jour for jours in assignations.values() for jour in jours]
+        )
+
+    return dict(assignations)
+
+
+def occupation_programmes():
+    """Nombre de jours de collecte rattachés à chaque programme, en une requête GROUP BY"""
+    return dict(
+        SubscriptionDay.objects.filter(programme_tricycle__isnull=False)
+        .values('programme_tricycle')
+        .annotate(nombre=Count('id'))
+        .order_by()
+        .values_list('programme_tricycle', 'nombre')
+    )
+
+
+def reconcilier_compteurs(appliquer=True, taille_lot=500):
+    """
+    Recalculer `clients_actuels` de tous les programmes à partir des jours de collecte
+    (à appeler via cron : python manage.py reconcilier_capacites).
+
+    Les compteurs faux sont corrigés par bulk_update ; le rapport liste les écarts
+    et la cohérence de chaque zone.
+    """
+    occupation = occupation_programmes()
+
+    ecarts = []
+    a_corriger = []
+    verifies = 0
+    for programme in ProgrammeTricycle.objects.select_related('zone', 'tricycle').only(
+        'id', 'jour_semaine', 'heure_debut', 'clients_actuels', 'capacite_max_clients',
+        'zone__nom', 'tricycle__nom'
+    ):
+        verifies += 1
+        reel = occupation.get(programme.id, 0)
+        if programme.clients_actuels == reel:
+            continue
+        ecarts.append({
+            'programme_id': programme.id,
+            'zone': programme.zone.nom,
+            'tricycle': programme.tricycle.nom,
+            'jour': programme.jour_semaine,
+            'compteur': programme.clients_actuels,
+            'reel': reel,
+            'ecart': programme.clients_actuels - reel,
+            'depassement': reel > programme.capacite_max_clients,
+        })
+        programme.clients_actuels = reel
+        a_corriger.append(programme)
+
+    if appliquer and a_corriger:
+        # Recalcul par la base : une réservation faite depuis la lecture n'est pas perdue
+        for debut in range(0, len(a_corriger), taille_lot):
+            recompter_clients_programmes(
+                ProgrammeTricycle.objects.filter(id__in=[p.id for p in a_corriger[debut:debut + taille_lot]])
+            )
+
+    if ecarts:
+        logger.warning("%s compteurs de programmes incohérents%s", len(ecarts), " corrigés" if appliquer else "")
+
+    return {
+        'date': timezone.now(),
+        'programmes_verifies': verifies,
+        'ecarts': ecarts,
+        'corriges': len(a_corriger) if appliquer else 0,
+        'zones': verifier_coherence_programmes(),
+    }
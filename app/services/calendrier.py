@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+from app.models import CollectionSchedule, ProgrammeTricycle, Subscription, SubscriptionDay
+from app.services.planning import get_day_offset
+
+
+# Plage maximale d'un calendrier (en jours) : une année
+DUREE_MAX_CALENDRIER = 366
+
+
+def occurrences(jour_semaine, debut, fin):
+    """Dates d'un jour de la semaine ('lundi'...) comprises entre debut et fin inclus"""
+    date = debut + timedelta(days=get_day_offset(jour_semaine, debut))
+    while date <= fin:
+        yield date
+        date += timedelta(days=7)
+
+
+def calendrier_abonnement(subscription, debut, fin):
+    """
+    Calendrier d'un abonnement calculé à partir de ses règles (SubscriptionDay),
+    sans dépendre des lignes CollectionSchedule matérialisées.
+
+    Les lignes existantes de la période (collecte terminée, manquée, annulée ou
+    recalée) remplacent l'occurrence calculée du même jour. Les dates passées ne
+    viennent que de ces lignes ; les règles ne sont dépliées qu'à partir
+    d'aujourd'hui et dans la durée de l'abonnement.
+
+    Deux requêtes, quelle que soit la longueur de la période.
+    """
+    lignes = CollectionSchedule.objects.filter(
+        subscription=subscription,
+        scheduled_date__range=(debut, fin)
+    ).select_related('scheduled_day')
+    surcharges = {(l.scheduled_date, l.scheduled_day_id): l for l in lignes}
+
+    collectes = {
+        cle: {
+            'date': ligne.scheduled_date,
+            'day': ligne.scheduled_day.get_name_display(),
+            'time': ligne.scheduled_time,
+            'status': ligne.get_status_display(),
+            'status_code': ligne.status,
+            'virtuelle': False,
+        }
+        for cle, ligne in surcharges.items()
+    }
+
+    start_date = Subscription._meta.get_field('start_date').to_python(subscription.start_date)
+    end_date = Subscription._meta.get_field('end_date').to_python(subscription.end_date)
+    regle_debut = max(d for d in (debut, timezone.now().date(), start_date) if d)
+    regle_fin = min(fin, end_date) if end_date else fin
+
+    if subscription.status == 'active' and regle_debut <= regle_fin:
+        jours = SubscriptionDay.objects.filter(
+            subscription=subscription, is_active=True
+        ).select_related('day')
+        for jour in jours:
+            for date in occurrences(jour.day.name, regle_debut, regle_fin):
+                collectes.setdefault((date, jour.day_id), {
+                    'date': date,
+                    'day': jour.day.get_name_display(),
+                    'time': jour.time_slot,
+                    'status': dict(CollectionSchedule.STATUS_CHOICES)['scheduled'],
+                    'status_code': 'scheduled',
+                    'virtuelle': True,
+                })
+
+    return sorted(collectes.values(), key=lambda c: (c['date'], c['time']))
+
+
+def calendrier_zone(zone, debut, fin):
+    """
+    Calendrier d'une zone calculé à partir des programmes tricycles actifs, avec,
+    pour chaque tournée, le nombre de collectes déjà enregistrées par statut.
+
+    Deux requêtes, quelle que soit la longueur de la période.
+    """
+    programmes = ProgrammeTricycle.objects.filter(
+        zone=zone, is_active=True
+    ).select_related('tricycle')
+
+    statuts = {}
+    for ligne in CollectionSchedule.objects.filter(
+        subscription__zone=zone,
+        scheduled_date__range=(debut, fin)
+    ).values('scheduled_date', 'scheduled_day__name', 'status').annotate(
+        nombre=Count('id')
+    ).order_by():
+        cle = (ligne['scheduled_date'], ligne['scheduled_day__name'])
+        statuts.setdefault(cle, {})[ligne['status']] = ligne['nombre']
+
+    tournees = []
+    for programme in programmes:
+        programme_debut = max(debut, programme.date_debut) if programme.date_debut else debut
+        programme_fin = min(fin, programme.date_fin) if programme.date_fin else fin
+        for date in occurrences(programme.jour_semaine, programme_debut, programme_fin):
+            tournees.append({
+                'date': date,
+                'jour': programme.jour_semaine,
+                'jour_display': programme.get_jour_semaine_display(),
+                'heure_debut': programme.heure_debut,
+                'heure_fin': programme.heure_fin,
+                'tricycle': programme.tricycle.nom,
+                'clients': programme.clients_actuels,
+                'places_restantes': programme.places_disponibles(),
+                'collectes': statuts.get((date, programme.jour_semaine), {}),
+            })
+
+    return sorted(tournees, key=lambda t: (t['date'], t['heure_debut']))
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from app.models import GasOrder
+
+
+# Livraisons du jour encore à faire, et statuts qui sortent une commande de la liste du livreur
+STATUTS_DU_JOUR = ['confirmed', 'preparing', 'assigned', 'in_transit']
+STATUTS_TERMINES = ['delivered', 'cancelled', 'failed']
+
+
+def cle_compteurs_gaz(collecteur_id, jour):
+    # La date fait partie de la clé : le compteur du jour repart de zéro à minuit
+    return f"gaz:compteurs:{collecteur_id}:{jour.isoformat()}"
+
+
+def calculer_compteurs_gaz(collecteur_id, jour=None):
+    """Compteurs de la barre latérale du livreur, recalculés en une requête"""
+    jour = jour or timezone.now().date()
+    return GasOrder.objects.filter(
+        assigned_collector_id=collecteur_id
+    ).exclude(
+        status__in=STATUTS_TERMINES
+    ).aggregate(
+        today_gas_count=Count('id', filter=Q(scheduled_date=jour, status__in=STATUTS_DU_JOUR)),
+        assigned_gas_count=Count('id'),
+    )
+
+
+def compteurs_gaz(collecteur_id):
+    """
+    Compteurs en cache par livreur, invalidés par les signaux de GasOrder ; recalculés
+    si absents. La durée de vie (GAS_COUNTERS_CACHE_SECONDS) borne l'écart laissé par
+    les mises à jour groupées (queryset.update) qui ne déclenchent pas de signal, et
+    celui des autres processus quand le cache n'est pas partagé (voir invalider_compteurs_gaz).
+    """
+    jour = timezone.now().date()
+    cle = cle_compteurs_gaz(collecteur_id, jour)
+    compteurs = cache.get(cle)
+    if compteurs is None:
+        compteurs = calculer_compteurs_gaz(collecteur_id, jour)
+        cache.set(cle, compteurs, getattr(settings, 'GAS_COUNTERS_CACHE_SECONDS', 300))
+    return compteurs
+
+
+def invalider_compteurs_gaz(*collecteur_ids):
+    """
+    Supprime les compteurs du jour des livreurs. Avec un cache partagé (REDIS_URL),
+    l'invalidation vaut pour tous les processus ; avec le cache mémoire par défaut,
+    seulement pour le processus courant, les autres se mettant à jour au plus tard
+    après GAS_COUNTERS_CACHE_SECONDS (retard accepté).
+    """
+    jour = timezone.now().date()
+    cache.delete_many([cle_compteurs_gaz(i, jour) for i in set(collecteur_ids) if i is not None])
@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+from django.db.models import Q
+
+
+RAYON_TERRE_KM = 6371
+KM_PAR_DEGRE = 111.32
+
+# Geohash : une cellule de la grille par préfixe ; 9 caractères ≈ 5 m de côté
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+
+
+def distances_km(lat, lon, latitudes, longitudes):
+    """
+    Distances (formule de Haversine) entre un point et un tableau de points,
+    calculées en une seule passe NumPy. Les coordonnées manquantes (None)
+    donnent une distance NaN.
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+
+    a = (
+        np.sin((latitudes - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(latitudes) * np.sin((longitudes - lon) / 2) ** 2
+    )
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def classer_par_distance(distances, limit=None, max_distance=None):
+    """
+    Indices des points triés du plus proche au plus éloigné, après filtrage :
+    points sans coordonnées écartés, distance <= max_distance, `limit` premiers.
+
+    Avec une limite, seuls les `limit` plus proches sont triés (partition) ; les
+    ex aequo sont départagés par indice, comme un tri complet stable.
+    """
+    distances = np.asarray(distances, dtype=float)
+    candidats = np.flatnonzero(~np.isnan(distances))
+    if max_distance is not None:
+        candidats = candidats[distances[candidats] <= max_distance]
+
+    if limit is not None and 0 < limit < len(candidats):
+        valeurs = distances[candidats]
+        seuil = np.partition(valeurs, limit - 1)[limit - 1]
+        retenus = valeurs < seuil
+        # Places restantes : premiers ex aequo au seuil, dans l'ordre des indices
+        retenus[np.flatnonzero(valeurs == seuil)[:limit - retenus.sum()]] = True
+        candidats = candidats[retenus]
+
+    return candidats[np.argsort(distances[candidats], kind='stable')]
+
+
+def geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Code geohash d'un point : les points proches partagent un préfixe"""
+    lat, lon = float(lat), float(lon)
+    lat_min, lat_max, lon_min, lon_max = -90.0, 90.0, -180.0, 180.0
+    code, valeur, bits, pair = [], 0, 0, True
+    while len(code) < precision:
+        if pair:
+            milieu = (lon_min + lon_max) / 2
+            if lon >= milieu:
+                valeur, lon_min = valeur * 2 + 1, milieu
+            else:
+                valeur, lon_max = valeur * 2, milieu
+        else:
+            milieu = (lat_min + lat_max) / 2
+            if lat >= milieu:
+                valeur, lat_min = valeur * 2 + 1, milieu
+            else:
+                valeur, lat_max = valeur * 2, milieu
+        pair = not pair
+        bits += 1
+        if bits == 5:
+            code.append(GEOHASH_ALPHABET[valeur])
+            valeur, bits = 0, 0
+    return ''.join(code)
+
+
+def dimensions_cellule(precision):
+    """(hauteur, largeur) en degrés d'une cellule geohash"""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def cellules_voisines(lat, lon, rayon_km):
+    """
+    Préfixes geohash couvrant le disque (lat, lon, rayon_km) : la cellule du point
+    et ses huit voisines, à la précision la plus fine dont les cellules sont au
+    moins aussi grandes que le rayon.
+    """
+    lat, lon = float(lat), float(lon)
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    precision = 1
+    while precision < GEOHASH_PRECISION:
+        hauteur, largeur = dimensions_cellule(precision + 1)
+        if min(hauteur * KM_PAR_DEGRE, largeur * KM_PAR_DEGRE * cos_lat) < rayon_km:
+            break
+        precision += 1
+
+    hauteur, largeur = dimensions_cellule(precision)
+    cellules = set()
+    for dlat in (-hauteur, 0, hauteur):
+        for dlon in (-largeur, 0, largeur):
+            voisin_lat = min(max(lat + dlat, -90.0), 90.0)
+            voisin_lon = (lon + dlon + 180) % 360 - 180
+            cellules.add(geohash(voisin_lat, voisin_lon, precision))
+    return sorted(cellules)
+
+
+def filtre_proximite(lat, lon, rayon_km, champ='geohash'):
+    """
+    Filtre des candidats proches : une plage par cellule voisine sur la colonne
+    geohash indexée (pas de LIKE, que SQLite n'indexe pas). À affiner par distance.
+    """
+    filtre = Q()
+    for prefixe in cellules_voisines(lat, lon, rayon_km):
+        # '{' suit 'z' : [prefixe, prefixe + '{') contient tous les codes du préfixe
+        filtre |= Q(**{f'{champ}__gte': prefixe, f'{champ}__lt': prefixe + '{'})
+    return filtre
+
+
+def objets_proches(queryset, lat, lon, rayon_km, chemin=''):
+    """
+    Objets du queryset à moins de rayon_km du point, du plus proche au plus éloigné :
+    [(objet, distance_km)]. `chemin` mène à l'adresse (ex. 'address__' pour une
+    commande) ; candidats par la grille, puis distance exacte en une passe.
+    """
+    candidats = list(queryset.filter(filtre_proximite(lat, lon, rayon_km, champ=f'{chemin}geohash')))
+    if not candidats:
+        return []
+
+    def adresse(objet):
+        for attribut in filter(None, chemin.split('__')):
+            objet = getattr(objet, attribut)
+        return objet
+
+    adresses = [adresse(objet) for objet in candidats]
+    distances = distances_km(
+        lat, lon, [a.latitude for a in adresses], [a.longitude for a in adresses]
+    )
+    ordre = classer_par_distance(distances, max_distance=rayon_km)
+    return [(candidats[i], float(distances[i])) for i in ordre]
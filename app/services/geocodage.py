@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from app.models import Address, GeocodageAdresse
+from app.services.http_async import ClientAsync, LimiteurDebit
+from app.services.zonage import resolveur_zones
+
+
+logger = logging.getLogger(__name__)
+
+
+def normaliser_adresse(address):
+    """Clé du cache : adresse complète en minuscules, sans accents ni ponctuation superflue"""
+    texte = f"{address.street}, {address.postal_code} {address.city}, {address.country}"
+    texte = unicodedata.normalize('NFKD', texte).encode('ascii', 'ignore').decode('ascii')
+    texte = re.sub(r'[^\w,]+', ' ', texte.lower())
+    texte = re.sub(r'\s*,\s*', ', ', texte)
+    return re.sub(r'\s+', ' ', texte).strip(' ,')[:500]
+
+
+class NominatimProvider:
+    """
+    Géocodage avec Nominatim (OpenStreetMap). Les conditions d'utilisation imposent
+    un User-Agent et au plus une requête par seconde : un seau à jetons espace les
+    départs, et quelques requêtes peuvent être en vol en même temps pour que la
+    latence d'une réponse ne retarde pas l'appel suivant.
+    """
+    nom = 'nominatim'
+    url = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, intervalle_min=None, timeout=10, concurrence=None):
+        self.intervalle_min = intervalle_min if intervalle_min is not None else getattr(
+            settings, 'GEOCODING_MIN_INTERVAL', 1.0
+        )
+        self.timeout = timeout
+        self.concurrence = concurrence or getattr(settings, 'GEOCODING_CONCURRENCE', 2)
+
+    @staticmethod
+    def _coordonnees(data):
+        if data:
+            return float(data[0]['lat']), float(data[0]['lon'])
+        return None, None
+
+    async def geocoder_plusieurs(self, adresses):
+        """
+        Géocoder des adresses en parallèle : {adresse: (lat, lon) ou exception}.
+        Une fois le disjoncteur ouvert, les adresses restantes échouent sans appel.
+        """
+        limiteur = LimiteurDebit(1 / self.intervalle_min) if self.intervalle_min else None
+        async with ClientAsync(self.nom, concurrence=self.concurrence, limiteur=limiteur,
+                               timeout=self.timeout) as client:
+            async def geocoder(adresse):
+                data = await client.get_json(self.url, params={'q': adresse, 'format': 'json', 'limit': 1})
+                return self._coordonnees(data)
+
+            resultats = await asyncio.gather(*(geocoder(a) for a in adresses), return_exceptions=True)
+        return dict(zip(adresses, resultats))
+
+    def geocoder(self, adresse):
+        """Retourne (lat, lon) ou (None, None) ; lève une exception si le service est injoignable"""
+        resultat = asyncio.run(self.geocoder_plusieurs([adresse]))[adresse]
+        if isinstance(resultat, Exception):
+            raise resultat
+        return resultat
+
+
+class StubProvider:
+    """
+    Fournisseur local, sans réseau, pour les tests et le développement : les adresses
+    connues viennent du dictionnaire, les autres reçoivent des coordonnées stables
+    calculées à partir de l'adresse autour de GEOCODING_STUB_CENTER.
+    """
+    nom = 'stub'
+
+    def __init__(self, coordonnees=None):
+        self.coordonnees = coordonnees
+        self.appels = 0
+
+    def geocoder(self, adresse):
+        self.appels += 1
+        if self.coordonnees is not None:
+            return self.coordonnees.get(adresse, (None, None))
+
+        lat, lon = getattr(settings, 'GEOCODING_STUB_CENTER', (4.05, 9.7))
+        empreinte = hashlib.md5(adresse.encode('utf-8')).digest()
+        return (
+            round(lat + (empreinte[0] - 128) / 2560, 6),
+            round(lon + (empreinte[1] - 128) / 2560, 6),
+        )
+
+
+def fournisseur_par_defaut():
+    """Fournisseur configuré par GEOCODING_PROVIDER (chemin d'import de la classe)"""
+    return import_string(getattr(
+        settings, 'GEOCODING_PROVIDER', 'app.services.geocodage.NominatimProvider'
+    ))()
+
+
+def _geocoder_tout(fournisseur, adresses):
+    """{adresse: (lat, lon) ou exception} ; en parallèle si le fournisseur le permet"""
+    if not adresses:
+        return {}
+    if hasattr(fournisseur, 'geocoder_plusieurs'):
+        return asyncio.run(fournisseur.geocoder_plusieurs(adresses))
+    resultats = {}
+    for adresse in adresses:
+        try:
+            resultats[adresse] = fournisseur.geocoder(adresse)
+        except Exception as e:
+            resultats[adresse] = e
+    return resultats
+
+
+def geocoder_adresses_sans_coordonnees(fournisseur=None, limite=None, reessayer_echecs=False):
+    """
+    Géocoder les adresses sans coordonnées (à lancer en tâche de fond :
+    python manage.py geocoder_adresses).
+
+    Les adresses identiques une fois normalisées ne coûtent qu'un appel ; les
+    réponses, y compris « introuvable », sont gardées dans GeocodageAdresse et les
+    adresses mises à jour par bulk_update, avec leur zone déduite des polygones
+    (même règle qu'Address.save : hors de tout polygone, la zone ne change pas).
+    """
+    fournisseur = fournisseur or fournisseur_par_defaut()
+
+    adresses = Address.objects.filter(latitude__isnull=True) | Address.objects.filter(longitude__isnull=True)
+    par_cle = {}
+    for address in adresses.order_by('created_at'):
+        par_cle.setdefault(normaliser_adresse(address), []).append(address)
+
+    cache = {g.adresse_normalisee: g for g in GeocodageAdresse.objects.filter(adresse_normalisee__in=list(par_cle))}
+
+    rapport = {'adresses': sum(len(a) for a in par_cle.values()), 'appels': 0, 'cache': 0, 'introuvables': 0, 'erreurs': 0}
+    a_appeler = []
+    for cle in par_cle:
+        entree = cache.get(cle)
+        if entree is not None and (entree.trouve or not reessayer_echecs):
+            rapport['cache'] += 1
+        elif limite is None or len(a_appeler) < limite:
+            a_appeler.append(cle)
+    rapport['appels'] = len(a_appeler)
+
+    en_erreur = set()
+    for cle, resultat in _geocoder_tout(fournisseur, a_appeler).items():
+        if isinstance(resultat, Exception):
+            # Service injoignable : on réessaiera au prochain passage
+            logger.warning(f"Géocodage impossible pour « {cle} » : {resultat}")
+            en_erreur.add(cle)
+            continue
+        lat, lon = resultat
+        cache[cle], _ = GeocodageAdresse.objects.update_or_create(
+            adresse_normalisee=cle,
+            defaults={'latitude': lat, 'longitude': lon, 'fournisseur': fournisseur.nom}
+        )
+
+    a_mettre_a_jour = []
+    for cle, groupe in par_cle.items():
+        entree = cache.get(cle)
+        if entree is None or cle in en_erreur:
+            continue
+        if not entree.trouve:
+            rapport['introuvables'] += len(groupe)
+            continue
+        for address in groupe:
+            address.latitude = entree.latitude
+            address.longitude = entree.longitude
+            address.calculer_geohash()
+            a_mettre_a_jour.append(address)
+
+    # bulk_update ne passe pas par Address.save : zones résolues ici, en une passe vectorisée
+    zones = resolveur_zones().zones_pour(
+        [float(a.latitude) for a in a_mettre_a_jour], [float(a.longitude) for a in a_mettre_a_jour]
+    )
+    for address, zone_id in zip(a_mettre_a_jour, zones):
+        if zone_id is not None:
+            address.zone_id = zone_id
+
+    Address.objects.bulk_update(a_mettre_a_jour, ['latitude', 'longitude', 'geohash', 'zone'], batch_size=500)
+    rapport['erreurs'] = len(en_erreur)
+    rapport['geocodees'] = len(a_mettre_a_jour)
+    return rapport
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Réponses qui valent la peine d'être redemandées (surcharge, panne passagère)
+STATUTS_A_REESSAYER = {429, 500, 502, 503, 504}
+
+_disjoncteurs = {}
+_verrou_disjoncteurs = threading.Lock()
+
+
+class ServiceIndisponible(Exception):
+    """Le disjoncteur du service est ouvert : l'appel n'est pas tenté"""
+
+
+class LimiteurDebit:
+    """
+    Seau à jetons : `taux` jetons par seconde, au plus `capacite` accumulés.
+    Avec taux=1 et capacite=1, au plus une requête par seconde (politique Nominatim),
+    quel que soit le nombre de tâches en attente.
+    """
+
+    def __init__(self, taux, capacite=1):
+        self.taux = taux
+        self.capacite = capacite
+        self.jetons = capacite
+        self._horodatage = time.monotonic()
+        self._verrou = asyncio.Lock()
+
+    def _remplir(self):
+        maintenant = time.monotonic()
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self._horodatage) * self.taux)
+        self._horodatage = maintenant
+
+    async def acquerir(self):
+        # Le verrou fait passer les tâches une à une : l'ordre d'arrivée est respecté
+        async with self._verrou:
+            self._remplir()
+            if self.jetons < 1:
+                await asyncio.sleep((1 - self.jetons) / self.taux)
+                self._remplir()
+            self.jetons -= 1
+
+
+class Disjoncteur:
+    """
+    Après `seuil` échecs consécutifs, le service est considéré en panne pendant
+    `delai` secondes : les appels échouent aussitôt au lieu d'attendre le timeout.
+    Passé ce délai, un appel d'essai est autorisé (semi-ouvert) ; son succès referme
+    le disjoncteur, son échec le rouvre. Partagé entre threads (vues synchrones).
+    """
+
+    def __init__(self, nom, seuil=None, delai=None):
+        self.nom = nom
+        self.seuil = seuil or getattr(settings, 'DISJONCTEUR_SEUIL', 5)
+        self.delai = delai or getattr(settings, 'DISJONCTEUR_DELAI_SECONDES', 60)
+        self.echecs = 0
+        self.ouvert_depuis = None
+        self._essai_en_cours = False
+        self._verrou = threading.Lock()
+
+    @property
+    def etat(self):
+        if self.ouvert_depuis is None:
+            return 'ferme'
+        if time.monotonic() - self.ouvert_depuis < self.delai:
+            return 'ouvert'
+        return 'semi-ouvert'
+
+    def autorise(self):
+        with self._verrou:
+            etat = self.etat
+            if etat == 'ferme':
+                return True
+            if etat == 'semi-ouvert' and not self._essai_en_cours:
+                self._essai_en_cours = True
+                return True
+            return False
+
+    def succes(self):
+        with self._verrou:
+            self.echecs = 0
+            self.ouvert_depuis = None
+            self._essai_en_cours = False
+
+    def echec(self):
+        with self._verrou:
+            self.echecs += 1
+            if self._essai_en_cours or self.echecs >= self.seuil:
+                if self.ouvert_depuis is None:
+                    logger.warning(f"Service {self.nom} indisponible : appels suspendus {self.delai} s")
+                self.ouvert_depuis = time.monotonic()
+            self._essai_en_cours = False
+
+
+def disjoncteur(nom):
+    """Disjoncteur du processus pour un service externe (un par nom)"""
+    with _verrou_disjoncteurs:
+        if nom not in _disjoncteurs:
+            _disjoncteurs[nom] = Disjoncteur(nom)
+        return _disjoncteurs[nom]
+
+
+class ClientAsync:
+    """
+    Client HTTP asynchrone (httpx) pour les services externes : au plus `concurrence`
+    requêtes en vol, débit borné par un LimiteurDebit, nouvelles tentatives avec
+    attente exponentielle (et Retry-After) sur les erreurs réseau, 429 et 5xx, et
+    disjoncteur partagé par service.
+
+    À utiliser comme gestionnaire de contexte asynchrone :
+        async with ClientAsync('nominatim', limiteur=LimiteurDebit(1)) as client:
+            data = await client.get_json(url, params)
+    """
+
+    def __init__(self, nom, concurrence=4, limiteur=None, tentatives=3, attente_base=0.5,
+                 timeout=10, headers=None, transport=None):
+        self.nom = nom
+        self.limiteur = limiteur
+        self.tentatives = tentatives
+        self.attente_base = attente_base
+        self.disjoncteur = disjoncteur(nom)
+        self._semaphore = asyncio.Semaphore(concurrence)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            headers={'User-Agent': 'WasteCollectionApp/1.0', **(headers or {})},
+            limits=httpx.Limits(max_connections=concurrence),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    def _attente(self, tentative, response=None):
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return float(response.headers['Retry-After'])
+        return self.attente_base * 2 ** tentative * (1 + random.random() / 2)
+
+    async def get_json(self, url, params=None):
+        """
+        Réponse JSON d'un GET. Lève ServiceIndisponible si le disjoncteur est ouvert,
+        httpx.HTTPError si le service échoue après toutes les tentatives.
+        """
+        if not self.disjoncteur.autorise():
+            raise ServiceIndisponible(f"{self.nom} : disjoncteur ouvert")
+
+        async with self._semaphore:
+            for tentative in range(self.tentatives):
+                if self.limiteur is not None:
+                    await self.limiteur.acquerir()
+
+                response = None
+                try:
+                    response = await self._client.get(url, params=params)
+                    if response.status_code not in STATUTS_A_REESSAYER:
+                        # Une erreur 4xx vient de la requête, pas du service
+                        self.disjoncteur.succes()
+                        response.raise_for_status()
+                        return response.json()
+                    erreur = httpx.HTTPStatusError(
+                        f"{self.nom} : HTTP {response.status_code}", request=response.request, response=response
+                    )
+                except httpx.TransportError as e:
+                    erreur = e
+
+                if tentative + 1 < self.tentatives:
+                    await asyncio.sleep(self._attente(tentative, response))
+
+        self.disjoncteur.echec()
+        raise erreur
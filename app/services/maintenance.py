@@ -0,0 +1,85 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import GasOrder, Notification, Payment
+
+
+logger = logging.getLogger(__name__)
+
+
+def _notifications_expirees(maintenant):
+    jours = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 3)
+    return Notification.objects.filter(created_at__lt=maintenant - timedelta(days=jours))
+
+
+def _commandes_gaz_livrees(maintenant):
+    jours = getattr(settings, 'GAS_ORDER_RETENTION_DAYS', 1)
+    return GasOrder.objects.filter(
+        status='delivered',
+        scheduled_date__lte=maintenant.date() - timedelta(days=jours)
+    )
+
+
+def _paiements_termines(maintenant):
+    jours = getattr(settings, 'PAYMENT_RETENTION_DAYS', 3)
+    return Payment.objects.filter(status='completed', created_at__lt=maintenant - timedelta(days=jours))
+
+
+# Tâches de rétention : nom -> lignes à supprimer à l'instant donné
+TACHES = {
+    'notifications': _notifications_expirees,
+    'commandes_gaz': _commandes_gaz_livrees,
+    'paiements': _paiements_termines,
+}
+
+
+def supprimer_par_lots(queryset, taille_lot):
+    """
+    Supprimer les lignes du queryset par lots de `taille_lot` clés primaires, chaque
+    lot dans sa propre transaction : les verrous restent courts et une interruption
+    ne perd que le lot en cours. Retourne (lignes supprimées, lots).
+    """
+    supprimees = lots = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:taille_lot])
+        if not ids:
+            return supprimees, lots
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        supprimees += len(ids)
+        lots += 1
+
+
+def executer_maintenance(taches=None, taille_lot=None, simulation=False):
+    """
+    Exécuter les tâches de rétention (toutes par défaut) : à lancer via cron
+    (python manage.py maintenance). Retourne un rapport par tâche avec le nombre
+    de lignes supprimées, de lots et la durée ; une tâche en échec n'arrête pas
+    les suivantes. En simulation, les lignes sont seulement comptées.
+    """
+    taille_lot = taille_lot or getattr(settings, 'MAINTENANCE_TAILLE_LOT', 1000)
+    maintenant = timezone.now()
+    rapports = []
+    for nom in taches or TACHES:
+        debut = time.monotonic()
+        rapport = {'tache': nom, 'supprimees': 0, 'lots': 0}
+        try:
+            queryset = TACHES[nom](maintenant)
+            if simulation:
+                rapport['supprimees'] = queryset.count()
+            else:
+                rapport['supprimees'], rapport['lots'] = supprimer_par_lots(queryset, taille_lot)
+        except Exception as e:
+            logger.exception(f"Tâche de maintenance {nom} en échec")
+            rapport['erreur'] = str(e)
+        rapport['duree'] = round(time.monotonic() - debut, 3)
+        logger.info(
+            f"Maintenance {nom} : {rapport['supprimees']} ligne(s), {rapport['lots']} lot(s) en {rapport['duree']} s"
+        )
+        rapports.append(rapport)
+    return rapports
@@ -0,0 +1,116 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from app.models import ArretManifeste, CollectionSchedule, ManifesteTricycle, Tricycle, Zone
+from app.services.repartition import filtre_manifeste
+
+
+logger = logging.getLogger(__name__)
+
+
+def _arret(manifeste, collecte):
+    subscription = collecte.subscription
+    address = subscription.address
+    return ArretManifeste(
+        manifeste=manifeste,
+        collecte=collecte,
+        subscription=subscription,
+        ordre=collecte.ordre_tournee,
+        scheduled_time=collecte.scheduled_time,
+        status=collecte.status,
+        client_name=subscription.user.get_full_name() or subscription.user.username,
+        client_phone=str(subscription.user.phone) if subscription.user.phone else '',
+        street=address.street,
+        city=address.city,
+        postal_code=address.postal_code,
+        latitude=float(address.latitude) if address.latitude is not None else None,
+        longitude=float(address.longitude) if address.longitude is not None else None,
+        plan_name=subscription.plan.name,
+        zone_name=subscription.zone.nom if subscription.zone else '',
+        special_instructions=subscription.special_instructions or '',
+    )
+
+
+def construire_manifeste(tricycle, date):
+    """
+    (Re)construire le manifeste d'un tricycle pour une date : collectes programmées
+    ou terminées des abonnements actifs de ses zones, limitées à sa part de la
+    répartition (filtre_manifeste). Une requête de lecture, une écriture groupée.
+    """
+    collectes = CollectionSchedule.objects.filter(
+        filtre_manifeste(tricycle),
+        subscription__zone__in=Zone.objects.filter(programmes_tricycle__tricycle=tricycle),
+        subscription__status='active',
+        scheduled_date=date,
+        status__in=['scheduled', 'completed'],
+    ).select_related(
+        'subscription__user',
+        'subscription__address',
+        'subscription__plan',
+        'subscription__zone'
+    )
+
+    with transaction.atomic():
+        ManifesteTricycle.objects.filter(tricycle=tricycle, date=date).delete()
+        manifeste = ManifesteTricycle.objects.create(tricycle=tricycle, date=date)
+        arrets = ArretManifeste.objects.bulk_create(
+            [_arret(manifeste, collecte) for collecte in collectes], batch_size=500
+        )
+    return manifeste, arrets
+
+
+def construire_manifestes(date, tricycles=None):
+    """Manifestes de la date pour tous les tricycles en service ayant un conducteur"""
+    if tricycles is None:
+        tricycles = Tricycle.objects.filter(status='active', conducteur__isnull=False)
+    return {tricycle.nom: len(construire_manifeste(tricycle, date)[1]) for tricycle in tricycles}
+
+
+def arrets_du_jour(tricycle, date):
+    """
+    Lignes du manifeste d'un tricycle, dans l'ordre de la tournée : une requête
+    indexée. Un manifeste absent (pas encore construit ou invalidé) est construit
+    à la demande.
+    """
+    if tricycle is None:
+        return []
+
+    def lire():
+        return list(ArretManifeste.objects.filter(
+            manifeste__tricycle=tricycle, manifeste__date=date
+        ).order_by('scheduled_time', F('ordre').asc(nulls_last=True), 'client_name'))
+
+    arrets = lire()
+    if arrets or ManifesteTricycle.objects.filter(tricycle=tricycle, date=date).exists():
+        return arrets
+    try:
+        construire_manifeste(tricycle, date)
+    except IntegrityError:
+        # Construit au même moment par une autre requête
+        pass
+    return lire()
+
+
+def version_manifeste(tricycle, date):
+    """(identifiant, version) du manifeste d'un tricycle pour une date, ou None"""
+    if tricycle is None:
+        return None
+    return ManifesteTricycle.objects.filter(tricycle=tricycle, date=date).values_list('id', 'version').first()
+
+
+def invalider_manifestes(zone_id, depuis=None):
+    """
+    Supprimer les manifestes à venir des tricycles d'une zone après un ajout ou un
+    recalage de collectes ; ils seront reconstruits à la prochaine consultation.
+    """
+    if zone_id is None:
+        return 0
+    depuis = depuis or timezone.now().date()
+    nombre, _ = ManifesteTricycle.objects.filter(
+        date__gte=depuis,
+        tricycle__programmes__zone_id=zone_id,
+    ).delete()
+    return nombre
@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from app.models import CollectionSchedule, Performence
+from app.services.repartition import JOURS_SEMAINE
+
+
+# Note sur 5 : part des collectes du jour effectivement faites
+NOTE_MAX = 5
+
+
+def bilans_du_jour(date):
+    """
+    {tricycle_id: (collectes dues, collectes faites)} pour tous les tricycles en une
+    requête groupée : les collectes d'une zone sont rattachées aux tricycles programmés
+    ce jour-là, limitées à la part de chacun quand la répartition les a assignées
+    (même règle que les manifestes). Les collectes annulées ne comptent pas.
+    """
+    programme = 'subscription__zone__programmes_tricycle__'
+    lignes = CollectionSchedule.objects.filter(
+        Q(tricycle__isnull=True) | Q(tricycle_id=F(programme + 'tricycle_id')),
+        Q(**{programme + 'date_fin__isnull': True}) | Q(**{programme + 'date_fin__gte': date}),
+        scheduled_date=date,
+        status__in=['scheduled', 'completed', 'missed'],
+        **{
+            programme + 'jour_semaine': JOURS_SEMAINE[date.weekday()],
+            programme + 'is_active': True,
+            programme + 'date_debut__lte': date,
+        }
+    ).values(
+        tricycle_programme=F(programme + 'tricycle_id')
+    ).annotate(
+        dues=Count('id', distinct=True),
+        faites=Count('id', filter=Q(status='completed'), distinct=True),
+    )
+    return {ligne['tricycle_programme']: (ligne['dues'], ligne['faites']) for ligne in lignes}
+
+
+def noter_tricycles(date):
+    """
+    Écrire la note du jour de chaque tricycle ayant eu des collectes (à lancer chaque
+    nuit pour la veille : python manage.py noter_tricycles). Une ligne Performence par
+    tricycle et par jour, gardée pour l'historique ; relancer la notation d'un jour
+    met ses lignes à jour. Retourne {'notes_creees': n, 'notes_mises_a_jour': n}.
+    """
+    bilans = bilans_du_jour(date)
+    notes = {
+        tricycle_id: round(NOTE_MAX * faites / dues, 2) if dues else 0
+        for tricycle_id, (dues, faites) in bilans.items()
+    }
+
+    with transaction.atomic():
+        existantes = {}
+        for performance in Performence.objects.select_for_update().filter(date=date, Tricycle_id__in=list(notes)):
+            existantes.setdefault(performance.Tricycle_id, performance)
+        for tricycle_id, performance in existantes.items():
+            performance.note = notes[tricycle_id]
+        Performence.objects.bulk_update(list(existantes.values()), ['note'])
+        creees = Performence.objects.bulk_create([
+            Performence(Tricycle_id=tricycle_id, date=date, note=note)
+            for tricycle_id, note in notes.items() if tricycle_id not in existantes
+        ])
+    return {'notes_creees': len(creees), 'notes_mises_a_jour': len(existantes)}
+
+
+def derniere_note(tricycle):
+    """(note, date) de la dernière notation du tricycle ; (0, None) s'il n'a pas encore été noté"""
+    if tricycle is None:
+        return 0, None
+    derniere = Performence.objects.filter(Tricycle=tricycle).order_by('-date').values_list('note', 'date').first()
+    return derniere or (0, None)
@@ -0,0 +1,621 @@
+import logging
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app.models import (
+    CollectionDay, CollectionSchedule, CustomUser, Notification, ProgrammeTricycle,
+    Subscription, SubscriptionDay, Zone
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Nombre de lignes envoyées à la base par requête INSERT
+SCHEDULE_BATCH_SIZE = 500
+
+DAYS_MAPPING = {
+    'lundi': 0,
+    'mardi': 1,
+    'mercredi': 2,
+    'jeudi': 3,
+    'vendredi': 4,
+    'samedi': 5,
+    'dimanche': 6
+}
+
+
+def get_day_offset(day_name, reference_date=None):
+    """Get day offset from current date"""
+    if reference_date is None:
+        reference_date = timezone.now().date()
+    current_weekday = reference_date.weekday()
+    target_weekday = DAYS_MAPPING.get(day_name, 0)
+
+    # Calculer le décalage pour le prochain jour cible
+    if target_weekday >= current_weekday:
+        return target_weekday - current_weekday
+    else:
+        return 7 - current_weekday + target_weekday
+
+
+def horizon_collectes(today=None):
+    """Dernière date matérialisée en base (fenêtre glissante de N semaines)"""
+    if today is None:
+        today = timezone.now().date()
+    semaines = getattr(settings, 'COLLECTION_HORIZON_WEEKS', 4)
+    return today + timedelta(weeks=semaines)
+
+
+def dernieres_dates_generees(subscription_ids, today=None):
+    """
+    Dernière collecte déjà en base pour chaque couple (abonnement, jour),
+    en une seule requête groupée. Sert de point de reprise à la génération.
+    """
+    if today is None:
+        today = timezone.now().date()
+    lignes = CollectionSchedule.objects.filter(
+        subscription_id__in=subscription_ids,
+        scheduled_date__gte=today
+    ).values('subscription_id', 'scheduled_day_id').annotate(derniere=Max('scheduled_date'))
+    return {(l['subscription_id'], l['scheduled_day_id']): l['derniere'] for l in lignes}
+
+
+def iter_collection_schedule_rows(subscription, subscription_days=None, jusqu_au=None, dernieres_dates=None):
+    """
+    Générateur des lignes CollectionSchedule (non sauvegardées) d'un abonnement.
+
+    Chaque SubscriptionDay est la règle hebdomadaire ; seules les occurrences
+    comprises entre aujourd'hui et l'horizon (ou la fin de l'abonnement) et
+    postérieures à la dernière collecte déjà en base sont produites.
+    Aucune requête n'est faite par ligne : les jours sont chargés une seule fois.
+    """
+    if subscription_days is None:
+        subscription_days = SubscriptionDay.objects.filter(
+            subscription=subscription,
+            is_active=True
+        ).select_related('day')
+
+    subscription_days = list(subscription_days)
+    if not subscription_days:
+        return
+
+    today = timezone.now().date()
+    # Les vues d'administration affectent parfois les dates sous forme de chaîne
+    start_date = Subscription._meta.get_field('start_date').to_python(subscription.start_date)
+    end_date = Subscription._meta.get_field('end_date').to_python(subscription.end_date)
+
+    fin = jusqu_au or horizon_collectes(today)
+    if end_date:
+        fin = min(fin, end_date)
+    debut = max(today, start_date) if start_date else today
+    if dernieres_dates is None:
+        dernieres_dates = dernieres_dates_generees([subscription.id], today)
+
+    for sub_day in subscription_days:
+        reprise = debut
+        derniere = dernieres_dates.get((subscription.id, sub_day.day_id))
+        if derniere and derniere >= reprise:
+            reprise = derniere + timedelta(days=1)
+
+        scheduled_date = reprise + timedelta(days=get_day_offset(sub_day.day.name, reprise))
+        while scheduled_date <= fin:
+            yield CollectionSchedule(
+                subscription=subscription,
+                scheduled_date=scheduled_date,
+                scheduled_day=sub_day.day,
+                scheduled_time=sub_day.time_slot,
+                status='scheduled'
+            )
+            scheduled_date += timedelta(days=7)
+
+
+def bulk_insert_schedules(rows, batch_size=SCHEDULE_BATCH_SIZE):
+    """
+    Écrire un itérable de CollectionSchedule par paquets avec bulk_create.
+    Retourne le nombre de lignes insérées.
+    """
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        CollectionSchedule.objects.bulk_create(batch, batch_size=batch_size)
+        total += len(batch)
+    return total
+
+
+def generate_collection_schedule(subscription, subscription_days=None, batch_size=SCHEDULE_BATCH_SIZE):
+    """
+    Générer le programme de collecte d'un abonnement sur la fenêtre glissante.
+    Les lignes sont calculées en mémoire puis insérées par paquets ;
+    un nouvel appel ne recrée pas les collectes déjà présentes.
+    Retourne le nombre de collectes créées.
+    """
+    created = bulk_insert_schedules(
+        iter_collection_schedule_rows(subscription, subscription_days),
+        batch_size=batch_size
+    )
+    logger.debug(f"{created} collectes programmées pour l'abonnement {subscription.id}")
+    if created:
+        # Import local : manifeste dépend (via repartition) de ce module
+        from app.services.manifeste import invalider_manifestes
+        invalider_manifestes(subscription.zone_id)
+    return created
+
+
+# ---------------------------------------------------------------------------
+# Replanification incrémentale d'une zone
+# ---------------------------------------------------------------------------
+
+def _ordre_programme(programme):
+    return (DAYS_MAPPING.get(programme.jour_semaine, 7), programme.heure_debut)
+
+
+def charger_etat_zone(zone, verrouiller=False):
+    """
+    Charger en quatre requêtes tout ce dont le planificateur a besoin pour une zone :
+    les programmes actifs, les abonnements actifs, leurs jours de collecte et les
+    places réservées par les autres abonnements.
+
+    verrouiller : poser un verrou (select_for_update) sur les programmes, pour que
+    les réservations concurrentes attendent la fin de la replanification
+    (à appeler dans une transaction).
+    """
+    programmes = ProgrammeTricycle.objects.filter(zone=zone, is_active=True)
+    if verrouiller:
+        programmes = programmes.select_for_update()
+    programmes = sorted(programmes, key=_ordre_programme)
+    abonnements = list(
+        Subscription.objects.filter(zone=zone, status='active')
+        .select_related('plan')
+        .order_by('created_at')
+    )
+    jours = list(
+        SubscriptionDay.objects.filter(subscription__in=[s.id for s in abonnements])
+        .select_related('day')
+        .order_by('id')
+    )
+    return {
+        'zone': zone,
+        'programmes': programmes,
+        'abonnements': abonnements,
+        'jours': jours,
+        'reservations': places_reservees(programmes),
+    }
+
+
+def places_reservees(programmes):
+    """
+    Places tenues par les abonnements non actifs (en attente de paiement, expirés) :
+    leurs jours sont conservés et occupent toujours le créneau du programme.
+    """
+    if not programmes:
+        return {}
+    return dict(
+        SubscriptionDay.objects.filter(programme_tricycle__in=[p.id for p in programmes])
+        .exclude(subscription__status='active')
+        .values('programme_tricycle')
+        .annotate(nombre=Count('id'))
+        .values_list('programme_tricycle', 'nombre')
+    )
+
+
+def recompter_clients_programmes(programmes):
+    """
+    Écrire `clients_actuels` des programmes du queryset à partir du nombre de jours de
+    collecte qui leur sont rattachés (abonnements actifs ou non), calculé par la base
+    dans le même UPDATE : même règle que occupation_programmes / reconcilier_compteurs.
+    """
+    occupation = SubscriptionDay.objects.filter(
+        programme_tricycle=OuterRef('pk')
+    ).order_by().values('programme_tricycle').annotate(nombre=Count('id')).values('nombre')
+    return programmes.update(
+        clients_actuels=Coalesce(Subquery(occupation, output_field=IntegerField()), Value(0))
+    )
+
+
+def calculer_plan_zone(etat):
+    """
+    Calculer, sans rien écrire, la différence entre les jours de collecte actuels
+    des abonnements et les créneaux des programmes tricycles de la zone.
+
+    Retourne un dictionnaire décrivant les jours à retirer, à recaler (horaire),
+    à relier à leur programme, les nouvelles affectations et les compteurs
+    de clients recalculés par programme.
+    """
+    programmes = etat['programmes']
+    programmes_par_id = {p.id: p for p in programmes}
+    programmes_par_jour = {}
+    for programme in programmes:
+        programmes_par_jour.setdefault(programme.jour_semaine, []).append(programme)
+
+    retraits = []
+    recalages = []
+    liaisons = []
+    conserves = []
+    reservations = etat.get('reservations', {})
+    utilisation = {p.id: reservations.get(p.id, 0) for p in programmes}
+
+    for jour in etat['jours']:
+        if jour.programme_tricycle_id:
+            programme = programmes_par_id.get(jour.programme_tricycle_id)
+        else:
+            # Anciens jours sans programme : on les rattache au premier créneau du même jour
+            candidats = programmes_par_jour.get(jour.day.name, [])
+            programme = candidats[0] if candidats else None
+            if programme:
+                liaisons.append((jour, programme))
+
+        if programme is None or programme.jour_semaine != jour.day.name:
+            retraits.append(jour)
+            continue
+
+        conserves.append((jour, programme))
+        utilisation[programme.id] += 1
+        if jour.time_slot != programme.heure_debut:
+            recalages.append((jour, programme))
+
+    # Capacité réduite : les derniers inscrits au-delà de la capacité perdent le créneau
+    surplus_ids = set()
+    for programme in programmes:
+        surplus = utilisation[programme.id] - programme.capacite_max_clients
+        if surplus > 0:
+            inscrits = [j for j, p in conserves if p.id == programme.id][-surplus:]
+            for jour in inscrits:
+                surplus_ids.add(jour.id)
+            utilisation[programme.id] -= len(inscrits)
+    if surplus_ids:
+        retraits.extend(j for j, p in conserves if j.id in surplus_ids)
+        conserves = [(j, p) for j, p in conserves if j.id not in surplus_ids]
+        recalages = [(j, p) for j, p in recalages if j.id not in surplus_ids]
+        liaisons = [(j, p) for j, p in liaisons if j.id not in surplus_ids]
+
+    jours_par_abonnement = {}
+    for jour, programme in conserves:
+        jours_par_abonnement.setdefault(jour.subscription_id, set()).add(programme.jour_semaine)
+
+    # Affecter les créneaux libres aux abonnements qui n'ont pas tous leurs jours
+    ajouts = []
+    for abonnement in etat['abonnements']:
+        jours_pris = jours_par_abonnement.setdefault(abonnement.id, set())
+        manquants = abonnement.plan.max_collections_per_week - len(jours_pris)
+        for programme in programmes:
+            if manquants <= 0:
+                break
+            if programme.jour_semaine in jours_pris:
+                continue
+            if utilisation[programme.id] >= programme.capacite_max_clients:
+                continue
+            ajouts.append((abonnement, programme))
+            jours_pris.add(programme.jour_semaine)
+            utilisation[programme.id] += 1
+            manquants -= 1
+
+    modifies = {j.subscription_id for j in retraits}
+    modifies.update(j.subscription_id for j, p in recalages)
+    modifies.update(a.id for a, p in ajouts)
+
+    return {
+        'retraits': retraits,
+        'recalages': recalages,
+        'liaisons': liaisons,
+        'ajouts': ajouts,
+        'compteurs': utilisation,
+        'jours_par_abonnement': jours_par_abonnement,
+        'abonnements_modifies': modifies,
+    }
+
+
+def _notifier_replanification(zone, etat, plan):
+    """Notifier uniquement les abonnés dont les jours ou horaires ont changé"""
+    noms_jours = dict(CollectionDay.DAY_CHOICES)
+    notifications = []
+    for abonnement in etat['abonnements']:
+        if abonnement.id not in plan['abonnements_modifies']:
+            continue
+        jours = sorted(plan['jours_par_abonnement'].get(abonnement.id, ()), key=lambda j: DAYS_MAPPING.get(j, 7))
+        if jours:
+            notifications.append(Notification(
+                user_id=abonnement.user_id,
+                title="Programme de collecte mis à jour",
+                message=(
+                    f"Le programme de collecte dans votre zone ({zone.nom}) a été modifié. "
+                    f"Vos jours de collecte sont : {', '.join(noms_jours[j] for j in jours)}. "
+                    f"Veuillez consulter votre programme mis à jour."
+                ),
+                notification_type='info',
+                related_object_id=abonnement.id,
+                related_object_type='Subscription',
+                action_url=f'/subscriptions/{abonnement.id}/'
+            ))
+        else:
+            notifications.append(Notification(
+                user_id=abonnement.user_id,
+                title="Attention : Programme de collecte",
+                message=(
+                    f"Suite à la modification du programme dans votre zone ({zone.nom}), "
+                    f"aucun créneau n'est actuellement disponible pour votre abonnement. "
+                    f"Notre équipe vous contactera sous peu pour régulariser votre situation."
+                ),
+                notification_type='warning',
+                related_object_id=abonnement.id,
+                related_object_type='Subscription',
+                action_url=f'/subscriptions/{abonnement.id}/'
+            ))
+    Notification.objects.bulk_create(notifications)
+
+
+def _supprimer_collectes_futures(paires, today):
+    """Supprimer les collectes programmées à venir pour des couples (abonnement, jour)"""
+    par_jour = {}
+    for subscription_id, day_id in paires:
+        par_jour.setdefault(day_id, set()).add(subscription_id)
+    supprimees = 0
+    for day_id, subscription_ids in par_jour.items():
+        nombre, _ = CollectionSchedule.objects.filter(
+            subscription_id__in=subscription_ids,
+            scheduled_day_id=day_id,
+            scheduled_date__gte=today,
+            status='scheduled'
+        ).delete()
+        supprimees += nombre
+    return supprimees
+
+
+def appliquer_plan_zone(etat, plan, notifier=True):
+    """
+    Écrire le plan calculé par calculer_plan_zone : seules les lignes
+    concernées sont touchées, et uniquement pour les dates à venir.
+    """
+    today = timezone.now().date()
+    jours_collecte = {d.name: d for d in CollectionDay.objects.all()}
+
+    with transaction.atomic():
+        # 1. Jours retirés et leurs collectes futures
+        if plan['retraits']:
+            SubscriptionDay.objects.filter(id__in=[j.id for j in plan['retraits']]).delete()
+            _supprimer_collectes_futures(
+                [(j.subscription_id, j.day_id) for j in plan['retraits']], today
+            )
+
+        # 2. Jours conservés mais dont l'horaire ou le programme a changé
+        a_mettre_a_jour = {}
+        for jour, programme in plan['liaisons']:
+            jour.programme_tricycle = programme
+            a_mettre_a_jour[jour.id] = jour
+        horaires = {}
+        for jour, programme in plan['recalages']:
+            jour.time_slot = programme.heure_debut
+            a_mettre_a_jour[jour.id] = jour
+            horaires.setdefault((jour.day_id, programme.heure_debut), set()).add(jour.subscription_id)
+        if a_mettre_a_jour:
+            SubscriptionDay.objects.bulk_update(
+                list(a_mettre_a_jour.values()), ['time_slot', 'programme_tricycle']
+            )
+        for (day_id, heure), subscription_ids in horaires.items():
+            CollectionSchedule.objects.filter(
+                subscription_id__in=subscription_ids,
+                scheduled_day_id=day_id,
+                scheduled_date__gte=today,
+                status='scheduled'
+            ).update(scheduled_time=heure)
+
+        # 3. Nouvelles affectations et leurs collectes
+        nouveaux_jours = [
+            SubscriptionDay(
+                subscription=abonnement,
+                day=jours_collecte[programme.jour_semaine],
+                time_slot=programme.heure_debut,
+                programme_tricycle=programme,
+                is_active=True
+            )
+            for abonnement, programme in plan['ajouts']
+            if programme.jour_semaine in jours_collecte
+        ]
+        SubscriptionDay.objects.bulk_create(nouveaux_jours)
+        par_abonnement = {}
+        for jour in nouveaux_jours:
+            par_abonnement.setdefault(jour.subscription_id, (jour.subscription, []))[1].append(jour)
+        dernieres = dernieres_dates_generees(list(par_abonnement), today) if par_abonnement else {}
+        collectes_creees = bulk_insert_schedules(chain.from_iterable(
+            iter_collection_schedule_rows(abonnement, jours, dernieres_dates=dernieres)
+            for abonnement, jours in par_abonnement.values()
+        ))
+
+        # 4. Compteurs de clients des programmes, recalculés par la base et non depuis
+        # l'état chargé : une réservation faite entre-temps n'est pas écrasée
+        recompter_clients_programmes(ProgrammeTricycle.objects.filter(zone=etat['zone']))
+
+        if notifier:
+            _notifier_replanification(etat['zone'], etat, plan)
+
+    return {
+        'zone': etat['zone'].nom,
+        'abonnements_modifies': len(plan['abonnements_modifies']),
+        'jours_retires': len(plan['retraits']),
+        'jours_recales': len(plan['recalages']),
+        'jours_ajoutes': len(nouveaux_jours),
+        'collectes_creees': collectes_creees,
+    }
+
+
+def replanifier_zone(zone, jours_supprimes=None, notifier=True):
+    """
+    Replanifier une zone de façon incrémentale après une modification
+    de ses programmes tricycles.
+
+    jours_supprimes : couples (abonnement, jour) déjà supprimés en cascade
+    (suppression d'un programme) dont il faut retirer les collectes futures.
+    """
+    from app.services.manifeste import invalider_manifestes
+
+    if jours_supprimes:
+        _supprimer_collectes_futures(jours_supprimes, timezone.now().date())
+    # Tricycles, horaires ou collectes de la zone modifiés : manifestes à reconstruire
+    invalider_manifestes(zone.id)
+
+    with transaction.atomic():
+        etat = charger_etat_zone(zone, verrouiller=True)
+        if not etat['abonnements']:
+            # Les abonnements non actifs gardent leurs jours : ils occupent toujours leur place
+            recompter_clients_programmes(ProgrammeTricycle.objects.filter(zone=zone))
+            return {'zone': zone.nom, 'abonnements_modifies': 0}
+
+        plan = calculer_plan_zone(etat)
+        rapport = appliquer_plan_zone(etat, plan, notifier=notifier)
+    logger.info(f"Replanification de la zone {zone.nom}: {rapport}")
+    return rapport
+
+
+# ---------------------------------------------------------------------------
+# Simulation : impact d'une modification de programme, sans écriture
+# ---------------------------------------------------------------------------
+
+def _nombre_occurrences(jour_semaine, debut, fin):
+    """Nombre de dates d'un jour de la semaine entre debut et fin inclus"""
+    premiere = debut + timedelta(days=get_day_offset(jour_semaine, debut))
+    if premiere > fin:
+        return 0
+    return (fin - premiere).days // 7 + 1
+
+
+def _collectes_futures_par_jour(abonnements, today):
+    """Collectes programmées à venir par couple (abonnement, jour), en une requête groupée"""
+    return {
+        (ligne['subscription_id'], ligne['scheduled_day_id']): ligne['nombre']
+        for ligne in CollectionSchedule.objects.filter(
+            subscription__in=[a.id for a in abonnements],
+            scheduled_date__gte=today,
+            status='scheduled'
+        ).values('subscription_id', 'scheduled_day_id').annotate(nombre=Count('id')).order_by()
+    }
+
+
+def evaluer_plan_zone(etat, plan, today=None):
+    """
+    Chiffrer un plan calculé par calculer_plan_zone sans l'appliquer :
+    abonnements touchés, jours d'abonnement et collectes à venir modifiés,
+    abonnés qui perdent tous leurs créneaux. Une seule requête (groupée).
+    """
+    if today is None:
+        today = timezone.now().date()
+    horizon = horizon_collectes(today)
+    futures = _collectes_futures_par_jour(etat['abonnements'], today)
+    jours_collecte = {j.name: j.id for j in CollectionDay.objects.all()} if plan['ajouts'] else {}
+
+    collectes_supprimees = sum(futures.get((j.subscription_id, j.day_id), 0) for j in plan['retraits'])
+    collectes_recalees = sum(futures.get((j.subscription_id, j.day_id), 0) for j, p in plan['recalages'])
+    collectes_creees = 0
+    for abonnement, programme in plan['ajouts']:
+        start_date = Subscription._meta.get_field('start_date').to_python(abonnement.start_date)
+        end_date = Subscription._meta.get_field('end_date').to_python(abonnement.end_date)
+        debut = max(today, start_date) if start_date else today
+        fin = min(horizon, end_date) if end_date else horizon
+        if programme.jour_semaine in jours_collecte and debut <= fin:
+            collectes_creees += _nombre_occurrences(programme.jour_semaine, debut, fin)
+
+    avec_jours = {j.subscription_id for j in etat['jours']}
+    perdants = [
+        a for a in etat['abonnements']
+        if a.id in avec_jours and not plan['jours_par_abonnement'].get(a.id)
+    ]
+    clients = {}
+    if perdants:
+        clients = {
+            u.id: u.get_full_name() or u.username
+            for u in CustomUser.objects.filter(id__in={a.user_id for a in perdants})
+        }
+    sans_creneau = [{'id': str(a.id), 'client': clients.get(a.user_id)} for a in perdants]
+
+    return {
+        'zone': etat['zone'].nom,
+        'abonnements_modifies': len(plan['abonnements_modifies']),
+        'jours_retires': len(plan['retraits']),
+        'jours_recales': len(plan['recalages']),
+        'jours_ajoutes': len(plan['ajouts']),
+        'collectes_supprimees': collectes_supprimees,
+        'collectes_recalees': collectes_recalees,
+        'collectes_creees': collectes_creees,
+        'abonnes_sans_creneau': sans_creneau,
+    }
+
+
+def simuler_modification_programme(programme, modifications):
+    """
+    Simuler en mémoire la modification d'un programme tricycle (mêmes champs que
+    l'API de mise à jour) et retourner, pour chaque zone concernée, l'impact
+    qu'aurait la replanification. Rien n'est écrit en base.
+
+    Le coût ne dépend pas du nombre d'abonnés : l'état de chaque zone est chargé
+    par requêtes groupées (charger_etat_zone) et le plan est calculé en mémoire.
+    """
+    simule = ProgrammeTricycle.objects.get(pk=programme.pk)
+    for champ, valeur in modifications.items():
+        field = ProgrammeTricycle._meta.get_field(champ)
+        setattr(simule, field.attname, field.to_python(valeur))
+
+    zone_ids = [programme.zone_id]
+    if simule.zone_id != programme.zone_id:
+        zone_ids.append(simule.zone_id)
+
+    rapports = []
+    for zone in Zone.objects.filter(id__in=zone_ids):
+        etat = charger_etat_zone(zone)
+        programmes = [p for p in etat['programmes'] if p.id != simule.id]
+        if simule.zone_id == zone.id and simule.is_active:
+            programmes.append(simule)
+        etat['programmes'] = sorted(programmes, key=_ordre_programme)
+
+        plan = calculer_plan_zone(etat)
+        rapports.append(evaluer_plan_zone(etat, plan))
+    return rapports
+
+
+# ---------------------------------------------------------------------------
+# Fenêtre glissante : extension nocturne des collectes matérialisées
+# ---------------------------------------------------------------------------
+
+def etendre_fenetre_collectes(jusqu_au=None, taille_lot=SCHEDULE_BATCH_SIZE):
+    """
+    Tâche nocturne : prolonger la fenêtre des collectes matérialisées
+    jusqu'à l'horizon pour tous les abonnements actifs.
+    Le coût dépend du nombre d'abonnements actifs, pas de leur durée.
+    Retourne le nombre de collectes créées.
+    """
+    today = timezone.now().date()
+    jusqu_au = jusqu_au or horizon_collectes(today)
+
+    abonnements = Subscription.objects.filter(
+        status='active'
+    ).filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=today)
+    ).order_by('id')
+
+    total = 0
+    ids = list(abonnements.values_list('id', flat=True))
+    for i in range(0, len(ids), taille_lot):
+        lot = ids[i:i + taille_lot]
+        jours_par_abonnement = {}
+        for jour in SubscriptionDay.objects.filter(
+            subscription_id__in=lot, is_active=True
+        ).select_related('day', 'subscription'):
+            jours_par_abonnement.setdefault(jour.subscription_id, []).append(jour)
+
+        dernieres = dernieres_dates_generees(lot, today)
+        total += bulk_insert_schedules(chain.from_iterable(
+            iter_collection_schedule_rows(
+                jours[0].subscription, jours,
+                jusqu_au=jusqu_au, dernieres_dates=dernieres
+            )
+            for jours in jours_par_abonnement.values()
+        ), batch_size=taille_lot)
+
+    logger.info(f"Fenêtre de collecte étendue jusqu'au {jusqu_au}: {total} collectes créées")
+    return total
@@ -0,0 +1,306 @@
+import logging
+import math
+from datetime import date as date_type, datetime
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from app.models import CollectionSchedule, ManifesteTricycle, ProgrammeTricycle, Zone
+from app.services.planning import DAYS_MAPPING
+from app.services.tournee import cout_chemin, matrice_trajets, optimiser_ordre
+
+
+logger = logging.getLogger(__name__)
+
+JOURS_SEMAINE = {numero: jour for jour, numero in DAYS_MAPPING.items()}
+
+
+def filtre_manifeste(tricycle):
+    """
+    Collectes du manifeste d'un tricycle : celles que la répartition lui a affectées
+    et celles que la répartition n'a attribuées à personne (visibles par toute la zone).
+    """
+    return Q(tricycle=tricycle) | Q(tricycle__isnull=True)
+
+
+# ---------------------------------------------------------------------------
+# Solveur : répartition d'arrêts entre plusieurs véhicules
+# ---------------------------------------------------------------------------
+
+def _ordonner(matrice, arrets, creneaux=None):
+    """Ordre de visite d'un sous-ensemble d'arrêts, premier arrêt libre"""
+    if len(arrets) < 2:
+        return list(arrets)
+    # Départ virtuel à durée nulle de tous les arrêts : la tournée commence où elle veut
+    sous_matrice = np.zeros((len(arrets) + 1, len(arrets) + 1))
+    sous_matrice[1:, 1:] = matrice[np.ix_(arrets, arrets)]
+    sous_creneaux = [None] + [creneaux[i] for i in arrets] if creneaux is not None else None
+    return [arrets[i - 1] for i in optimiser_ordre(sous_matrice, sous_creneaux, depart=0)]
+
+
+def _insertion(matrice, tournee, arret):
+    """(surcoût, position) de la meilleure insertion de `arret` dans la tournée"""
+    if not tournee:
+        return 0.0, 0
+    t = np.asarray(tournee)
+    couts = np.concatenate((
+        [matrice[arret, t[0]]],
+        matrice[t[:-1], arret] + matrice[arret, t[1:]] - matrice[t[:-1], t[1:]],
+        [matrice[t[-1], arret]],
+    ))
+    position = int(np.argmin(couts))
+    return float(couts[position]), position
+
+
+def _retrait(matrice, tournee, position):
+    """Gain obtenu en retirant l'arrêt à `position` de la tournée"""
+    arret = tournee[position]
+    precedent = tournee[position - 1] if position > 0 else None
+    suivant = tournee[position + 1] if position + 1 < len(tournee) else None
+    gain = 0.0
+    if precedent is not None:
+        gain += matrice[precedent, arret]
+    if suivant is not None:
+        gain += matrice[arret, suivant]
+    if precedent is not None and suivant is not None:
+        gain -= matrice[precedent, suivant]
+    return float(gain)
+
+
+def repartir_arrets(matrice, poids, vehicules, creneaux=None, duree_arret=0, tolerance=0.15):
+    """
+    Répartir les arrêts (indices de `matrice`, durées en secondes) entre les véhicules
+    [{'capacite': kg, 'debut': time, 'fin': time, 'duree_max': secondes}].
+
+    - capacité : la somme des `poids` d'une tournée ne dépasse pas la capacité ;
+    - horaires : un arrêt va à un véhicule dont la plage contient son créneau (à
+      défaut, à n'importe lequel) et une tournée (trajets + arrêts) tient dans
+      `duree_max` ;
+    - équilibre : au plus `tolerance` au-dessus du nombre moyen d'arrêts par véhicule.
+
+    Regroupement autour de k médoïdes, affectation par regret, déplacements
+    d'arrêts entre tournées, puis ordre de visite (plus proche voisin, 2-opt, Or-opt).
+    Retourne (tournees, non_affectes) : tournees[v] liste ordonnée des arrêts.
+    """
+    matrice = np.asarray(matrice, dtype=float)
+    symetrique = (matrice + matrice.T) / 2
+    n, k = len(matrice), len(vehicules)
+    if k == 0 or n == 0:
+        return [[] for _ in vehicules], list(range(n))
+
+    eligibles = np.ones((n, k), dtype=bool)
+    if creneaux is not None:
+        for i in range(n):
+            ligne = [v['debut'] <= creneaux[i] < v['fin'] for v in vehicules]
+            if any(ligne):
+                eligibles[i] = ligne
+    quota = math.ceil(n / k * (1 + tolerance))
+
+    def peut_recevoir(v, i, tournees, charges):
+        return (
+            eligibles[i, v]
+            and len(tournees[v]) < quota
+            and charges[v] + poids[i] <= vehicules[v]['capacite']
+        )
+
+    # Graines éloignées les unes des autres, puis quelques passes de k-médoïdes
+    centre = int(np.argmin(symetrique.sum(axis=1)))
+    graines = [int(np.argmax(symetrique[centre]))]
+    while len(graines) < min(k, n):
+        graines.append(int(np.argmax(symetrique[graines].min(axis=0))))
+    graines += [graines[-1]] * (k - len(graines))
+
+    for _ in range(3):
+        couts = np.where(eligibles, symetrique[:, graines], np.inf)
+        tries = np.sort(couts, axis=1)
+        regrets = (tries[:, 1] if k > 1 else tries[:, 0]) - tries[:, 0]
+        regrets = np.nan_to_num(regrets, posinf=np.finfo(float).max)
+
+        tournees = [[] for _ in range(k)]
+        charges = [0.0] * k
+        non_affectes = []
+        for i in np.argsort(-regrets, kind='stable'):
+            for v in np.argsort(couts[i], kind='stable'):
+                if peut_recevoir(v, i, tournees, charges):
+                    tournees[v].append(int(i))
+                    charges[v] += poids[i]
+                    break
+            else:
+                non_affectes.append(int(i))
+
+        nouvelles = [
+            t[int(np.argmin(symetrique[np.ix_(t, t)].sum(axis=1)))] if t else graines[v]
+            for v, t in enumerate(tournees)
+        ]
+        if nouvelles == graines:
+            break
+        graines = nouvelles
+
+    tournees = [_ordonner(matrice, t, creneaux) for t in tournees]
+
+    def duree(tournee):
+        return cout_chemin(matrice, tournee) + len(tournee) * duree_arret
+
+    # Déplacer un arrêt vers une autre tournée quand cela raccourcit le total
+    for _ in range(2):
+        deplace = False
+        for v in range(k):
+            position = 0
+            while position < len(tournees[v]):
+                i = tournees[v][position]
+                gain = _retrait(matrice, tournees[v], position)
+                meilleur = None
+                for w in range(k):
+                    if w == v or not peut_recevoir(w, i, tournees, charges):
+                        continue
+                    cout, insertion = _insertion(matrice, tournees[w], i)
+                    if gain - cout > 1e-6 and duree(tournees[w]) + cout + duree_arret <= vehicules[w]['duree_max']:
+                        if meilleur is None or cout < meilleur[0]:
+                            meilleur = (cout, w, insertion)
+                if meilleur is None:
+                    position += 1
+                    continue
+                _, w, insertion = meilleur
+                tournees[v].pop(position)
+                tournees[w].insert(insertion, i)
+                charges[v] -= poids[i]
+                charges[w] += poids[i]
+                deplace = True
+        if not deplace:
+            break
+
+    tournees = [_ordonner(matrice, t, creneaux) for t in tournees]
+
+    # Plages horaires : une tournée trop longue cède ses arrêts les plus coûteux
+    for v in range(k):
+        while tournees[v] and duree(tournees[v]) > vehicules[v]['duree_max']:
+            position = max(range(len(tournees[v])), key=lambda p: _retrait(matrice, tournees[v], p))
+            i = tournees[v].pop(position)
+            charges[v] -= poids[i]
+            for w in sorted(range(k), key=lambda w: _insertion(matrice, tournees[w], i)[0]):
+                if w == v or not peut_recevoir(w, i, tournees, charges):
+                    continue
+                cout, insertion = _insertion(matrice, tournees[w], i)
+                if duree(tournees[w]) + cout + duree_arret <= vehicules[w]['duree_max']:
+                    tournees[w].insert(insertion, i)
+                    charges[w] += poids[i]
+                    break
+            else:
+                non_affectes.append(i)
+
+    return [_ordonner(matrice, t, creneaux) for t in tournees], sorted(non_affectes)
+
+
+# ---------------------------------------------------------------------------
+# Répartition des collectes d'une zone (traitement de nuit)
+# ---------------------------------------------------------------------------
+
+def _duree_plage(debut, fin):
+    return (datetime.combine(date_type.min, fin) - datetime.combine(date_type.min, debut)).total_seconds()
+
+
+def programmes_du_jour(zone, date):
+    """Programmes actifs de la zone ce jour-là, avec un tricycle en service"""
+    return ProgrammeTricycle.objects.filter(
+        zone=zone,
+        jour_semaine=JOURS_SEMAINE[date.weekday()],
+        is_active=True,
+        date_debut__lte=date,
+        tricycle__status='active',
+    ).filter(
+        Q(date_fin__isnull=True) | Q(date_fin__gte=date)
+    ).select_related('tricycle').order_by('heure_debut', 'tricycle__nom')
+
+
+def repartir_collectes_zone(zone, date):
+    """
+    Répartir les collectes programmées d'une zone pour une date entre les tricycles
+    qui y tournent ce jour-là, et enregistrer l'affectation et l'ordre de visite
+    (CollectionSchedule.tricycle / ordre_tournee) qui forment le manifeste de
+    chaque collecteur.
+
+    Le poids d'une collecte est estimé selon le type de plan (POIDS_COLLECTE_KG) ;
+    les collectes sans coordonnées ou qu'aucun tricycle ne peut prendre restent
+    sans affectation, donc visibles par tous les collecteurs de la zone.
+    """
+    programmes = list(programmes_du_jour(zone, date))
+    lignes = list(CollectionSchedule.objects.filter(
+        subscription__zone=zone,
+        subscription__status='active',
+        scheduled_date=date,
+        status='scheduled',
+    ).order_by('scheduled_time', 'id').values_list(
+        'id', 'scheduled_time', 'subscription__plan__plan_type',
+        'subscription__address__latitude', 'subscription__address__longitude'
+    ))
+
+    localisees = [l for l in lignes if l[3] is not None and l[4] is not None]
+    poids_par_plan = getattr(settings, 'POIDS_COLLECTE_KG', {})
+    poids = [float(poids_par_plan.get(l[2], poids_par_plan.get('default', 10))) for l in localisees]
+    vehicules = [{
+        'capacite': float(p.tricycle.capacite_kg),
+        'debut': p.heure_debut,
+        'fin': p.heure_fin,
+        'duree_max': _duree_plage(p.heure_debut, p.heure_fin),
+    } for p in programmes]
+
+    if localisees and vehicules:
+        durees, _ = matrice_trajets([(l[3], l[4]) for l in localisees])
+        tournees, non_affectes = repartir_arrets(
+            durees, poids, vehicules,
+            creneaux=[l[1] for l in localisees],
+            duree_arret=getattr(settings, 'DUREE_ARRET_SECONDES', 180),
+            tolerance=getattr(settings, 'REPARTITION_TOLERANCE', 0.15),
+        )
+    else:
+        durees = None
+        tournees, non_affectes = [[] for _ in programmes], list(range(len(localisees)))
+
+    affectations = [
+        CollectionSchedule(id=localisees[i][0], tricycle=programme.tricycle, ordre_tournee=rang)
+        for programme, tournee in zip(programmes, tournees)
+        for rang, i in enumerate(tournee, 1)
+    ]
+    with transaction.atomic():
+        CollectionSchedule.objects.filter(
+            subscription__zone=zone, scheduled_date=date, status='scheduled'
+        ).update(tricycle=None, ordre_tournee=None)
+        CollectionSchedule.objects.bulk_update(affectations, ['tricycle', 'ordre_tournee'], batch_size=500)
+        # Les manifestes de la date sont reconstruits à partir de la nouvelle répartition
+        ManifesteTricycle.objects.filter(date=date, tricycle__programmes__zone=zone).delete()
+
+    return {
+        'zone': zone.nom,
+        'date': date.isoformat(),
+        'collectes': len(lignes),
+        'sans_coordonnees': len(lignes) - len(localisees),
+        'non_affectees': len(non_affectes),
+        'tricycles': [{
+            'tricycle': programme.tricycle.nom,
+            'collectes': len(tournee),
+            'charge_kg': round(sum(poids[i] for i in tournee), 1),
+            'capacite_kg': float(programme.tricycle.capacite_kg),
+            'duree_min': round(cout_chemin(durees, tournee) / 60) if durees is not None else 0,
+        } for programme, tournee in zip(programmes, tournees)],
+    }
+
+
+def repartir_collectes(date, zones=None):
+    """Répartition de toutes les zones (ou de `zones`) ayant au moins un programme ce jour-là"""
+    if zones is None:
+        zones = Zone.objects.filter(
+            is_active=True,
+            programmes_tricycle__jour_semaine=JOURS_SEMAINE[date.weekday()],
+            programmes_tricycle__is_active=True,
+        ).distinct()
+
+    rapports = []
+    for zone in zones:
+        try:
+            rapports.append(repartir_collectes_zone(zone, date))
+        except Exception as e:
+            logger.exception(f"Répartition impossible pour la zone {zone.nom}: {e}")
+            rapports.append({'zone': zone.nom, 'date': date.isoformat(), 'erreur': str(e)})
+    return rapports
@@ -0,0 +1,96 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from app.models import ReplanificationZone, Zone
+from app.services.planning import replanifier_zone
+
+
+logger = logging.getLogger(__name__)
+
+
+def delai_regroupement():
+    """Fenêtre pendant laquelle les modifications d'une même zone sont regroupées"""
+    return timedelta(seconds=getattr(settings, 'ZONE_REPLAN_DELAY_SECONDS', 30))
+
+
+def planifier_replanification_zone(zone_id, jours_supprimes=None):
+    """
+    Mettre en file la replanification d'une zone. Si une replanification est déjà
+    en attente pour cette zone, la modification s'y ajoute (même job, même fenêtre).
+
+    Retourne le job ReplanificationZone.
+    """
+    jours = [[str(subscription_id), day_id] for subscription_id, day_id in (jours_supprimes or [])]
+
+    with transaction.atomic():
+        job = (
+            ReplanificationZone.objects.select_for_update()
+            .filter(zone_id=zone_id, status='pending')
+            .first()
+        )
+        if job is None:
+            try:
+                with transaction.atomic():
+                    return ReplanificationZone.objects.create(
+                        zone_id=zone_id,
+                        executer_apres=timezone.now() + delai_regroupement(),
+                        jours_supprimes=jours,
+                    )
+            except IntegrityError:
+                # Une autre requête vient de créer le job de la zone : on s'y regroupe
+                job = ReplanificationZone.objects.select_for_update().get(zone_id=zone_id, status='pending')
+
+        job.nombre_demandes += 1
+        job.jours_supprimes = job.jours_supprimes + jours
+        job.save(update_fields=['nombre_demandes', 'jours_supprimes'])
+    return job
+
+
+def executer_replanification(job):
+    """Exécuter un job réservé par le worker et enregistrer son rapport"""
+    try:
+        zone = Zone.objects.get(pk=job.zone_id)
+        with transaction.atomic():
+            rapport = replanifier_zone(
+                zone,
+                jours_supprimes=[tuple(paire) for paire in job.jours_supprimes]
+            )
+        job.status = 'done'
+        job.rapport = rapport
+    except Exception as e:
+        logger.error(f"Replanification de la zone {job.zone_id} échouée: {e}", exc_info=True)
+        job.status = 'failed'
+        job.erreur = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'rapport', 'erreur', 'finished_at'])
+    return job
+
+
+def executer_replanifications_dues(limite=None):
+    """
+    Exécuter les replanifications dont la fenêtre de regroupement est écoulée
+    (à appeler en boucle par la commande replanifier_zones).
+
+    Chaque job est réservé par un UPDATE conditionnel : deux workers ne
+    replanifient jamais la même demande.
+    """
+    dues = ReplanificationZone.objects.filter(
+        status='pending', executer_apres__lte=timezone.now()
+    ).order_by('executer_apres').values_list('id', flat=True)
+    if limite:
+        dues = dues[:limite]
+
+    executes = []
+    for job_id in list(dues):
+        reserve = ReplanificationZone.objects.filter(pk=job_id, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if not reserve:
+            continue
+        executes.append(executer_replanification(ReplanificationZone.objects.get(pk=job_id)))
+    return executes
@@ -0,0 +1,124 @@
+import logging
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+from app.services.http_async import disjoncteur
+
+
+logger = logging.getLogger(__name__)
+
+# Le serveur OSRM public refuse les matrices de plus de 100 coordonnées
+TAILLE_MAX_TABLE = 100
+
+_session = None
+
+
+def session_osrm():
+    """Session HTTP partagée (connexions gardées ouvertes entre les appels)"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adaptateur = HTTPAdapter(pool_connections=4, pool_maxsize=10)
+        _session.mount('http://', adaptateur)
+        _session.mount('https://', adaptateur)
+        _session.headers['User-Agent'] = 'WasteCollectionApp/1.0'
+    return _session
+
+
+class OSRMClient:
+    """
+    Client du service `table` d'OSRM : durées et distances routières entre plusieurs
+    points en une seule requête. L'URL (OSRM_BASE_URL) permet d'utiliser un serveur
+    OSRM local ou un bouchon à la place du serveur public.
+    """
+
+    def __init__(self, base_url=None, profil='driving', timeout=None, precision=4):
+        self.base_url = (base_url or getattr(settings, 'OSRM_BASE_URL', 'http://router.project-osrm.org')).rstrip('/')
+        self.profil = profil
+        self.timeout = timeout or getattr(settings, 'OSRM_TIMEOUT', 5)
+        # 4 décimales ≈ 11 m : deux positions aussi proches partagent la même entrée de cache
+        self.precision = precision
+        self.duree_cache = getattr(settings, 'OSRM_CACHE_SECONDS', 600)
+
+    def table(self, points, sources=None, destinations=None):
+        """
+        Matrices (durées en secondes, distances en mètres) entre les points (lat, lon).
+        sources / destinations : indices dans `points` (tous par défaut).
+        Lève requests.RequestException ou ValueError si OSRM ne répond pas correctement.
+        Après plusieurs échecs consécutifs, le disjoncteur 'osrm' (partagé par les
+        threads du processus) fait échouer les appels aussitôt, sans attendre le
+        timeout : les vues passent directement à l'estimation à vol d'oiseau.
+        """
+        etat = disjoncteur('osrm')
+        if not etat.autorise():
+            raise requests.ConnectionError("OSRM indisponible (disjoncteur ouvert)")
+        coordonnees = ';'.join(f"{lon:.6f},{lat:.6f}" for lat, lon in points)
+        params = {'annotations': 'duration,distance'}
+        if sources is not None:
+            params['sources'] = ';'.join(str(i) for i in sources)
+        if destinations is not None:
+            params['destinations'] = ';'.join(str(i) for i in destinations)
+
+        try:
+            response = session_osrm().get(
+                f"{self.base_url}/table/v1/{self.profil}/{coordonnees}",
+                params=params,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            etat.echec()
+            raise
+        etat.succes()
+        if data.get('code') != 'Ok':
+            raise ValueError(f"Réponse OSRM: {data.get('code')} {data.get('message', '')}")
+        return data['durations'], data.get('distances')
+
+    def _arrondi(self, point):
+        return f"{round(float(point[0]), self.precision)},{round(float(point[1]), self.precision)}"
+
+    def _cle(self, origine, destination):
+        return f"osrm:{self.profil}:{self._arrondi(origine)}:{self._arrondi(destination)}"
+
+    def depuis(self, origine, destinations):
+        """
+        Trajets depuis une origine vers chaque destination : liste de dictionnaires
+        {'duration': secondes, 'distance': mètres}, None pour un trajet inconnu.
+
+        Les trajets en cache (coordonnées arrondies) ne sont pas redemandés ; les autres
+        sont obtenus par une requête `table` (une par tranche de 99 destinations).
+        """
+        cles = [self._cle(origine, destination) for destination in destinations]
+        connus = cache.get_many(cles)
+        resultats = [connus.get(cle) for cle in cles]
+
+        manquants = [i for i, resultat in enumerate(resultats) if resultat is None]
+        nouveaux = {}
+        for debut in range(0, len(manquants), TAILLE_MAX_TABLE - 1):
+            tranche = manquants[debut:debut + TAILLE_MAX_TABLE - 1]
+            try:
+                durees, distances = self.table(
+                    [origine] + [destinations[i] for i in tranche],
+                    sources=[0]
+                )
+            except (requests.RequestException, ValueError, KeyError) as e:
+                logger.warning(f"Erreur OSRM: {e}")
+                continue
+
+            for position, i in enumerate(tranche, 1):
+                duree = durees[0][position]
+                if duree is None:
+                    continue
+                resultats[i] = {
+                    'duration': duree,
+                    'distance': distances[0][position] if distances else None,
+                }
+                nouveaux[cles[i]] = resultats[i]
+
+        if nouveaux:
+            cache.set_many(nouveaux, self.duree_cache)
+        return resultats
@@ -0,0 +1,186 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app.models import CollectionRequest, CollectionSchedule, CollectorDailyStats, GasOrder, Subscription, Zone
+from app.services.repartition import filtre_manifeste
+
+
+def _taux(fait, total):
+    return round((fait / total * 100) if total > 0 else 0, 1)
+
+
+def zones_du_tricycle(tricycle):
+    return Zone.objects.filter(programmes_tricycle__tricycle=tricycle)
+
+
+def stats_tournees(tricycle, date, maintenant=None):
+    """
+    Collectes programmées de la part du tricycle dans ses zones (abonnements actifs) :
+    jour, semaine (date à date + 6) et collectes restantes du jour, en une seule
+    requête d'agrégation conditionnelle. Les collectes en cours sont celles du
+    collecteur (demandes_en_cours) : un CollectionSchedule n'a pas cet état.
+    """
+    maintenant = maintenant or timezone.now().time()
+    stats = {'today_total': 0, 'today_completed': 0, 'today_pending': 0,
+             'week_total': 0, 'week_completed': 0, 'upcoming': 0}
+    if tricycle is not None:
+        stats = CollectionSchedule.objects.filter(
+            filtre_manifeste(tricycle),
+            subscription__zone__in=zones_du_tricycle(tricycle),
+            subscription__status='active',
+            scheduled_date__range=[date, date + timedelta(days=6)],
+            status__in=['completed', 'scheduled'],
+        ).aggregate(
+            today_total=Count('id', filter=Q(scheduled_date=date)),
+            today_completed=Count('id', filter=Q(scheduled_date=date, status='completed')),
+            today_pending=Count('id', filter=Q(scheduled_date=date, status='scheduled')),
+            week_total=Count('id'),
+            week_completed=Count('id', filter=Q(status='completed')),
+            upcoming=Count('id', filter=Q(scheduled_date=date, status='scheduled', scheduled_time__gte=maintenant)),
+        )
+
+    return {
+        'today': {
+            'total': stats['today_total'],
+            'completed': stats['today_completed'],
+            'pending': stats['today_pending'],
+        },
+        'week': {
+            'total': stats['week_total'],
+            'completed': stats['week_completed'],
+            'completion_rate': _taux(stats['week_completed'], stats['week_total']),
+        },
+        'upcoming': stats['upcoming'],
+    }
+
+
+def demandes_en_cours(collecteur, date):
+    """Demandes de collecte du jour démarrées par le collecteur (api_start_collection)"""
+    return CollectionRequest.objects.filter(collector=collecteur, scheduled_date=date, status='in_progress').count()
+
+
+def stats_clients(tricycle):
+    """Clients et zones des abonnements actifs desservis par le tricycle (une requête)"""
+    if tricycle is None:
+        return {'clients': 0, 'zones': 0}
+    return Subscription.objects.filter(
+        zone__in=zones_du_tricycle(tricycle),
+        status='active'
+    ).aggregate(clients=Count('user', distinct=True), zones=Count('zone', distinct=True))
+
+
+def stats_demandes(collecteur, date):
+    """
+    Demandes de collecte assignées au collecteur : toutes, terminées, et terminées
+    ce mois, cette semaine et ce jour ; livraisons de gaz. Une requête sur le cumul
+    quotidien (CollectorDailyStats), pas sur les demandes.
+    """
+    annee, semaine, _ = date.isocalendar()
+
+    def somme(champ, *filtres):
+        return Coalesce(Sum(champ, filter=Q(*filtres) if filtres else None), 0)
+
+    stats = CollectorDailyStats.objects.filter(collector=collecteur).aggregate(
+        total=somme('scheduled_count'),
+        completed=somme('completed_count'),
+        monthly=somme('completed_count', Q(date__year=date.year, date__month=date.month)),
+        weekly=somme('completed_count', Q(date__iso_year=annee, date__week=semaine)),
+        daily=somme('completed_count', Q(date=date)),
+        gas_deliveries=somme('gas_deliveries'),
+    )
+    stats['completion_rate'] = _taux(stats['completed'], stats['total'])
+    return stats
+
+
+def contribution_demande(collector_id, date, status):
+    """Part d'une demande de collecte dans le cumul : {(collecteur, date): {champ: valeur}}"""
+    if collector_id is None or date is None:
+        return {}
+    return {(collector_id, date): {
+        'scheduled_count': 1,
+        'completed_count': int(status == 'completed'),
+        'missed_count': int(status == 'missed'),
+    }}
+
+
+def contribution_livraison(collector_id, status, date, montant):
+    """Part d'une commande de gaz : seules les commandes livrées comptent"""
+    if collector_id is None or date is None or status != 'delivered':
+        return {}
+    return {(collector_id, date): {'gas_deliveries': 1, 'revenue': montant or 0}}
+
+
+def appliquer_variation(avant, apres):
+    """
+    Ajouter au cumul la différence entre deux contributions (avant / après une
+    modification) : mises à jour atomiques F(), une ligne par (collecteur, date) touché.
+    """
+    for cle in set(avant) | set(apres):
+        ancien, nouveau = avant.get(cle, {}), apres.get(cle, {})
+        variations = {
+            champ: nouveau.get(champ, 0) - ancien.get(champ, 0) for champ in set(ancien) | set(nouveau)
+        }
+        variations = {champ: valeur for champ, valeur in variations.items() if valeur}
+        if not variations:
+            continue
+        collector_id, date = cle
+        ligne, _ = CollectorDailyStats.objects.get_or_create(collector_id=collector_id, date=date)
+        CollectorDailyStats.objects.filter(pk=ligne.pk).update(
+            **{champ: F(champ) + valeur for champ, valeur in variations.items()}
+        )
+
+
+def reconstruire_stats_collecteurs(debut, fin):
+    """
+    Recalculer le cumul quotidien entre deux dates (incluses) à partir des tables, en
+    deux requêtes groupées et des écritures groupées.
+
+    Les commandes de gaz livrées sont purgées par la maintenance : pour un collecteur
+    sans commande livrée restante ce jour-là, les livraisons déjà cumulées sont conservées.
+    Retourne (lignes créées, lignes mises à jour).
+    """
+    demandes = CollectionRequest.objects.filter(
+        collector__isnull=False, scheduled_date__range=[debut, fin]
+    ).values('collector_id', 'scheduled_date').annotate(
+        scheduled_count=Count('id'),
+        completed_count=Count('id', filter=Q(status='completed')),
+        missed_count=Count('id', filter=Q(status='missed')),
+    )
+    livraisons = GasOrder.objects.filter(
+        assigned_collector__isnull=False, status='delivered', scheduled_date__range=[debut, fin]
+    ).values('assigned_collector_id', 'scheduled_date').annotate(
+        gas_deliveries=Count('id'),
+        revenue=Coalesce(Sum('total_amount'), Decimal('0')),
+    )
+
+    valeurs = {}
+    for ligne in demandes:
+        valeurs.setdefault((ligne.pop('collector_id'), ligne.pop('scheduled_date')), {}).update(ligne)
+    livres = set()
+    for ligne in livraisons:
+        cle = (ligne.pop('assigned_collector_id'), ligne.pop('scheduled_date'))
+        valeurs.setdefault(cle, {}).update(ligne)
+        livres.add(cle)
+
+    champs_demandes = ['scheduled_count', 'completed_count', 'missed_count']
+    champs_gaz = ['gas_deliveries', 'revenue']
+    a_mettre_a_jour = []
+    with transaction.atomic():
+        for stats in CollectorDailyStats.objects.select_for_update().filter(date__range=[debut, fin]):
+            cle = (stats.collector_id, stats.date)
+            nouvelles = valeurs.pop(cle, {})
+            champs = champs_demandes + (champs_gaz if cle in livres else [])
+            for champ in champs:
+                setattr(stats, champ, nouvelles.get(champ, 0))
+            a_mettre_a_jour.append(stats)
+        CollectorDailyStats.objects.bulk_update(a_mettre_a_jour, champs_demandes + champs_gaz, batch_size=500)
+        crees = CollectorDailyStats.objects.bulk_create([
+            CollectorDailyStats(collector_id=collector_id, date=date, **champs)
+            for (collector_id, date), champs in valeurs.items()
+        ], batch_size=500)
+    return len(crees), len(a_mettre_a_jour)
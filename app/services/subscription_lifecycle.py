@@ -0,0 +1,162 @@
+import logging
+from datetime import timedelta
+from io import BytesIO
+
+import qrcode
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import (
+    CollectionSchedule, Notification, Payment, SubscriptionQRCode
+)
+from app.services.allocation import liberer_jours
+from app.services.planning import generate_collection_schedule
+
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionLifecycleService:
+    """
+    Cycle de vie d'un abonnement après enregistrement, exécuté par un seul
+    signal post_save et dans une seule transaction :
+
+        paiement → jours de collecte → programme de collecte → QR code → notification
+
+    Chaque étape ne s'exécute que si les champs qui la concernent ont changé.
+    """
+
+    def handle(self, subscription, created=False):
+        champs = subscription.champs_modifies()
+        if not created and not champs:
+            return None
+
+        resultat = {'jours_assignes': 0, 'collectes_creees': 0}
+        with transaction.atomic():
+            if subscription.status == 'active':
+                self.enregistrer_paiement(subscription)
+                resultat['jours_assignes'] = self.assigner_jours(subscription, created, champs)
+                resultat['collectes_creees'] = self.generer_programme(subscription, created, champs)
+                self.generer_qr_code(subscription, avec_image=True)
+            else:
+                self.annuler_programme(subscription)
+                if created:
+                    self.generer_qr_code(subscription, avec_image=False)
+
+            self.notifier(subscription, created, champs)
+
+        subscription.resultat_cycle_vie = resultat
+        return resultat
+
+    # Étape 1 : paiement
+    def enregistrer_paiement(self, subscription):
+        """
+        Enregistrer le paiement de la période si aucun paiement réussi n'a été
+        enregistré dans les 5 dernières minutes (paiement mobile déjà traité)
+        """
+        if Payment.objects.filter(
+            subscription=subscription,
+            status='completed',
+            payment_date__gte=timezone.now() - timedelta(minutes=5)
+        ).exists():
+            return None
+
+        start_date = subscription._valeur_champ('start_date')
+        end_date = subscription._valeur_champ('end_date')
+        if not start_date or not end_date:
+            return None
+
+        # nombre de mois entre le jour de debut et le jour de fin de l'abonnement
+        nombre_de_mois = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month)
+        prix = subscription.custom_price if subscription.custom_price else subscription.plan.price
+
+        return Payment.objects.create(
+            subscription=subscription,
+            amount=prix * nombre_de_mois,
+            status='completed',
+            payment_date=timezone.now(),
+            due_date=timezone.now(),
+        )
+
+    # Étape 2 : jours de collecte
+    def assigner_jours(self, subscription, created, champs):
+        """
+        Assigner les jours de collecte une seule fois. Les jours sont rendus quand la
+        zone ou le plan change ; un abonnement réactivé garde les siens et n'est
+        complété que jusqu'au maximum de son plan.
+        """
+        if not created and ({'zone', 'plan'} & champs):
+            liberer_jours([subscription])
+
+        return len(subscription.assigner_jours_collecte_automatique())
+
+    # Étape 3 : programme de collecte
+    def generer_programme(self, subscription, created, champs):
+        """
+        Régénérer les collectes à venir quand les dates, la zone ou le plan changent ;
+        sinon compléter la fenêtre (la génération ne recrée pas l'existant).
+        """
+        if not created and ({'zone', 'plan', 'start_date', 'end_date'} & champs):
+            CollectionSchedule.objects.filter(
+                subscription=subscription,
+                scheduled_date__gte=timezone.now().date(),
+                status='scheduled'
+            ).delete()
+        return generate_collection_schedule(subscription)
+
+    def annuler_programme(self, subscription):
+        """Supprimer les collectes à venir d'un abonnement qui n'est plus actif"""
+        CollectionSchedule.objects.filter(
+            subscription=subscription,
+            scheduled_date__gte=timezone.now().date(),
+            status='scheduled'
+        ).delete()
+
+    # Étape 4 : QR code de réabonnement
+    def generer_qr_code(self, subscription, avec_image=True):
+        qr_code, created = SubscriptionQRCode.objects.get_or_create(subscription=subscription)
+        if not avec_image or qr_code.qr_code_image:
+            return qr_code
+
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(qr_code.get_renewal_url())
+        qr.make(fit=True)
+
+        img = qr.make_image(fill_color="black", back_color="white")
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+
+        filename = f"subscription_{subscription.id}_qr.png"
+        qr_code.qr_code_image.save(filename, buffer, save=True)
+        return qr_code
+
+    # Étape 5 : notification
+    def notifier(self, subscription, created, champs):
+        if created:
+            titre = "Abonnement créé"
+            message = f"Votre abonnement {subscription.plan.name} a été créé avec succès"
+            notification_type = 'success'
+        elif 'status' not in champs:
+            return None
+        elif subscription.status == 'active':
+            titre = "Abonnement activé"
+            message = f"Votre abonnement {subscription.plan.name} est actif. Vos collectes ont été programmées."
+            notification_type = 'success'
+        else:
+            titre = "Abonnement désactivé"
+            message = f"Votre abonnement {subscription.plan.name} a été désactivé. Les collectes programmées ont été annulées."
+            notification_type = 'warning'
+
+        return Notification.create_notification(
+            user=subscription.user,
+            title=titre,
+            message=message,
+            notification_type=notification_type,
+            related_object=subscription,
+            action_url=f'/subscriptions/{subscription.id}/'
+        )
@@ -0,0 +1,159 @@
+import logging
+from itertools import groupby
+
+import numpy as np
+import requests
+from django.conf import settings
+
+from app.services.geo import distances_km
+from app.services.routage import TAILLE_MAX_TABLE, OSRMClient
+
+
+logger = logging.getLogger(__name__)
+
+
+def matrice_trajets(points):
+    """
+    Matrices (durées en secondes, distances en mètres) entre tous les points (lat, lon).
+
+    Une requête OSRM `table` ; si OSRM est indisponible ou s'il y a trop de points,
+    distances à vol d'oiseau et durées estimées à TRICYCLE_VITESSE_KMH.
+    """
+    if 1 < len(points) <= TAILLE_MAX_TABLE:
+        try:
+            durees, distances = OSRMClient().table(points)
+            durees = np.array(durees, dtype=float)
+            distances = np.array(distances, dtype=float) if distances else None
+            if distances is not None and not np.isnan(durees).any() and not np.isnan(distances).any():
+                return durees, distances
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Matrice OSRM indisponible, estimation à vol d'oiseau: {e}")
+
+    latitudes = [float(p[0]) for p in points]
+    longitudes = [float(p[1]) for p in points]
+    distances = np.array([
+        distances_km(lat, lon, latitudes, longitudes) for lat, lon in zip(latitudes, longitudes)
+    ]).reshape(len(points), len(points)) * 1000
+    vitesse = getattr(settings, 'TRICYCLE_VITESSE_KMH', 15) / 3.6  # m/s
+    return distances / vitesse, distances
+
+
+def cout_chemin(matrice, chemin):
+    return float(sum(matrice[a, b] for a, b in zip(chemin, chemin[1:])))
+
+
+def _plus_proche_voisin(matrice, depart, arrets):
+    chemin = [depart]
+    restants = list(arrets)
+    while restants:
+        suivant = min(restants, key=lambda j: matrice[chemin[-1], j])
+        chemin.append(suivant)
+        restants.remove(suivant)
+    return chemin
+
+
+def _deux_opt(matrice, chemin):
+    """2-opt sur un chemin ouvert dont le premier point (départ) est fixe"""
+    ameliore = True
+    while ameliore:
+        ameliore = False
+        for i in range(1, len(chemin) - 1):
+            for k in range(i + 1, len(chemin)):
+                a, b = chemin[i - 1], chemin[i]
+                c = chemin[k]
+                d = chemin[k + 1] if k + 1 < len(chemin) else None
+                avant = matrice[a, b] + (matrice[c, d] if d is not None else 0)
+                apres = matrice[a, c] + (matrice[b, d] if d is not None else 0)
+                if apres < avant - 1e-9:
+                    chemin[i:k + 1] = reversed(chemin[i:k + 1])
+                    ameliore = True
+    return chemin
+
+
+def _or_opt(matrice, chemin):
+    """Déplacer des segments de 1 à 3 arrêts vers une meilleure position (chemin ouvert)"""
+    ameliore = True
+    while ameliore:
+        ameliore = False
+        for longueur in (1, 2, 3):
+            i = 1
+            while i + longueur <= len(chemin):
+                premier, dernier = chemin[i], chemin[i + longueur - 1]
+                precedent = chemin[i - 1]
+                suivant = chemin[i + longueur] if i + longueur < len(chemin) else None
+                gain = matrice[precedent, premier]
+                if suivant is not None:
+                    gain += matrice[dernier, suivant] - matrice[precedent, suivant]
+
+                segment = chemin[i:i + longueur]
+                reste = chemin[:i] + chemin[i + longueur:]
+                meilleur, position = 1e-9, None
+                for j in range(1, len(reste) + 1):
+                    if j == i:
+                        continue
+                    p = reste[j - 1]
+                    q = reste[j] if j < len(reste) else None
+                    cout = matrice[p, premier]
+                    if q is not None:
+                        cout += matrice[dernier, q] - matrice[p, q]
+                    if gain - cout > meilleur:
+                        meilleur, position = gain - cout, j
+
+                if position is not None:
+                    chemin[:] = reste[:position] + segment + reste[position:]
+                    ameliore = True
+                i += 1
+    return chemin
+
+
+def optimiser_ordre(matrice, creneaux=None, depart=0):
+    """
+    Ordre de visite des arrêts (indices de la matrice, hors départ) à partir du point
+    `depart` : plus proche voisin puis améliorations 2-opt et Or-opt.
+
+    creneaux : heure prévue de chaque point. Les créneaux sont servis dans l'ordre
+    (tous les arrêts de 8h avant ceux de 10h) ; l'ordre est optimisé à l'intérieur
+    de chaque créneau, en partant du dernier arrêt du créneau précédent.
+    """
+    matrice = np.asarray(matrice, dtype=float)
+    # Optimisation sur la matrice symétrisée (OSRM peut être légèrement asymétrique)
+    symetrique = (matrice + matrice.T) / 2
+    arrets = [i for i in range(len(matrice)) if i != depart]
+    if creneaux is not None:
+        arrets.sort(key=lambda i: creneaux[i])
+        groupes = [list(g) for _, g in groupby(arrets, key=lambda i: creneaux[i])]
+    else:
+        groupes = [arrets]
+
+    ordre = []
+    position = depart
+    for groupe in groupes:
+        chemin = _plus_proche_voisin(symetrique, position, groupe)
+        chemin = _or_opt(symetrique, _deux_opt(symetrique, chemin))
+        ordre.extend(chemin[1:])
+        position = chemin[-1]
+    return ordre
+
+
+def optimiser_tournee(depart, arrets, creneaux=None):
+    """
+    Tournée optimisée depuis `depart` (lat, lon) vers les `arrets` [(lat, lon)].
+
+    Retourne {'ordre': indices dans `arrets`, 'distance': mètres, 'duree': secondes,
+    'etapes': [(distance, durée) depuis l'arrêt précédent]}.
+    """
+    if not arrets:
+        return {'ordre': [], 'distance': 0, 'duree': 0, 'etapes': []}
+
+    durees, distances = matrice_trajets([depart] + list(arrets))
+    # Le départ (indice 0) n'a pas de créneau : il n'est jamais trié
+    creneaux_points = [None] + list(creneaux) if creneaux is not None else None
+
+    chemin = [0] + optimiser_ordre(durees, creneaux_points, depart=0)
+    etapes = [(float(distances[a, b]), float(durees[a, b])) for a, b in zip(chemin, chemin[1:])]
+    return {
+        'ordre': [i - 1 for i in chemin[1:]],
+        'distance': cout_chemin(distances, chemin),
+        'duree': cout_chemin(durees, chemin),
+        'etapes': etapes,
+    }
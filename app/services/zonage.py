@@ -0,0 +1,220 @@
+import json
+import logging
+
+import numpy as np
+from django.db.models import Count, Max
+
+from app.models import Address, Zone
+
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale (points x sommets) d'un bloc de calcul vectorisé
+TAILLE_BLOC = 1_000_000
+
+_resolveur = None
+
+
+def lire_polygones(texte):
+    """
+    Polygones d'une zone à partir de Zone.polygone_coordinates : liste de polygones,
+    chacun liste d'anneaux (tableaux (n, 2) de (lat, lon)), le premier anneau étant
+    le contour et les suivants des trous.
+
+    Formats acceptés (JSON) :
+    - GeoJSON Polygon / MultiPolygon, seul ou dans un Feature (coordonnées [lon, lat]) ;
+    - liste de points [lat, lon] ou {"lat": .., "lng": ..} (tracé d'une carte Leaflet),
+      ou liste de telles listes pour plusieurs polygones.
+    Lève ValueError si le texte n'est pas un polygone exploitable.
+    """
+    if not texte or not texte.strip():
+        return []
+    try:
+        donnees = json.loads(texte)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON invalide : {e}")
+
+    if isinstance(donnees, dict):
+        if donnees.get('type') == 'Feature':
+            donnees = donnees.get('geometry') or {}
+        if donnees.get('type') == 'Polygon':
+            polygones = [donnees.get('coordinates')]
+        elif donnees.get('type') == 'MultiPolygon':
+            polygones = donnees.get('coordinates')
+        else:
+            raise ValueError("Géométrie GeoJSON attendue : Polygon ou MultiPolygon")
+        # GeoJSON : [lon, lat]
+        return [[_anneau(anneau, inverser=True) for anneau in polygone] for polygone in polygones or []]
+
+    if not isinstance(donnees, list) or not donnees:
+        raise ValueError("Liste de points attendue")
+    if _est_point(donnees[0]):
+        return [[_anneau(donnees)]]
+    return [[_anneau(contour)] for contour in donnees]
+
+
+def _est_point(valeur):
+    return isinstance(valeur, dict) or (
+        isinstance(valeur, (list, tuple)) and len(valeur) == 2 and not isinstance(valeur[0], (list, tuple, dict))
+    )
+
+
+def _anneau(points, inverser=False):
+    try:
+        if points and isinstance(points[0], dict):
+            anneau = [(float(p['lat']), float(p.get('lng', p.get('lon')))) for p in points]
+        else:
+            anneau = [(float(b), float(a)) if inverser else (float(a), float(b)) for a, b in points]
+    except (TypeError, ValueError, KeyError):
+        raise ValueError("Point invalide dans le polygone")
+    if len(anneau) < 3:
+        raise ValueError("Un polygone doit avoir au moins trois points")
+    return np.array(anneau, dtype=float)
+
+
+def _dans_anneau(anneau, latitudes, longitudes):
+    """Lancer de rayon vectorisé : points x arêtes, par blocs"""
+    y1, x1 = anneau[:, 0], anneau[:, 1]
+    y2, x2 = np.roll(y1, 1), np.roll(x1, 1)
+    resultat = np.zeros(len(latitudes), dtype=bool)
+    pas = max(1, TAILLE_BLOC // len(anneau))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for debut in range(0, len(latitudes), pas):
+            lat = latitudes[debut:debut + pas, None]
+            lon = longitudes[debut:debut + pas, None]
+            croise = ((y1 > lat) != (y2 > lat)) & (lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1)
+            resultat[debut:debut + pas] = np.count_nonzero(croise, axis=1) % 2 == 1
+    return resultat
+
+
+class ResolveurZones:
+    """
+    Polygones des zones actives analysés une fois, avec leur rectangle englobant :
+    seuls les points dans le rectangle passent le test du lancer de rayon.
+    En cas de chevauchement, la première zone (ordre ville, nom) l'emporte.
+    """
+
+    def __init__(self, zones, version=None):
+        self.version = version
+        self.zones = []
+        for zone_id, polygones in zones:
+            if not polygones:
+                continue
+            points = np.vstack([anneau for polygone in polygones for anneau in polygone])
+            rectangle = (points[:, 0].min(), points[:, 0].max(), points[:, 1].min(), points[:, 1].max())
+            self.zones.append((zone_id, rectangle, polygones))
+
+    @classmethod
+    def depuis_base(cls, version=None):
+        zones = []
+        for zone_id, nom, texte in Zone.objects.filter(is_active=True).exclude(
+            polygone_coordinates=''
+        ).order_by('ville', 'nom').values_list('id', 'nom', 'polygone_coordinates'):
+            try:
+                zones.append((zone_id, lire_polygones(texte)))
+            except ValueError as e:
+                logger.warning(f"Polygone de la zone {nom} ignoré : {e}")
+        return cls(zones, version=version)
+
+    def zones_pour(self, latitudes, longitudes):
+        """Identifiant de zone (ou None) de chaque point, en une passe vectorisée par zone"""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        resultats = np.full(len(latitudes), None, dtype=object)
+        restants = ~(np.isnan(latitudes) | np.isnan(longitudes))
+
+        for zone_id, (lat_min, lat_max, lon_min, lon_max), polygones in self.zones:
+            candidats = np.flatnonzero(
+                restants
+                & (latitudes >= lat_min) & (latitudes <= lat_max)
+                & (longitudes >= lon_min) & (longitudes <= lon_max)
+            )
+            if not len(candidats):
+                continue
+            dedans = np.zeros(len(candidats), dtype=bool)
+            for polygone in polygones:
+                # Parité sur tous les anneaux : les trous sont exclus
+                parite = np.zeros(len(candidats), dtype=bool)
+                for anneau in polygone:
+                    parite ^= _dans_anneau(anneau, latitudes[candidats], longitudes[candidats])
+                dedans |= parite
+            resultats[candidats[dedans]] = zone_id
+            restants[candidats[dedans]] = False
+
+        return resultats.tolist()
+
+    def zone_pour(self, lat, lon):
+        if lat in (None, '') or lon in (None, ''):
+            return None
+        return self.zones_pour([float(lat)], [float(lon)])[0]
+
+
+def version_zones():
+    """
+    Version des polygones lue en base (nombre de zones, dernière modification) : une
+    requête d'agrégation, commune à tous les processus, contrairement au cache local
+    (LocMemCache) de chaque worker.
+    """
+    version = Zone.objects.aggregate(nombre=Count('id'), modification=Max('updated_at'))
+    return version['nombre'], version['modification']
+
+
+def resolveur_zones():
+    """Résolveur du processus, rechargé quand une zone a été modifiée (ici ou dans un autre processus)"""
+    global _resolveur
+    version = version_zones()
+    if _resolveur is None or _resolveur.version != version:
+        _resolveur = ResolveurZones.depuis_base(version=version)
+    return _resolveur
+
+
+def invalider_zones():
+    """À appeler quand une zone est créée, modifiée ou supprimée (processus courant)"""
+    global _resolveur
+    _resolveur = None
+
+
+def zone_depuis_coordonnees(lat, lon):
+    """Zone (objet) contenant le point, ou None"""
+    zone_id = resolveur_zones().zone_pour(lat, lon)
+    return Zone.objects.filter(id=zone_id).first() if zone_id else None
+
+
+def rezoner_adresses(appliquer=True, taille_lot=2000):
+    """
+    Recalculer la zone de toutes les adresses géolocalisées (après modification des
+    polygones). Les adresses hors de tout polygone gardent leur zone actuelle.
+    Retourne (rapport, identifiants des adresses changées de zone).
+    """
+    resolveur = resolveur_zones()
+    rapport = {'adresses': 0, 'hors_zones': 0, 'changees': 0}
+    changees = []
+    adresses = Address.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).only('id', 'latitude', 'longitude', 'zone_id').order_by('id')
+
+    lot = []
+    for address in adresses.iterator(chunk_size=taille_lot):
+        lot.append(address)
+        if len(lot) == taille_lot:
+            changees += _rezoner_lot(resolveur, lot, rapport, appliquer, taille_lot)
+            lot = []
+    if lot:
+        changees += _rezoner_lot(resolveur, lot, rapport, appliquer, taille_lot)
+    return rapport, changees
+
+
+def _rezoner_lot(resolveur, lot, rapport, appliquer, taille_lot):
+    zones = resolveur.zones_pour([a.latitude for a in lot], [a.longitude for a in lot])
+    a_mettre_a_jour = []
+    for address, zone_id in zip(lot, zones):
+        rapport['adresses'] += 1
+        if zone_id is None:
+            rapport['hors_zones'] += 1
+        elif zone_id != address.zone_id:
+            address.zone_id = zone_id
+            a_mettre_a_jour.append(address)
+    rapport['changees'] += len(a_mettre_a_jour)
+    if appliquer:
+        Address.objects.bulk_update(a_mettre_a_jour, ['zone'], batch_size=taille_lot)
+    return [a.id for a in a_mettre_a_jour]
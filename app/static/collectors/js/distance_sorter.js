@@ -7,6 +7,7 @@ class CollectionDistanceSorter {
         self.watchId = null;
         self.currentPosition = null;
         self.collections = [];
+        self.etag = null; // version de la dernière réponse (If-None-Match)
         self.filters = {
             maxDistance: options.maxDistance || null,
             hideCompleted: options.hideCompleted || false,
@@ -134,15 +135,32 @@ class CollectionDistanceSorter {
             url.searchParams.append('date', date);
         }
         
+        // Tournée optimisée (?mode=tournee) au lieu du tri par distance
+        const mode = urlParams.get('mode');
+        if (mode) {
+            url.searchParams.append('mode', mode);
+        }
+        
         try {
+            const headers = {
+                'X-Requested-With': 'XMLHttpRequest',
+            };
+            if (self.etag) {
+                headers['If-None-Match'] = self.etag;
+            }
             const response = await fetch(url, {
                 method: 'GET',
-                headers: {
-                    'X-Requested-With': 'XMLHttpRequest',
-                }
+                cache: 'no-store',
+                headers: headers
             });
             
+            // 304 : manifeste inchangé et position proche de la précédente, liste conservée
+            if (response.status === 304) {
+                return;
+            }
+            
             const data = await response.json();
+            self.etag = response.headers.get('ETag');
             
             if (data.success) {
                 self.collections = data.collections;
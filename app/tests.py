@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import time as time_module
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import requests
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Address, ArretManifeste, City, CollectionDay, CollectionRequest, CollectionSchedule, CollectorDailyStats,
+    CustomUser, GasOrder, GeocodageAdresse, ManifesteTricycle, Notification, Performence, ProgrammeTricycle,
+    ReplanificationZone, Subscription, SubscriptionDay, SubscriptionPlan, SubscriptionQRCode, Tricycle, Zone
+)
+from .services.allocation import liberer_jours, occupation_programmes, reserver_places
+from .services.calendrier import DUREE_MAX_CALENDRIER, calendrier_abonnement, occurrences
+from .services.compteurs_gaz import calculer_compteurs_gaz, compteurs_gaz
+from .services.geo import classer_par_distance, distances_km, objets_proches
+from .services.http_async import ClientAsync, ServiceIndisponible
+from .services.geocodage import StubProvider, geocoder_adresses_sans_coordonnees, normaliser_adresse
+from .services.maintenance import executer_maintenance
+from .services.manifeste import construire_manifeste
+from .services.notation import bilans_du_jour, derniere_note, noter_tricycles
+from .services.planning import (
+    etendre_fenetre_collectes, generate_collection_schedule, horizon_collectes, replanifier_zone
+)
+from .services.replanification import executer_replanifications_dues
+from .services.repartition import JOURS_SEMAINE, filtre_manifeste, repartir_arrets
+from .services.routage import TAILLE_MAX_TABLE, OSRMClient
+from .services.statistiques import reconstruire_stats_collecteurs, stats_demandes, stats_tournees
+from .services.tournee import _plus_proche_voisin, cout_chemin, matrice_trajets, optimiser_ordre, optimiser_tournee
+from .services.zonage import ResolveurZones, lire_polygones, resolveur_zones, rezoner_adresses
+
+
+MEDIA_TEST = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TEST)
+class ZoneAbonnementsTestCase(TestCase):
+    """Zone desservie par un tricycle quatre jours par semaine, un plan et un client"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TEST, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        for ordre, nom in enumerate(['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']):
+            CollectionDay.objects.get_or_create(name=nom, defaults={'order': ordre})
+
+        ville = City.objects.create(city='Douala')
+        cls.zone = Zone.objects.create(nom='Akwa', ville=ville)
+        cls.tricycle = tricycle = Tricycle.objects.create(numero_immatriculation='LT-001', nom='T1', capacite_kg=500)
+        for jour in ['lundi', 'mercredi', 'vendredi', 'samedi']:
+            ProgrammeTricycle.objects.create(
+                tricycle=tricycle, zone=cls.zone, jour_semaine=jour,
+                heure_debut=time(8, 0), heure_fin=time(12, 0), capacite_max_clients=10
+            )
+        # Création des programmes du jeu de données : pas de replanification en attente
+        ReplanificationZone.objects.all().delete()
+
+        cls.plan = SubscriptionPlan.objects.create(
+            name='Premium', plan_type='premium', price=5000, frequency='5000',
+            max_collections_per_week=3
+        )
+        cls.user = CustomUser.objects.create_user(username='client', password='secret')
+        cls.address = Address.objects.create(
+            user=cls.user, title='Maison', street='Rue 1', city='Douala',
+            postal_code='0000', zone=cls.zone
+        )
+
+    def creer_abonnement(self, status='active', duree=30):
+        today = timezone.now().date()
+        return Subscription.objects.create(
+            user=self.user, address=self.address, zone=self.zone, plan=self.plan,
+            status=status, start_date=today, end_date=today + timedelta(days=duree)
+        )
+
+
+class CycleVieAbonnementTests(ZoneAbonnementsTestCase):
+    """Création d'un abonnement actif : un seul passage dans le pipeline du cycle de vie"""
+
+    # paiement, jours (réservation par UPDATE conditionnel + bulk_create), génération groupée,
+    # QR code, notification, savepoints... : borne large mais fixe
+    MAX_REQUETES_CREATION = 30
+
+    def test_nombre_de_requetes_creation(self):
+        with CaptureQueriesContext(connection) as requetes:
+            subscription = self.creer_abonnement()
+
+        self.assertLessEqual(len(requetes), self.MAX_REQUETES_CREATION)
+
+        # Les jours sont assignés une seule fois, dans la limite du plan
+        self.assertEqual(subscription.collection_days.count(), 3)
+        self.assertEqual(
+            sum(ProgrammeTricycle.objects.filter(zone=self.zone).values_list('clients_actuels', flat=True)), 3
+        )
+        self.assertTrue(CollectionSchedule.objects.filter(subscription=subscription).exists())
+        self.assertEqual(SubscriptionQRCode.objects.filter(subscription=subscription).count(), 1)
+        self.assertEqual(
+            Notification.objects.filter(related_object_id=subscription.id, title='Abonnement créé').count(), 1
+        )
+
+    def test_enregistrement_sans_changement(self):
+        subscription = self.creer_abonnement()
+        subscription = Subscription.objects.get(pk=subscription.pk)
+        subscription.special_instructions = 'Sonner deux fois'
+
+        with CaptureQueriesContext(connection) as requetes:
+            subscription.save()
+
+        self.assertEqual(len(requetes), 1)
+
+
+class StatistiquesTableauDeBordTests(ZoneAbonnementsTestCase):
+    """Statistiques des tournées du tableau de bord et de l'API du collecteur"""
+
+    def test_statistiques_tableau_de_bord(self):
+        subscription = self.creer_abonnement()
+        today = timezone.now().date()
+        semaine = CollectionSchedule.objects.filter(
+            subscription=subscription, scheduled_date__range=[today, today + timedelta(days=6)]
+        )
+        semaine.filter(scheduled_date=semaine.first().scheduled_date).update(status='completed')
+
+        with self.assertNumQueries(1):
+            stats = stats_tournees(self.tricycle, today)
+
+        self.assertEqual(stats['week']['total'], semaine.count())
+        self.assertEqual(stats['week']['completed'], semaine.filter(status='completed').count())
+        self.assertEqual(stats['today']['total'], semaine.filter(scheduled_date=today).count())
+
+    def test_api_statistiques(self):
+        subscription = self.creer_abonnement()
+        today = timezone.now().date()
+        collecteur = CustomUser.objects.create_user(username='collecteur', password='secret', user_type='collecteur')
+        Tricycle.objects.filter(pk=self.tricycle.pk).update(conducteur=collecteur)
+        for status in ['in_progress', 'pending']:
+            CollectionRequest.objects.create(
+                subscription=subscription, scheduled_date=today, scheduled_time=time(9),
+                collector=collecteur, status=status
+            )
+        self.client.force_login(collecteur)
+
+        stats = self.client.get(reverse('api_collection_stats')).json()
+
+        # Collectes du jour : part du tricycle ; en cours : demandes démarrées par le collecteur
+        self.assertEqual(stats['today']['total'], stats_tournees(self.tricycle, today)['today']['total'])
+        self.assertEqual(stats['today']['in_progress'], 1)
+        self.assertEqual(set(stats), {'today', 'week', 'upcoming', 'timestamp'})
+
+
+class NotationTricyclesTests(ZoneAbonnementsTestCase):
+    """Notation nocturne des tricycles à partir des collectes du jour"""
+
+    def test_notation_nocturne(self):
+        subscription = self.creer_abonnement()
+        jour = CollectionSchedule.objects.filter(subscription=subscription).earliest('scheduled_date').scheduled_date
+        collectes = CollectionSchedule.objects.filter(scheduled_date=jour)
+        collectes.filter(pk=collectes.first().pk).update(status='completed')
+
+        self.assertEqual(noter_tricycles(jour), {'notes_creees': 1, 'notes_mises_a_jour': 0})
+        note = Performence.objects.get(Tricycle=self.tricycle, date=jour).note
+        self.assertEqual(note, round(5 / collectes.count(), 2))
+
+        # Relancer la notation du même jour met la note à jour sans doublon
+        collectes.update(status='completed')
+        self.assertEqual(noter_tricycles(jour), {'notes_creees': 0, 'notes_mises_a_jour': 1})
+        self.assertEqual(Performence.objects.get(Tricycle=self.tricycle, date=jour).note, 5)
+
+    def test_zone_partagee(self):
+        for _ in range(4):
+            self.creer_abonnement()
+        jour = CollectionSchedule.objects.earliest('scheduled_date').scheduled_date
+        second = Tricycle.objects.create(numero_immatriculation='LT-002', nom='T2', capacite_kg=500)
+        inactif = Tricycle.objects.create(numero_immatriculation='LT-003', nom='T3', capacite_kg=500)
+        for tricycle, actif in [(second, True), (inactif, False)]:
+            ProgrammeTricycle.objects.create(
+                tricycle=tricycle, zone=self.zone, jour_semaine=JOURS_SEMAINE[jour.weekday()], is_active=actif,
+                heure_debut=time(13, 0), heure_fin=time(17, 0), capacite_max_clients=10
+            )
+
+        # Chaque tricycle répond de sa part de la répartition et des collectes non attribuées
+        a_t1, a_t2, libre, annulee = CollectionSchedule.objects.filter(scheduled_date=jour).order_by('id')
+        CollectionSchedule.objects.filter(pk=a_t1.pk).update(tricycle=self.tricycle, status='completed')
+        CollectionSchedule.objects.filter(pk=a_t2.pk).update(tricycle=second)
+        CollectionSchedule.objects.filter(pk=libre.pk).update(status='completed')
+        CollectionSchedule.objects.filter(pk=annulee.pk).update(status='cancelled')
+
+        with self.assertNumQueries(1):
+            bilans = bilans_du_jour(jour)
+        self.assertEqual(bilans, {self.tricycle.id: (2, 2), second.id: (2, 1)})
+
+        noter_tricycles(jour)
+        self.assertEqual(
+            dict(Performence.objects.filter(date=jour).values_list('Tricycle_id', 'note')),
+            {self.tricycle.id: 5, second.id: 2.5}
+        )
+        self.assertEqual(derniere_note(second), (2.5, jour))
+
+
+class GenerationCollectesTests(ZoneAbonnementsTestCase):
+    """Génération du programme d'un abonnement : lignes calculées en mémoire, insérées par paquets"""
+
+    # Jours de l'abonnement, dernières dates déjà en base, invalidation des manifestes,
+    # et une requête INSERT par paquet
+    MAX_REQUETES_HORS_INSERTS = 4
+
+    def test_nombre_de_lignes_et_de_requetes(self):
+        subscription = self.creer_abonnement(duree=90)
+        collectes = CollectionSchedule.objects.filter(subscription=subscription)
+        attendues = collectes.count()
+        self.assertEqual(attendues, sum(
+            len(list(occurrences(nom, timezone.now().date(), horizon_collectes())))
+            for nom in subscription.collection_days.values_list('day__name', flat=True)
+        ))
+        collectes.delete()
+
+        with CaptureQueriesContext(connection) as requetes:
+            creees = generate_collection_schedule(subscription, batch_size=5)
+
+        self.assertEqual(creees, attendues)
+        self.assertEqual(collectes.count(), attendues)
+        inserts = [r for r in requetes if r['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), -(-attendues // 5))
+        self.assertLessEqual(len(requetes) - len(inserts), self.MAX_REQUETES_HORS_INSERTS)
+
+        # Deuxième appel : rien à créer
+        self.assertEqual(generate_collection_schedule(subscription), 0)
+
+
+@override_settings(COLLECTION_HORIZON_WEEKS=2)
+class FenetreCollectesTests(ZoneAbonnementsTestCase):
+    """Fenêtre glissante : seules les semaines à venir sont matérialisées"""
+
+    def attendues(self, subscription, fin):
+        today = timezone.now().date()
+        return sum(
+            len(list(occurrences(nom, today, fin)))
+            for nom in subscription.collection_days.values_list('day__name', flat=True)
+        )
+
+    def test_horizon_puis_extension(self):
+        today = timezone.now().date()
+        subscription = self.creer_abonnement(duree=90)
+        collectes = CollectionSchedule.objects.filter(subscription=subscription)
+
+        horizon = horizon_collectes(today)
+        self.assertEqual(collectes.count(), self.attendues(subscription, horizon))
+        self.assertLessEqual(collectes.latest('scheduled_date').scheduled_date, horizon)
+
+        # Extension nocturne d'une semaine : seule la semaine suivante est ajoutée
+        sortie = StringIO()
+        call_command('etendre_collectes', semaines=3, stdout=sortie)
+        fin = today + timedelta(weeks=3)
+        self.assertEqual(collectes.count(), self.attendues(subscription, fin))
+        self.assertEqual(collectes.filter(scheduled_date__gt=horizon).count(), 3)
+        self.assertEqual(
+            collectes.values('scheduled_date', 'scheduled_day').distinct().count(), collectes.count()
+        )
+        self.assertIn("3 collectes créées", sortie.getvalue())
+
+        # Relancer ne crée rien
+        self.assertEqual(etendre_fenetre_collectes(jusqu_au=fin), 0)
+
+
+class ReservationPlacesTests(ZoneAbonnementsTestCase):
+    """Réservation des places des programmes par UPDATE conditionnel"""
+
+    def programme(self, jour):
+        return ProgrammeTricycle.objects.get(zone=self.zone, jour_semaine=jour)
+
+    def test_programme_complet(self):
+        lundi = self.programme('lundi')
+        ProgrammeTricycle.objects.filter(pk=lundi.pk).update(clients_actuels=9)
+
+        self.assertEqual(reserver_places(lundi.pk, 3), 1)
+        self.assertEqual(reserver_places(lundi.pk, 1), 0)
+        self.assertEqual(self.programme('lundi').clients_actuels, 10)
+
+        # Le créneau complet est sauté : l'abonnement prend les suivants de la semaine
+        subscription = self.creer_abonnement()
+        self.assertEqual(
+            set(subscription.collection_days.values_list('day__name', flat=True)), {'mercredi', 'vendredi', 'samedi'}
+        )
+        self.assertEqual(self.programme('lundi').clients_actuels, 10)
+        self.assertEqual(self.programme('samedi').clients_actuels, 1)
+
+    def test_liberer_jours(self):
+        subscription = self.creer_abonnement()
+        self.assertEqual(sum(occupation_programmes().values()), 3)
+
+        liberer_jours([subscription])
+
+        self.assertFalse(SubscriptionDay.objects.filter(subscription=subscription).exists())
+        self.assertEqual(
+            list(ProgrammeTricycle.objects.filter(zone=self.zone).values_list('clients_actuels', flat=True)), [0] * 4
+        )
+
+
+class ReplanificationZoneTests(ZoneAbonnementsTestCase):
+    """Compteurs des programmes après replanification d'une zone"""
+
+    def compteurs(self):
+        return dict(ProgrammeTricycle.objects.filter(zone=self.zone).values_list('id', 'clients_actuels'))
+
+    def verifier_compteurs(self):
+        occupation = occupation_programmes()
+        self.assertEqual(self.compteurs(), {i: occupation.get(i, 0) for i in self.compteurs()})
+
+    def test_zone_sans_abonnement_actif(self):
+        subscription = self.creer_abonnement()
+        # Abonnement mis en attente sans passer par les signaux : ses jours restent rattachés
+        Subscription.objects.filter(pk=subscription.pk).update(status='pending')
+        ProgrammeTricycle.objects.filter(zone=self.zone).update(clients_actuels=0)
+
+        replanifier_zone(self.zone, notifier=False)
+
+        self.verifier_compteurs()
+        self.assertEqual(sum(self.compteurs().values()), 3)
+
+    def test_programme_desactive_garde_ses_jours(self):
+        en_attente = self.creer_abonnement()
+        Subscription.objects.filter(pk=en_attente.pk).update(status='pending')
+        self.creer_abonnement()
+        programme = ProgrammeTricycle.objects.filter(jours_abonnement__subscription=en_attente).first()
+        ProgrammeTricycle.objects.filter(pk=programme.pk).update(is_active=False, clients_actuels=0)
+
+        replanifier_zone(self.zone, notifier=False)
+
+        self.verifier_compteurs()
+
+
+class PlanificateurDifferentielTests(ZoneAbonnementsTestCase):
+    """Modification d'un programme : seules les lignes concernées et les dates à venir changent"""
+
+    def setUp(self):
+        self.subscription = self.creer_abonnement()
+        jours = self.subscription.collection_days.select_related('day', 'programme_tricycle')
+        self.jours = {j.day.name: j for j in jours}
+        self.today = timezone.now().date()
+
+    def executer_replanifications(self):
+        ReplanificationZone.objects.filter(status='pending').update(executer_apres=timezone.now())
+        executer_replanifications_dues()
+
+    def collecte_passee(self, jour):
+        return CollectionSchedule.objects.create(
+            subscription=self.subscription, scheduled_day=jour.day, scheduled_time=jour.time_slot,
+            scheduled_date=self.today - timedelta(days=7)
+        )
+
+    def collectes_futures(self, nom_jour):
+        return CollectionSchedule.objects.filter(
+            subscription=self.subscription, scheduled_day__name=nom_jour, scheduled_date__gte=self.today
+        )
+
+    def test_programme_recale(self):
+        nom, jour = next(iter(self.jours.items()))
+        passee = self.collecte_passee(jour)
+        programme = jour.programme_tricycle
+        programme.heure_debut = time(14, 0)
+        programme.save()
+
+        self.executer_replanifications()
+
+        # Les jours d'abonnement existants sont réutilisés, seul l'horaire change
+        apres = {j.id: j for j in self.subscription.collection_days.all()}
+        self.assertEqual(set(apres), {j.id for j in self.jours.values()})
+        self.assertEqual(apres[jour.id].time_slot, time(14, 0))
+        self.assertTrue(self.collectes_futures(nom).exists())
+        self.assertFalse(self.collectes_futures(nom).exclude(scheduled_time=time(14, 0)).exists())
+        passee.refresh_from_db()
+        self.assertEqual(passee.scheduled_time, jour.time_slot)
+
+    def test_programme_supprime(self):
+        nom, jour = next(iter(self.jours.items()))
+        passee = self.collecte_passee(jour)
+        jour.programme_tricycle.delete()
+
+        self.executer_replanifications()
+
+        apres = {j.day.name: j for j in self.subscription.collection_days.select_related('day')}
+        self.assertNotIn(nom, apres)
+        self.assertEqual(len(apres), 3)
+        # Les deux jours conservés gardent leur ligne, le remplaçant est une nouvelle ligne
+        conserves = {j.id for n, j in self.jours.items() if n != nom}
+        self.assertEqual(conserves, {j.id for j in apres.values()} & conserves)
+        nouveau = (set(apres) - set(self.jours)).pop()
+        self.assertTrue(self.collectes_futures(nouveau).exists())
+        self.assertFalse(self.collectes_futures(nom).exists())
+        self.assertTrue(CollectionSchedule.objects.filter(pk=passee.pk).exists())
+        self.assertEqual(
+            ProgrammeTricycle.objects.get(zone=self.zone, jour_semaine=nouveau).clients_actuels, 1
+        )
+
+    def test_programme_deplace(self):
+        nom, jour = next(iter(self.jours.items()))
+        passee = self.collecte_passee(jour)
+        programme = jour.programme_tricycle
+        programme.jour_semaine = 'mardi'
+        programme.save()
+
+        self.executer_replanifications()
+
+        apres = {j.day.name: j for j in self.subscription.collection_days.select_related('day')}
+        self.assertNotIn(nom, apres)
+        self.assertEqual(apres['mardi'].programme_tricycle_id, programme.id)
+        self.assertFalse(self.collectes_futures(nom).exists())
+        self.assertTrue(self.collectes_futures('mardi').exists())
+        self.assertTrue(CollectionSchedule.objects.filter(pk=passee.pk).exists())
+        self.assertFalse(SubscriptionDay.objects.filter(pk=jour.pk).exists())
+
+
+@override_settings(ZONE_REPLAN_DELAY_SECONDS=30)
+class FileReplanificationTests(ZoneAbonnementsTestCase):
+    """Replanifications regroupées par zone et exécutées une fois la fenêtre écoulée"""
+
+    def test_modifications_regroupees(self):
+        subscription = self.creer_abonnement()
+        jours = list(subscription.collection_days.select_related('programme_tricycle')[:2])
+        for jour in jours:
+            jour.programme_tricycle.delete()
+
+        job = ReplanificationZone.objects.get(zone=self.zone)
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(job.nombre_demandes, 2)
+        self.assertEqual(
+            sorted(job.jours_supprimes), sorted([str(subscription.id), jour.day_id] for jour in jours)
+        )
+        self.assertGreater(job.executer_apres, timezone.now() + timedelta(seconds=20))
+
+    def test_job_du_execute(self):
+        programme = ProgrammeTricycle.objects.filter(zone=self.zone).first()
+        programme.heure_debut = time(9, 0)
+        programme.save()
+
+        # Fenêtre de regroupement pas encore écoulée : rien n'est exécuté
+        self.assertEqual(executer_replanifications_dues(), [])
+        self.assertEqual(ReplanificationZone.objects.get().status, 'pending')
+
+        ReplanificationZone.objects.update(executer_apres=timezone.now() - timedelta(seconds=1))
+        executes = executer_replanifications_dues()
+
+        self.assertEqual(len(executes), 1)
+        job = ReplanificationZone.objects.get()
+        self.assertEqual(job.status, 'done')
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.rapport['zone'], self.zone.nom)
+
+
+class CalendrierTests(ZoneAbonnementsTestCase):
+    """Calendriers calculés à partir des règles, sans dépendre des collectes matérialisées"""
+
+    def test_occurrences(self):
+        self.assertEqual(
+            list(occurrences('lundi', date(2026, 1, 28), date(2026, 2, 10))), [date(2026, 2, 2), date(2026, 2, 9)]
+        )
+        self.assertEqual(
+            list(occurrences('jeudi', date(2025, 12, 30), date(2026, 1, 15))),
+            [date(2026, 1, 1), date(2026, 1, 8), date(2026, 1, 15)]
+        )
+        # Même résultat qu'un parcours jour par jour, quel que soit le jour de départ
+        noms = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+        for debut in (date(2025, 12, 25) + timedelta(days=n) for n in range(7)):
+            fin = debut + timedelta(days=40)
+            for numero, nom in enumerate(noms):
+                attendues = [
+                    debut + timedelta(days=n) for n in range(41) if (debut + timedelta(days=n)).weekday() == numero
+                ]
+                self.assertEqual(list(occurrences(nom, debut, fin)), attendues)
+
+    def test_lignes_enregistrees_prioritaires(self):
+        subscription = self.creer_abonnement()
+        today = timezone.now().date()
+        manquee = CollectionSchedule.objects.filter(subscription=subscription, scheduled_date__gte=today).earliest(
+            'scheduled_date'
+        )
+        CollectionSchedule.objects.filter(pk=manquee.pk).update(status='missed', scheduled_time=time(10, 0))
+        # Collecte matérialisée absente : l'occurrence est recalculée à partir des règles
+        supprimee = CollectionSchedule.objects.filter(
+            subscription=subscription, scheduled_date__gt=manquee.scheduled_date
+        ).earliest('scheduled_date')
+        supprimee.delete()
+
+        with self.assertNumQueries(2):
+            collectes = calendrier_abonnement(subscription, today, today + timedelta(days=27))
+
+        # Trois jours par semaine sur quatre semaines, une seule entrée par date
+        self.assertEqual(len(collectes), 12)
+        self.assertEqual(len({c['date'] for c in collectes}), 12)
+        par_date = {c['date']: c for c in collectes}
+        self.assertEqual(
+            (par_date[manquee.scheduled_date]['status_code'], par_date[manquee.scheduled_date]['time']),
+            ('missed', time(10, 0))
+        )
+        self.assertFalse(par_date[manquee.scheduled_date]['virtuelle'])
+        self.assertTrue(par_date[supprimee.scheduled_date]['virtuelle'])
+        self.assertFalse(any(c['virtuelle'] for c in collectes if c['date'] != supprimee.scheduled_date))
+
+    def test_periode_invalide(self):
+        subscription = self.creer_abonnement()
+        self.client.force_login(self.user)
+        urls = [
+            reverse('get_subscription_calendar', args=[subscription.id]),
+            reverse('get_zone_calendar', args=[self.zone.id]),
+        ]
+        trop_longue = date(2026, 1, 1) + timedelta(days=DUREE_MAX_CALENDRIER)
+        for url in urls:
+            for parametres in [
+                {'debut': '2026-13-01'},
+                {'debut': '2026-03-10', 'fin': '2026-03-01'},
+                {'debut': '2026-01-01', 'fin': trop_longue.isoformat()},
+            ]:
+                reponse = self.client.get(url, parametres)
+                self.assertEqual(reponse.status_code, 400, parametres)
+                self.assertFalse(reponse.json()['success'])
+
+            reponse = self.client.get(url, {'debut': '2026-01-01', 'fin': '2026-12-31'})
+            self.assertEqual(reponse.status_code, 200)
+
+
+class SimulationProgrammeTests(ZoneAbonnementsTestCase):
+    """La simulation annonce ce que la replanification appliquera, sans rien écrire"""
+
+    def setUp(self):
+        for _ in range(2):
+            self.creer_abonnement()
+        self.today = timezone.now().date()
+
+    def instantane(self):
+        return (
+            list(ProgrammeTricycle.objects.order_by('id').values_list(
+                'jour_semaine', 'heure_debut', 'clients_actuels'
+            )),
+            list(SubscriptionDay.objects.order_by('id').values_list(
+                'id', 'day_id', 'time_slot', 'programme_tricycle_id'
+            )),
+            CollectionSchedule.objects.count(),
+            Notification.objects.count(),
+            ReplanificationZone.objects.count(),
+        )
+
+    def collectes_futures(self, **filtres):
+        return CollectionSchedule.objects.filter(scheduled_date__gte=self.today, status='scheduled', **filtres).count()
+
+    def simuler(self, programme, modifications):
+        avant = self.instantane()
+        reponse = self.client.post(
+            reverse('api_program_simulation', args=[programme.id]),
+            json.dumps(modifications), content_type='application/json'
+        )
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(self.instantane(), avant)
+        [simulation] = reponse.json()['simulation']
+        return simulation
+
+    def appliquer(self, programme, modifications, simulation):
+        futures = self.collectes_futures()
+        ProgrammeTricycle.objects.filter(pk=programme.pk).update(**modifications)
+        rapport = replanifier_zone(self.zone, notifier=False)
+
+        for cle in ['abonnements_modifies', 'jours_retires', 'jours_recales', 'jours_ajoutes', 'collectes_creees']:
+            self.assertEqual(simulation[cle], rapport[cle], cle)
+        self.assertEqual(
+            self.collectes_futures(), futures - simulation['collectes_supprimees'] + simulation['collectes_creees']
+        )
+
+    def test_programme_deplace(self):
+        programme = ProgrammeTricycle.objects.get(zone=self.zone, jour_semaine='lundi')
+        simulation = self.simuler(programme, {'jour_semaine': 'mardi'})
+
+        self.assertEqual((simulation['jours_retires'], simulation['jours_ajoutes']), (2, 2))
+        self.assertGreater(simulation['collectes_supprimees'], 0)
+        self.appliquer(programme, {'jour_semaine': 'mardi'}, simulation)
+
+    def test_programme_recale(self):
+        programme = ProgrammeTricycle.objects.get(zone=self.zone, jour_semaine='mercredi')
+        simulation = self.simuler(programme, {'heure_debut': '10:00'})
+
+        self.assertEqual(simulation['jours_recales'], 2)
+        self.assertGreater(simulation['collectes_recalees'], 0)
+        self.appliquer(programme, {'heure_debut': time(10, 0)}, simulation)
+        self.assertEqual(self.collectes_futures(scheduled_time=time(10, 0)), simulation['collectes_recalees'])
+
+
+class ManifestesTests(ZoneAbonnementsTestCase):
+    """Manifestes précalculés des tricycles : contenu, suivi des collectes et invalidation"""
+
+    def setUp(self):
+        self.tricycle_2 = Tricycle.objects.create(numero_immatriculation='LT-002', nom='T2', capacite_kg=500)
+        ProgrammeTricycle.objects.create(
+            tricycle=self.tricycle_2, zone=self.zone, jour_semaine='mardi',
+            heure_debut=time(8, 0), heure_fin=time(12, 0), capacite_max_clients=10
+        )
+        for _ in range(4):
+            self.creer_abonnement()
+        self.jour = CollectionSchedule.objects.filter(
+            scheduled_date__gte=timezone.now().date()
+        ).earliest('scheduled_date').scheduled_date
+        self.collectes = list(CollectionSchedule.objects.filter(scheduled_date=self.jour).order_by('id'))
+
+    def test_part_du_tricycle(self):
+        a_t1, a_t2, libre, annulee = self.collectes
+        CollectionSchedule.objects.filter(pk=a_t1.pk).update(tricycle=self.tricycle)
+        CollectionSchedule.objects.filter(pk=a_t2.pk).update(tricycle=self.tricycle_2)
+        CollectionSchedule.objects.filter(pk=annulee.pk).update(status='cancelled')
+
+        for tricycle, attendues in [(self.tricycle, {a_t1.pk, libre.pk}), (self.tricycle_2, {a_t2.pk, libre.pk})]:
+            _, arrets = construire_manifeste(tricycle, self.jour)
+            part = CollectionSchedule.objects.filter(
+                filtre_manifeste(tricycle), scheduled_date=self.jour, status__in=['scheduled', 'completed']
+            )
+            self.assertEqual({a.collecte_id for a in arrets}, attendues)
+            self.assertEqual({a.collecte_id for a in arrets}, set(part.values_list('id', flat=True)))
+
+    def test_statut_et_horaire_suivis(self):
+        manifeste, _ = construire_manifeste(self.tricycle, self.jour)
+        collecte = self.collectes[0]
+        collecte.status = 'completed'
+        collecte.save()
+        collecte.scheduled_time = time(9, 30)
+        collecte.save()
+
+        arret = ArretManifeste.objects.get(manifeste=manifeste, collecte=collecte)
+        self.assertEqual((arret.status, arret.scheduled_time), ('completed', time(9, 30)))
+        manifeste.refresh_from_db()
+        self.assertEqual(manifeste.version, 3)
+
+        # Enregistrement sans changement : la version ne bouge pas
+        collecte.save()
+        manifeste.refresh_from_db()
+        self.assertEqual(manifeste.version, 3)
+
+    def test_collecte_supprimee(self):
+        manifeste, arrets = construire_manifeste(self.tricycle, self.jour)
+        self.collectes[0].delete()
+
+        manifeste.refresh_from_db()
+        self.assertEqual(manifeste.version, 2)
+        self.assertEqual(manifeste.arrets.count(), len(arrets) - 1)
+
+        # Abonnement désactivé : ses collectes à venir sortent du manifeste
+        subscription = self.collectes[1].subscription
+        subscription.status = 'cancelled'
+        subscription.save()
+        manifeste.refresh_from_db()
+        self.assertEqual(manifeste.version, 3)
+        self.assertFalse(manifeste.arrets.filter(subscription=subscription).exists())
+
+    def test_replanification_supprime_les_manifestes_futurs(self):
+        construire_manifeste(self.tricycle, self.jour)
+        construire_manifeste(self.tricycle_2, self.jour)
+        passe, _ = construire_manifeste(self.tricycle, timezone.now().date() - timedelta(days=1))
+
+        replanifier_zone(self.zone, notifier=False)
+
+        self.assertEqual(list(ManifesteTricycle.objects.values_list('id', flat=True)), [passe.id])
+
+
+class ClassementConditionnelTests(ZoneAbonnementsTestCase):
+    """Classement des collectes par distance : réponses 304 tant que rien n'a changé"""
+
+    POSITION = (4.0500, 9.7000)
+
+    def setUp(self):
+        Address.objects.filter(pk=self.address.pk).update(latitude=4.0520, longitude=9.7010)
+        self.creer_abonnement()
+        self.collecte = CollectionSchedule.objects.filter(
+            scheduled_date__gte=timezone.now().date()
+        ).earliest('scheduled_date')
+
+        collecteur = CustomUser.objects.create_user(username='collecteur', password='secret', user_type='collecteur')
+        Tricycle.objects.filter(pk=self.tricycle.pk).update(conducteur=collecteur)
+        self.client.force_login(collecteur)
+        # Temps de trajet : pas d'appel au serveur OSRM pendant les tests
+        osrm = mock.patch.object(OSRMClient, 'depuis', side_effect=lambda origine, points: [None] * len(points))
+        osrm.start()
+        self.addCleanup(osrm.stop)
+
+    def classer(self, lat=POSITION[0], lon=POSITION[1], etag=None, **parametres):
+        parametres = {'lat': lat, 'lon': lon, 'date': self.collecte.scheduled_date.isoformat(), **parametres}
+        entetes = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('api_collections_by_distance'), parametres, **entetes)
+
+    def test_petit_deplacement(self):
+        premiere = self.classer()
+        self.assertEqual(premiere.status_code, 200)
+        self.assertEqual(len(premiere.json()['collections']), 1)
+
+        # ~20 m plus loin : le classement n'est pas recalculé
+        reponse = self.classer(lat=self.POSITION[0] + 0.0002, etag=premiere['ETag'])
+        self.assertEqual(reponse.status_code, 304)
+        self.assertEqual(reponse['ETag'], premiere['ETag'])
+
+    def test_grand_deplacement(self):
+        premiere = self.classer()
+        # ~110 m plus loin, au-delà de RECLASSEMENT_DISTANCE_M
+        reponse = self.classer(lat=self.POSITION[0] + 0.001, etag=premiere['ETag'])
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], premiere['ETag'])
+
+    def test_manifeste_modifie(self):
+        premiere = self.classer()
+        self.collecte.status = 'completed'
+        self.collecte.save()
+
+        reponse = self.classer(etag=premiere['ETag'])
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], premiere['ETag'])
+        self.assertEqual(reponse.json()['collections'], [])
+
+    def test_collecte_supprimee(self):
+        premiere = self.classer()
+        self.assertEqual(len(premiere.json()['collections']), 1)
+        self.collecte.delete()
+
+        reponse = self.classer(etag=premiere['ETag'])
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], premiere['ETag'])
+        self.assertEqual(reponse.json()['collections'], [])
+
+    def test_parametres_modifies(self):
+        premiere = self.classer()
+        reponse = self.classer(etag=premiere['ETag'], limit=5)
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], premiere['ETag'])
+
+
+class ClassementParDistanceTests(ZoneAbonnementsTestCase):
+    """Classement des collectes par distance : paramètres limit et max_distance"""
+
+    POSITION = (4.0500, 9.7000)
+    # Clients à ~0,2 km, ~1,1 km et ~5,6 km au nord de la position
+    ECARTS_LATITUDE = (0.002, 0.010, 0.050)
+
+    def setUp(self):
+        today = timezone.now().date()
+        dates = None
+        for i, ecart in enumerate(self.ECARTS_LATITUDE):
+            address = Address.objects.create(
+                user=self.user, title=f'Client {i}', street=f'Rue {i + 2}', city='Douala', postal_code='0000',
+                zone=self.zone, latitude=self.POSITION[0] + ecart, longitude=self.POSITION[1]
+            )
+            subscription = Subscription.objects.create(
+                user=self.user, address=address, zone=self.zone, plan=self.plan,
+                status='active', start_date=today, end_date=today + timedelta(days=30)
+            )
+            jours = set(subscription.schedules.filter(scheduled_date__gte=today).values_list('scheduled_date', flat=True))
+            dates = jours if dates is None else dates & jours
+        # Jour où les trois clients sont collectés
+        self.date = min(dates)
+
+        collecteur = CustomUser.objects.create_user(username='collecteur', password='secret', user_type='collecteur')
+        Tricycle.objects.filter(pk=self.tricycle.pk).update(conducteur=collecteur)
+        self.client.force_login(collecteur)
+        osrm = mock.patch.object(OSRMClient, 'depuis', side_effect=lambda origine, points: [None] * len(points))
+        osrm.start()
+        self.addCleanup(osrm.stop)
+
+    def classer(self, **parametres):
+        parametres = {'lat': self.POSITION[0], 'lon': self.POSITION[1], 'date': self.date.isoformat(), **parametres}
+        return self.client.get(reverse('api_collections_by_distance'), parametres)
+
+    def distances(self, reponse):
+        self.assertEqual(reponse.status_code, 200)
+        return [c['distance_km'] for c in reponse.json()['collections']]
+
+    def test_sans_parametre(self):
+        distances = self.distances(self.classer())
+        self.assertEqual(len(distances), 3)
+        self.assertEqual(distances, sorted(distances))
+
+    def test_limit(self):
+        tous = self.distances(self.classer())
+        self.assertEqual(self.distances(self.classer(limit=2)), tous[:2])
+
+    def test_max_distance(self):
+        distances = self.distances(self.classer(max_distance=2))
+        self.assertEqual(len(distances), 2)
+        self.assertTrue(all(d <= 2 for d in distances))
+
+    def test_parametres_invalides(self):
+        for parametres in ({'limit': 'deux'}, {'max_distance': 'loin'}, {'lat': 'nord'}):
+            with self.subTest(**parametres):
+                reponse = self.classer(**parametres)
+                self.assertEqual(reponse.status_code, 400)
+                self.assertFalse(reponse.json()['success'])
+
+
+class GeocodageAdressesTests(TestCase):
+    """Géocodage en tâche de fond avec le fournisseur local (sans réseau)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='client', password='secret')
+        cls.zone = Zone.objects.create(
+            nom='Centre', ville=City.objects.create(city='Douala'),
+            polygone_coordinates=json.dumps([[4.0, 9.6], [4.0, 9.8], [4.1, 9.8], [4.1, 9.6]])
+        )
+        for titre, rue in [('Maison', 'Rue 1'), ('Bureau', 'rue  1'), ('Dépôt', 'Rue Inconnue')]:
+            Address.objects.create(user=cls.user, title=titre, street=rue, city='Douala', postal_code='0000')
+
+    def test_adresses_identiques_geocodees_une_fois(self):
+        maison = Address.objects.get(title='Maison')
+        cle = normaliser_adresse(maison)
+        fournisseur = StubProvider({cle: (4.05, 9.7)})
+
+        rapport = geocoder_adresses_sans_coordonnees(fournisseur=fournisseur)
+
+        # « Rue 1 » et « rue  1 » ont la même clé : un seul appel pour les deux
+        self.assertEqual(fournisseur.appels, 2)
+        self.assertEqual(rapport['geocodees'], 2)
+        self.assertEqual(rapport['introuvables'], 1)
+        self.assertEqual(Address.objects.filter(latitude__isnull=False).count(), 2)
+        # Zone déduite des polygones, comme à l'enregistrement d'une adresse
+        self.assertEqual(
+            dict(Address.objects.values_list('title', 'zone_id')),
+            {'Maison': self.zone.id, 'Bureau': self.zone.id, 'Dépôt': None}
+        )
+
+        # Deuxième passage : tout vient du cache, y compris l'adresse introuvable
+        rapport = geocoder_adresses_sans_coordonnees(fournisseur=fournisseur)
+        self.assertEqual(fournisseur.appels, 2)
+        self.assertEqual(rapport['cache'], 1)
+        self.assertTrue(GeocodageAdresse.objects.filter(adresse_normalisee=cle).exists())
+
+
+class CompteursGazTests(TestCase):
+    """Compteurs de livraisons des livreurs en cache, tenus à jour par les signaux"""
+
+    def setUp(self):
+        cache.clear()
+        self.livreurs = [
+            CustomUser.objects.create_user(username=f'livreur{i}', password='secret', user_type='collecteur')
+            for i in range(2)
+        ]
+        self.client_gaz = CustomUser.objects.create_user(username='client', password='secret')
+        self.address = Address.objects.create(
+            user=self.client_gaz, title='Maison', street='Rue 1', city='Douala', postal_code='0000'
+        )
+
+    def verifier(self):
+        for livreur in self.livreurs:
+            self.assertEqual(compteurs_gaz(livreur.id), calculer_compteurs_gaz(livreur.id))
+
+    def test_compteurs_coherents_avec_la_table(self):
+        premier, second = self.livreurs
+        with self.captureOnCommitCallbacks(execute=True):
+            commandes = [
+                GasOrder.objects.create(customer=self.client_gaz, address=self.address, status='confirmed')
+                for _ in range(3)
+            ]
+        self.verifier()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for commande in commandes:
+                commande.assigned_collector = premier
+                commande.status = 'assigned'
+                commande.save()
+        self.verifier()
+        self.assertEqual(compteurs_gaz(premier.id), {'today_gas_count': 3, 'assigned_gas_count': 3})
+
+        # Lecture suivante : aucun accès à la base
+        with self.assertNumQueries(0):
+            compteurs_gaz(premier.id)
+
+        # Transaction pas encore validée : le cache n'est pas touché
+        with self.captureOnCommitCallbacks(execute=True) as rappels:
+            commandes[0].status = 'delivered'
+            commandes[0].save()
+            commandes[1].assigned_collector = second
+            commandes[1].save()
+            commandes[2].delete()
+            self.assertEqual(compteurs_gaz(premier.id)['assigned_gas_count'], 3)
+        self.assertEqual(len(rappels), 3)
+        self.verifier()
+        self.assertEqual(compteurs_gaz(premier.id)['assigned_gas_count'], 0)
+        self.assertEqual(compteurs_gaz(second.id)['assigned_gas_count'], 1)
+
+
+class StatsCollecteursTests(TestCase):
+    """Cumul quotidien des collecteurs tenu à jour par les signaux"""
+
+    def setUp(self):
+        self.collecteurs = [
+            CustomUser.objects.create_user(username=f'collecteur{i}', password='secret', user_type='collecteur')
+            for i in range(2)
+        ]
+        client = CustomUser.objects.create_user(username='client', password='secret')
+        address = Address.objects.create(user=client, title='Maison', street='Rue 1', city='Douala', postal_code='0000')
+        plan = SubscriptionPlan.objects.create(
+            name='Standard', plan_type='standard', price=1000, frequency='1000', max_collections_per_week=1
+        )
+        today = timezone.now().date()
+        self.subscription = Subscription.objects.create(
+            user=client, address=address, plan=plan, status='pending',
+            start_date=today, end_date=today + timedelta(days=30)
+        )
+        self.gaz = GasOrder.objects.create(customer=client, address=address, total_amount=7500)
+
+    def cumul(self):
+        return sorted(CollectorDailyStats.objects.values_list(
+            'collector_id', 'date', 'scheduled_count', 'completed_count', 'missed_count', 'gas_deliveries', 'revenue'
+        ))
+
+    def test_cumul_incremental_egal_au_recalcul(self):
+        premier, second = self.collecteurs
+        today = timezone.now().date()
+        demandes = [
+            CollectionRequest.objects.create(
+                subscription=self.subscription, scheduled_date=today - timedelta(days=i % 2),
+                scheduled_time=time(9), collector=premier
+            )
+            for i in range(4)
+        ]
+        demandes[0].status = 'completed'
+        demandes[0].save()
+        demandes[1].status = 'missed'
+        demandes[1].save()
+        demandes[2].collector = second
+        demandes[2].save()
+        demandes[3].delete()
+
+        self.gaz.assigned_collector = premier
+        self.gaz.status = 'delivered'
+        self.gaz.save()
+
+        incremental = self.cumul()
+        CollectorDailyStats.objects.all().delete()
+        reconstruire_stats_collecteurs(today - timedelta(days=1), today)
+        self.assertEqual(self.cumul(), incremental)
+
+        stats = stats_demandes(premier, today)
+        self.assertEqual((stats['total'], stats['completed'], stats['daily']), (2, 1, 1))
+        self.assertEqual(stats['gas_deliveries'], 1)
+
+        # La purge des commandes livrées ne retire pas la livraison du cumul
+        self.gaz.delete()
+        reconstruire_stats_collecteurs(today - timedelta(days=1), today)
+        self.assertEqual(stats_demandes(premier, today)['gas_deliveries'], 1)
+
+    def test_purge_d_un_seul_collecteur(self):
+        premier, second = self.collecteurs
+        today = timezone.now().date()
+        autre = GasOrder.objects.create(customer=self.gaz.customer, address=self.gaz.address, total_amount=5000)
+        for commande, livreur in [(self.gaz, premier), (autre, second)]:
+            commande.assigned_collector = livreur
+            commande.status = 'delivered'
+            commande.save()
+        incremental = self.cumul()
+
+        # Commande du premier purgée, celle du second encore en base le même jour
+        self.gaz.delete()
+        reconstruire_stats_collecteurs(today, today)
+
+        self.assertEqual(self.cumul(), incremental)
+        self.assertEqual(stats_demandes(premier, today)['gas_deliveries'], 1)
+        self.assertEqual(stats_demandes(second, today)['gas_deliveries'], 1)
+
+
+class MaintenanceTests(TestCase):
+    """Purge des données expirées par lots, hors des vues"""
+
+    def test_notifications_purgees_par_lots(self):
+        user = CustomUser.objects.create_user(username='client', password='secret')
+        for i in range(5):
+            Notification.objects.create(user=user, title=f'N{i}', message='-')
+        Notification.objects.filter(title__in=['N0', 'N1', 'N2']).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+        rapport, = executer_maintenance(taches=['notifications'], taille_lot=2, simulation=True)
+        self.assertEqual(rapport['supprimees'], 3)
+        self.assertEqual(Notification.objects.count(), 5)
+
+        rapport, = executer_maintenance(taches=['notifications'], taille_lot=2)
+        self.assertEqual((rapport['supprimees'], rapport['lots']), (3, 2))
+        self.assertEqual(sorted(Notification.objects.values_list('title', flat=True)), ['N3', 'N4'])
+
+
+class ClientAsyncTests(SimpleTestCase):
+    """Nouvelles tentatives et disjoncteur du client des services externes"""
+
+    def appeler(self, nom, statuts, appels=1):
+        reponses = iter(statuts)
+        requetes = []
+
+        def repondre(request):
+            requetes.append(request)
+            return httpx.Response(next(reponses), json={'ok': True})
+
+        async def scenario():
+            async with ClientAsync(nom, attente_base=0, transport=httpx.MockTransport(repondre)) as client:
+                resultats = []
+                for _ in range(appels):
+                    try:
+                        resultats.append(await client.get_json('http://service.test/'))
+                    except Exception as e:
+                        resultats.append(e)
+                return resultats
+
+        return asyncio.run(scenario()), requetes
+
+    def test_erreur_passagere_reessayee(self):
+        resultats, requetes = self.appeler('test-reessai', [503, 429, 200])
+        self.assertEqual(resultats, [{'ok': True}])
+        self.assertEqual(len(requetes), 3)
+
+    def test_disjoncteur_ouvert_apres_echecs(self):
+        with self.settings(DISJONCTEUR_SEUIL=2):
+            resultats, requetes = self.appeler('test-panne', [500] * 6, appels=4)
+        # Deux appels épuisent leurs 3 tentatives ; les suivants ne touchent plus le service
+        self.assertEqual(len(requetes), 6)
+        self.assertTrue(all(isinstance(r, httpx.HTTPStatusError) for r in resultats[:2]))
+        self.assertTrue(all(isinstance(r, ServiceIndisponible) for r in resultats[2:]))
+
+
+class OSRMClientTests(SimpleTestCase):
+    """Client OSRM : tranches de la requête `table`, cache des trajets et repli à vol d'oiseau"""
+
+    ORIGINE = (4.05, 9.70)
+
+    def setUp(self):
+        cache.clear()
+        self.requetes = []
+        session = mock.Mock()
+        session.get.side_effect = self.repondre
+        for patcher in [
+            mock.patch('app.services.routage.session_osrm', return_value=session),
+            # Disjoncteurs neufs : les échecs simulés ne débordent pas sur les autres tests
+            mock.patch.dict('app.services.http_async._disjoncteurs', clear=True),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.panne = False
+
+    def repondre(self, url, params, timeout):
+        if self.panne:
+            raise requests.ConnectionError("OSRM injoignable")
+        nombre = url.rsplit('/', 1)[1].count(';') + 1
+        self.requetes.append(nombre)
+        reponse = mock.Mock()
+        reponse.json.return_value = {
+            'code': 'Ok',
+            'durations': [[float(i) for i in range(nombre)]],
+            'distances': [[float(i * 100) for i in range(nombre)]],
+        }
+        return reponse
+
+    def destinations(self, nombre, decalage=0):
+        return [(4.0 + (i + decalage) / 1000, 9.8) for i in range(nombre)]
+
+    def test_tranches_de_99_destinations(self):
+        trajets = OSRMClient().depuis(self.ORIGINE, self.destinations(150))
+
+        # Origine + 99 destinations par requête
+        self.assertEqual(self.requetes, [TAILLE_MAX_TABLE, 150 - (TAILLE_MAX_TABLE - 1) + 1])
+        self.assertEqual(len(trajets), 150)
+        self.assertEqual(trajets[0], {'duration': 1.0, 'distance': 100.0})
+        self.assertEqual(trajets[98]['duration'], 99.0)
+        self.assertEqual(trajets[99]['duration'], 1.0)
+
+    def test_trajets_en_cache(self):
+        client = OSRMClient()
+        premiers = client.depuis(self.ORIGINE, self.destinations(3))
+        self.assertEqual(client.depuis(self.ORIGINE, self.destinations(3)), premiers)
+        self.assertEqual(self.requetes, [4])
+
+        # Seule la destination inconnue est demandée
+        trajets = client.depuis(self.ORIGINE, self.destinations(4))
+        self.assertEqual(self.requetes, [4, 2])
+        self.assertEqual(trajets[:3], premiers)
+
+    def test_repli_a_vol_d_oiseau(self):
+        self.panne = True
+        points = [self.ORIGINE] + self.destinations(2)
+
+        with self.assertLogs('app.services.routage', 'WARNING'):
+            self.assertEqual(OSRMClient().depuis(self.ORIGINE, points[1:]), [None, None])
+        with self.assertLogs('app.services.tournee', 'WARNING'):
+            durees, distances = matrice_trajets(points)
+
+        attendues = distances_km(points[0][0], points[0][1], [p[0] for p in points], [p[1] for p in points]) * 1000
+        np.testing.assert_allclose(distances[0], attendues)
+        np.testing.assert_allclose(durees, distances / (settings.TRICYCLE_VITESSE_KMH / 3.6))
+
+
+class RepartitionTourneesTests(TestCase):
+    """Répartition des arrêts d'une zone entre plusieurs tricycles"""
+
+    def setUp(self):
+        # Deux groupes d'arrêts éloignés sur une ligne : durée = écart des positions
+        positions = np.array([0, 1, 2, 3, 100, 101, 102, 103], dtype=float)
+        self.matrice = np.abs(positions[:, None] - positions[None, :])
+        self.vehicule = {'capacite': 40, 'debut': time(8), 'fin': time(12), 'duree_max': 3600}
+
+    def test_groupes_et_capacite(self):
+        tournees, non_affectes = repartir_arrets(self.matrice, [10] * 8, [self.vehicule, dict(self.vehicule)])
+
+        self.assertEqual(non_affectes, [])
+        self.assertEqual(sorted(sorted(t) for t in tournees), [[0, 1, 2, 3], [4, 5, 6, 7]])
+
+    def test_arrets_refuses_au_dela_de_la_capacite(self):
+        petit = dict(self.vehicule, capacite=20)
+        tournees, non_affectes = repartir_arrets(self.matrice, [10] * 8, [petit, dict(petit)])
+
+        self.assertEqual([len(t) for t in tournees], [2, 2])
+        self.assertEqual(len(non_affectes), 4)
+
+    def test_creneau_hors_plage(self):
+        matin = dict(self.vehicule, fin=time(10))
+        apres_midi = dict(self.vehicule, debut=time(10), fin=time(14))
+        creneaux = [time(8)] * 4 + [time(11)] * 4
+
+        tournees, _ = repartir_arrets(self.matrice, [10] * 8, [apres_midi, matin], creneaux=creneaux)
+
+        self.assertEqual(sorted(tournees[1]), [0, 1, 2, 3])
+        self.assertEqual(sorted(tournees[0]), [4, 5, 6, 7])
+
+
+class OptimisationTourneeTests(SimpleTestCase):
+    """Heuristiques d'ordre de visite (plus proche voisin, 2-opt, Or-opt) sur une matrice fixe"""
+
+    def setUp(self):
+        points = np.random.default_rng(7).uniform(0, 1000, size=(12, 2))
+        self.matrice = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+
+    def test_permutation_depuis_le_depart(self):
+        for depart in (0, 5):
+            ordre = optimiser_ordre(self.matrice, depart=depart)
+            self.assertNotIn(depart, ordre)
+            self.assertEqual(sorted([depart] + ordre), list(range(len(self.matrice))))
+
+    def test_jamais_pire_que_le_plus_proche_voisin(self):
+        voisin = _plus_proche_voisin(self.matrice, 0, range(1, len(self.matrice)))
+        ordre = optimiser_ordre(self.matrice, depart=0)
+
+        self.assertLessEqual(cout_chemin(self.matrice, [0] + ordre), cout_chemin(self.matrice, voisin) + 1e-6)
+
+    def test_creneaux_servis_dans_l_ordre(self):
+        creneaux = [None] + [time(10), time(8), time(12)] * 3 + [time(8), time(10)]
+        ordre = optimiser_ordre(self.matrice, creneaux, depart=0)
+
+        self.assertEqual(sorted(ordre), list(range(1, len(self.matrice))))
+        self.assertEqual([creneaux[i] for i in ordre], sorted(creneaux[i] for i in ordre))
+
+    def test_zero_un_ou_deux_arrets(self):
+        self.assertEqual(optimiser_ordre(self.matrice[:1, :1]), [])
+        self.assertEqual(optimiser_ordre(self.matrice[:2, :2]), [1])
+        self.assertEqual(sorted(optimiser_ordre(self.matrice[:3, :3])), [1, 2])
+
+        self.assertEqual(optimiser_tournee((4.05, 9.7), [])['ordre'], [])
+        # OSRM indisponible : estimation à vol d'oiseau
+        with mock.patch.object(OSRMClient, 'table', side_effect=requests.ConnectionError), \
+                self.assertLogs('app.services.tournee', 'WARNING'):
+            un = optimiser_tournee((4.05, 9.7), [(4.06, 9.7)])
+            deux = optimiser_tournee((4.05, 9.7), [(4.08, 9.7), (4.06, 9.7)])
+
+        self.assertEqual(un['ordre'], [0])
+        self.assertAlmostEqual(un['distance'], 1112, delta=5)
+        self.assertEqual(deux['ordre'], [1, 0])
+        self.assertEqual(len(deux['etapes']), 2)
+
+
+class ClasserParDistanceTests(SimpleTestCase):
+    """Top-k par partition : même résultat qu'un tri complet stable, ex aequo compris"""
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        # Distances arrondies : nombreux ex aequo ; quelques points sans coordonnées
+        self.distances = np.round(rng.random(500) * 10, 1)
+        self.distances[rng.choice(500, 20, replace=False)] = np.nan
+
+    def tri_complet(self, limit=None, max_distance=None):
+        ordre = [i for i in np.argsort(self.distances, kind='stable') if not np.isnan(self.distances[i])]
+        if max_distance is not None:
+            ordre = [i for i in ordre if self.distances[i] <= max_distance]
+        return ordre[:limit]
+
+    def test_meme_ordre_que_le_tri_complet(self):
+        for limit in (None, 1, 10, 100, 480, 1000):
+            for max_distance in (None, 0, 2.5, 10):
+                with self.subTest(limit=limit, max_distance=max_distance):
+                    ordre = classer_par_distance(self.distances, limit=limit, max_distance=max_distance)
+                    self.assertEqual(list(ordre), self.tri_complet(limit, max_distance))
+
+    def test_limit_et_max_distance(self):
+        ordre = classer_par_distance([3.0, np.nan, 1.0, 7.0, 2.0], limit=2, max_distance=2.5)
+        self.assertEqual(list(ordre), [2, 4])
+        self.assertEqual(list(classer_par_distance([3.0, 1.0], max_distance=0.5)), [])
+
+
+class GrilleSpatialeTests(TestCase):
+    """Recherche des adresses proches par la colonne geohash"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username='client', password='secret')
+        rng = np.random.default_rng(3)
+        for lat, lon in zip(4.0 + rng.random(200) * 0.2, 9.6 + rng.random(200) * 0.2):
+            Address.objects.create(
+                user=user, title='t', street='s', city='Douala', postal_code='0',
+                latitude=round(lat, 6), longitude=round(lon, 6)
+            )
+
+    def test_meme_resultat_que_le_parcours_complet(self):
+        adresses = list(Address.objects.all())
+        distances = distances_km(4.1, 9.7, [a.latitude for a in adresses], [a.longitude for a in adresses])
+        for rayon in (0.5, 2, 5):
+            attendu = sorted(a.id for a, d in zip(adresses, distances) if d <= rayon)
+            proches = objets_proches(Address.objects.all(), 4.1, 9.7, rayon)
+            self.assertEqual(sorted(a.id for a, _ in proches), attendu)
+
+    def test_geohash_suit_les_coordonnees(self):
+        address = Address.objects.first()
+        address.latitude, address.longitude = 4.05, 9.7
+        address.save(update_fields=['latitude', 'longitude'])
+        address.refresh_from_db()
+        self.assertEqual(address.geohash, 's0wzh9r2f')
+
+
+class ZonageTests(TestCase):
+    """Zone d'une adresse déduite des polygones des zones"""
+
+    # Carré 4.0-4.1 / 9.6-9.7 percé d'un trou 4.04-4.06 / 9.64-9.66 (GeoJSON : [lon, lat])
+    CARRE_TROUE = json.dumps({'type': 'Polygon', 'coordinates': [
+        [[9.6, 4.0], [9.7, 4.0], [9.7, 4.1], [9.6, 4.1], [9.6, 4.0]],
+        [[9.64, 4.04], [9.66, 4.04], [9.66, 4.06], [9.64, 4.06], [9.64, 4.04]],
+    ]})
+    # Tracé Leaflet : [{lat, lng}]
+    VOISIN = json.dumps([{'lat': 4.0, 'lng': 9.7}, {'lat': 4.0, 'lng': 9.8}, {'lat': 4.1, 'lng': 9.8}, {'lat': 4.1, 'lng': 9.7}])
+
+    @classmethod
+    def setUpTestData(cls):
+        ville = City.objects.create(city='Douala')
+        cls.nord = Zone.objects.create(nom='Nord', ville=ville, polygone_coordinates=cls.CARRE_TROUE)
+        cls.est = Zone.objects.create(nom='Est', ville=ville, polygone_coordinates=cls.VOISIN)
+        cls.user = CustomUser.objects.create_user(username='client', password='secret')
+
+    def test_points_et_trou(self):
+        resolveur = ResolveurZones([(self.nord.id, lire_polygones(self.CARRE_TROUE)), (self.est.id, lire_polygones(self.VOISIN))])
+        self.assertEqual(
+            resolveur.zones_pour([4.02, 4.05, 4.05, 4.5, None], [9.62, 9.65, 9.75, 9.65, 9.65]),
+            [self.nord.id, None, self.est.id, None, None]
+        )
+
+    def test_milliers_de_points_par_seconde(self):
+        resolveur = ResolveurZones([(self.nord.id, lire_polygones(self.CARRE_TROUE)), (self.est.id, lire_polygones(self.VOISIN))])
+        rng = np.random.default_rng(0)
+        debut = time_module.perf_counter()
+        zones = resolveur.zones_pour(4.0 + rng.random(20000) * 0.1, 9.6 + rng.random(20000) * 0.2)
+        self.assertLess(time_module.perf_counter() - debut, 1)
+        self.assertEqual(len(zones), 20000)
+
+    def test_zone_modifiee_par_un_autre_processus(self):
+        self.assertEqual(resolveur_zones().zone_pour(4.02, 9.62), self.nord.id)
+
+        # Modification sans signal dans ce processus : la version lue en base change
+        Zone.objects.filter(pk=self.nord.pk).update(is_active=False, updated_at=timezone.now())
+
+        self.assertIsNone(resolveur_zones().zone_pour(4.02, 9.62))
+
+    def test_adresse_et_rezonage(self):
+        address = Address.objects.create(
+            user=self.user, title='t', street='s', city='Douala', postal_code='0',
+            latitude=4.02, longitude=9.62
+        )
+        self.assertEqual(address.zone_id, self.nord.id)
+
+        # Le polygone de l'Est est étendu : la commande de rezonage déplace l'adresse
+        self.est.polygone_coordinates = json.dumps([[4.0, 9.6], [4.0, 9.8], [4.1, 9.8], [4.1, 9.6]])
+        self.est.save()
+        self.nord.is_active = False
+        self.nord.save()
+        rapport, changees = rezoner_adresses()
+        self.assertEqual(changees, [address.id])
+        address.refresh_from_db()
+        self.assertEqual(address.zone_id, self.est.id)
@@ -19,6 +19,7 @@ urlpatterns = [
     path('api/update-profile/', views.update_profile, name='update_profile'),
     
     path('api/schedule/<uuid:subscription_id>/', views.get_subscription_schedule, name='get_schedule'),
+    path('api/calendar/<uuid:subscription_id>/', views.get_subscription_calendar, name='get_subscription_calendar'),
     path('subscription/payment/', views.process_subscription_payment, name='process_subscription_payment'),
     path('subscription/payment/verify/', views.verify_payment_status, name='verify_payment_status'),
     path('souscriptions/creer/', views.create_subscription, name='create_subscription_ajax'),
@@ -40,6 +41,7 @@ urlpatterns = [
     
     
     path('api/zones/<uuid:zone_id>/schedule/', views.get_zone_schedule, name='get_zone_schedule'),
+    path('api/zones/<uuid:zone_id>/calendar/', views.get_zone_calendar, name='get_zone_calendar'),
 
     path('subscription/<uuid:subscription_id>/renew-with-payment/', views.renew_subscription_with_payment, name='renew_subscription_with_payment'),
     path('subscription/process-renewal/', views.process_renewal_after_payment, name='process_renewal_after_payment'),
@@ -118,6 +120,8 @@ urlpatterns = [
     # API Programmes
     path('api/programs/', collecte_admin.ProgrammeTricycleListCreateAPIView.as_view(), name='api_programs'),
     path('api/programs/<uuid:pk>/', collecte_admin.ProgrammeTricycleRetrieveUpdateDestroyAPIView.as_view(), name='api_program_detail'),
+    path('api/programs/<uuid:pk>/simulation/', collecte_admin.ProgrammeTricycleSimulationAPIView.as_view(), name='api_program_simulation'),
+    path('api/programs/replanifications/<uuid:pk>/', collecte_admin.ReplanificationZoneDetailAPIView.as_view(), name='api_replanification_detail'),
     
     # API Jours de collecte
     path('api/collection-days/', collecte_admin.CollectionDayListCreateAPIView.as_view(), name='api_collection_days'),
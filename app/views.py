@@ -33,6 +33,9 @@ from django.db import transaction
 
 from .models import Subscription, SubscriptionPlan, Zone, Address
 from .services.payment import PaymentService
+from .services.calendrier import DUREE_MAX_CALENDRIER, calendrier_abonnement, calendrier_zone
+from .services.planning import generate_collection_schedule, get_day_offset
+from .services.zonage import zone_depuis_coordonnees
 
 logger = logging.getLogger(__name__)
 
@@ -195,12 +198,16 @@ def create_subscription(request):
         address_data = data.get('address', {})
         special_instructions = data.get('special_instructions', '')
         
+        # Zone déduite de la position quand elle tombe dans un polygone, sinon zone choisie
+        zone = zone_depuis_coordonnees(address_data.get('latitude'), address_data.get('longitude'))
+        
         # Validation des données
-        if not plan_id or not zone_id:
+        if not plan_id or not (zone or zone_id):
             return JsonResponse({'success': False, 'error': 'Plan et zone de collecte requis'})
         
         plan = get_object_or_404(SubscriptionPlan, id=plan_id, is_active=True)
-        zone = get_object_or_404(Zone, id=zone_id, is_active=True)
+        if zone is None:
+            zone = get_object_or_404(Zone, id=zone_id, is_active=True)
         
         # Création du lien Google Maps
         google_maps_link = None
@@ -287,8 +294,11 @@ def process_subscription_payment(request):
         selected_days = data.get('selected_days', [])
         special_instructions = data.get('special_instructions', '')
         
+        # Zone déduite de la position quand elle tombe dans un polygone, sinon zone choisie
+        zone = zone_depuis_coordonnees(address_data.get('latitude'), address_data.get('longitude'))
+        
         # Validation des données
-        if not all([plan_id, zone_id, phone_number, payment_method]):
+        if not all([plan_id, zone or zone_id, phone_number, payment_method]):
             return JsonResponse({
                 'success': False, 
                 'error': 'Tous les champs obligatoires doivent être remplis'
@@ -303,7 +313,8 @@ def process_subscription_payment(request):
         
         from .models import SubscriptionPlan, Zone
         plan = get_object_or_404(SubscriptionPlan, id=plan_id, is_active=True)
-        zone = get_object_or_404(Zone, id=zone_id, is_active=True)
+        if zone is None:
+            zone = get_object_or_404(Zone, id=zone_id, is_active=True)
 
         # creer un lien google maps à partir de la latitude et longitude
         
@@ -390,68 +401,11 @@ def create_subscription_after_payment(subscription):
     subscription.status = 'active'
     subscription.start_date = timezone.now().date()
     subscription.end_date = timezone.now().date() + timedelta(days=30)  # Abonnement d'un mois
+    # Jours de collecte, planning, QR code et notification : voir SubscriptionLifecycleService
     subscription.save()
-
-    # Assignation automatique des jours de collecte
-    
-    
-    # Génération du planning de collecte
-    generate_collection_schedule(subscription)
     
     return subscription
 
-def generate_collection_schedule(subscription):
-    """Generate collection schedule for subscription"""
-    from .models import CollectionSchedule, SubscriptionDay
-    from datetime import datetime, timedelta
-    
-    # Récupérer les jours assignés
-    subscription_days = SubscriptionDay.objects.filter(subscription=subscription, is_active=True)
-    
-    
-    
-    #compter le nombre de semaines à generer en fonction de la durée de l'abonnement
-    duration = subscription.end_date - subscription.start_date
-    weeks_count = max(1, duration.days // 7)
-    
-
-    for i in range(weeks_count):  # Générer les semaines selon la durée de l'abonnement
-        for sub_day in subscription_days:
-            scheduled_date = timezone.now().date() + timedelta(days=(i * 7 + get_day_offset(sub_day.day.name)))
-
-            # vérifier si une collecte est déjà programmée pour cette date et ce jour
-            
-           
-            CollectionSchedule.objects.create(
-                subscription=subscription,
-                scheduled_date=scheduled_date,
-                scheduled_day=sub_day.day,
-                scheduled_time=sub_day.time_slot,
-                status='scheduled'
-            )
-            
-        
-
-def get_day_offset(day_name):
-    """Get day offset from current date"""
-    days_mapping = {
-        'lundi': 0,
-        'mardi': 1,
-        'mercredi': 2,
-        'jeudi': 3,
-        'vendredi': 4,
-        'samedi': 5,
-        'dimanche': 6
-    }
-    current_weekday = timezone.now().weekday()
-    target_weekday = days_mapping.get(day_name, 0)
-    
-    # Calculer le décalage pour le prochain jour cible
-    if target_weekday >= current_weekday:
-        return target_weekday - current_weekday
-    else:
-        return 7 - current_weekday + target_weekday
-
 @csrf_exempt
 @require_http_methods(["POST"])
 @login_required(login_url='login')
@@ -539,6 +493,89 @@ def get_subscription_schedule(request, subscription_id):
     return JsonResponse({'schedules': schedule_data})
 
 
+def periode_calendrier(request):
+    """
+    Période demandée par ?debut=AAAA-MM-JJ&fin=AAAA-MM-JJ (mois en cours par défaut).
+    Lève ValueError si les dates sont invalides ou la période trop longue.
+    """
+    from calendar import monthrange
+    from django.utils.dateparse import parse_date
+
+    today = timezone.now().date()
+    debut = parse_date(request.GET['debut']) if request.GET.get('debut') else today.replace(day=1)
+    if debut is None:
+        raise ValueError("Date de début invalide (format attendu : AAAA-MM-JJ)")
+    fin = parse_date(request.GET['fin']) if request.GET.get('fin') else debut.replace(
+        day=monthrange(debut.year, debut.month)[1]
+    )
+    if fin is None:
+        raise ValueError("Date de fin invalide (format attendu : AAAA-MM-JJ)")
+    if fin < debut:
+        raise ValueError("La date de fin doit être postérieure à la date de début")
+    if (fin - debut).days >= DUREE_MAX_CALENDRIER:
+        raise ValueError(f"La période ne peut pas dépasser {DUREE_MAX_CALENDRIER} jours")
+    return debut, fin
+
+
+@login_required(login_url='login')
+def get_subscription_calendar(request, subscription_id):
+    """Calendrier des collectes d'un abonnement sur une période quelconque (calculé à la volée)"""
+    subscription = get_object_or_404(Subscription, id=subscription_id, user=request.user)
+    try:
+        debut, fin = periode_calendrier(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    collectes = calendrier_abonnement(subscription, debut, fin)
+    return JsonResponse({
+        'success': True,
+        'debut': debut.strftime('%d/%m/%Y'),
+        'fin': fin.strftime('%d/%m/%Y'),
+        'schedules': [
+            {
+                'date': c['date'].strftime('%d/%m/%Y'),
+                'day': c['day'],
+                'time': c['time'].strftime('%H:%M'),
+                'status': c['status'],
+                'status_code': c['status_code'],
+                'virtual': c['virtuelle'],
+            }
+            for c in collectes
+        ]
+    })
+
+
+def get_zone_calendar(request, zone_id):
+    """Calendrier des tournées d'une zone sur une période quelconque (calculé à la volée)"""
+    zone = get_object_or_404(Zone, id=zone_id)
+    try:
+        debut, fin = periode_calendrier(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    tournees = calendrier_zone(zone, debut, fin)
+    return JsonResponse({
+        'success': True,
+        'zone': {'id': str(zone.id), 'nom': zone.nom},
+        'debut': debut.strftime('%d/%m/%Y'),
+        'fin': fin.strftime('%d/%m/%Y'),
+        'schedule': [
+            {
+                'date': t['date'].strftime('%d/%m/%Y'),
+                'jour': t['jour'],
+                'jour_display': t['jour_display'],
+                'heure_debut': t['heure_debut'].strftime('%H:%M'),
+                'heure_fin': t['heure_fin'].strftime('%H:%M'),
+                'tricycle': t['tricycle'],
+                'clients': t['clients'],
+                'places_restantes': t['places_restantes'],
+                'collectes': t['collectes'],
+            }
+            for t in tournees
+        ]
+    })
+
+
 
 
 @login_required(login_url='login')
@@ -732,6 +769,9 @@ def update_subscription(request, subscription_id):
                     subscription.address.latitude = latitude
                     subscription.address.longitude = longitude
                 subscription.address.save()
+                # La nouvelle position peut tomber dans une autre zone
+                if subscription.address.zone_id and subscription.address.zone_id != subscription.zone_id:
+                    subscription.zone = subscription.address.zone
             
             # 2. Mise à jour du plan si fourni
             if new_plan_id and new_plan_id != str(subscription.plan.id):
@@ -763,7 +803,7 @@ def update_subscription(request, subscription_id):
                         )
                     
                     # Mettre à jour le programme de collecte
-                    update_collection_schedule(subscription, selected_days_list, time_slot)
+                    update_collection_schedule(subscription)
                     
                 except json.JSONDecodeError as e:
                     return JsonResponse({
@@ -787,42 +827,22 @@ def update_subscription(request, subscription_id):
         'error': 'Méthode non autorisée'
     }, status=405)
 
-def update_collection_schedule(subscription, new_days, time_slot):
+def update_collection_schedule(subscription):
     """
-    Met à jour le programme de collecte en fonction des nouveaux jours
+    Met à jour le programme de collecte à partir des jours d'abonnement
+    (SubscriptionDay) déjà enregistrés : jours et créneau viennent de ces lignes
     """
-    day_mapping = {
-        'lundi': 0, 'mardi': 1, 'mercredi': 2, 'jeudi': 3,
-        'vendredi': 4, 'samedi': 5, 'dimanche': 6
-    }
-    
-    new_collection_days = CollectionDay.objects.filter(name__in=new_days)
     today = timezone.now().date()
     
     # Supprimer les collectes futures programmées
-    future_schedules = CollectionSchedule.objects.filter(
+    CollectionSchedule.objects.filter(
         subscription=subscription,
         scheduled_date__gte=today,
         status__in=['scheduled', 'pending']
     ).delete()
     
-    # Créer de nouvelles collectes pour les 4 prochaines semaines
-    for week in range(4):
-        for collection_day in new_collection_days:
-            target_weekday = day_mapping[collection_day.name]
-            days_ahead = (target_weekday - today.weekday() + 7) % 7
-            if days_ahead == 0:
-                days_ahead = 7
-            
-            scheduled_date = today + timedelta(days=days_ahead + (week * 7))
-            
-            CollectionSchedule.objects.create(
-                subscription=subscription,
-                scheduled_date=scheduled_date,
-                scheduled_day=collection_day,
-                scheduled_time=time_slot or '08:00',
-                status='scheduled'
-            )
+    # Recréer les collectes de la fenêtre glissante à partir des nouveaux jours
+    return generate_collection_schedule(subscription)
 
 
 @login_required(login_url='login')
@@ -1062,14 +1082,10 @@ def process_renewal_after_payment(request):
             subscription.status = 'active'
             subscription.save()
             
-            # Générer le nouveau programme de collecte
-            try:
-                schedules_created = generate_collection_schedule(subscription)
-                schedule_message = f"{schedules_created} collectes programmées."
-            except Exception as e:
-                logger.error(f"Error generating collection schedule for {subscription.id}: {str(e)}")
-                schedule_message = "Programme de collecte généré avec quelques avertissements."
-                schedules_created = 0
+            # Le programme de collecte est généré par le cycle de vie de l'abonnement au save()
+            resultat = getattr(subscription, 'resultat_cycle_vie', None) or {}
+            schedules_created = resultat.get('collectes_creees', 0)
+            schedule_message = f"{schedules_created} collectes programmées."
             
             # Nettoyer la session
             if 'renewal_transaction' in request.session: